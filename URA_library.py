@@ -0,0 +1,191 @@
+import hashlib
+import sqlite3
+
+from create_URA import parse_URA, URA_from_table, read_URA
+
+# INDEXED LIBRARY OF URA COMMANDS
+
+# every URA is stored once, keyed on the hash of its channel table
+# names and tags point at these hashes, and are indexed so lookups do not scan the library
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS patterns (
+	hash TEXT PRIMARY KEY,
+	URA TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS names (
+	name TEXT PRIMARY KEY,
+	hash TEXT NOT NULL REFERENCES patterns(hash),
+	comment TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS tags (
+	tag TEXT NOT NULL,
+	hash TEXT NOT NULL REFERENCES patterns(hash),
+	PRIMARY KEY (tag, hash)
+);
+CREATE INDEX IF NOT EXISTS names_hash ON names(hash);
+'''
+
+# function to get the content hash of a URA
+def get_hash(URA: str):
+	'''
+	Returns the hex digest of the channel table of URA. \
+	URAs that set the same channels to the same ports and attenuations have the same hash, whatever their formatting or order.
+
+	URA: string of the URA command
+	'''
+
+	canonical = URA_from_table(parse_URA(URA))
+
+	return hashlib.blake2b(canonical.encode(), digest_size=16).hexdigest()
+
+class URALibrary:
+	'''
+	A library of named URA commands, stored in a sqlite database. \
+	Each URA is stored once (deduplicated by get_hash), and can be looked up by name or hash, or found by tag.
+	'''
+
+	def __init__(self, filename='URA_commands'):
+		'''
+		filename: string of the name of the .db file to use (default: 'URA_commands')
+		'''
+
+		self.filename = f'{filename}.db'
+		self.connection = sqlite3.connect(self.filename)
+		self.connection.executescript(SCHEMA)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def __len__(self):
+		return self.connection.execute('SELECT COUNT(*) FROM patterns').fetchone()[0]
+
+	def __contains__(self, name):
+		return self.get(name) is not None
+
+	# function to add a URA
+	def add(self, URA: str, name=None, comment='', tags=()):
+		'''
+		Adds URA to the library, with an optional name, comment and tags. \
+		If the same channel table is already stored it is not stored again. \
+		Raises a ValueError if name is already used by a different URA. \
+		Returns the hash of URA.
+
+		URA: string of the URA command
+		name: string of the name to look the URA up by (default: None)
+		comment: string detailing what the command does
+		tags: list of strings to find the URA by (eg: ['every_k', 'k=02'])
+		'''
+
+		URA_hash = get_hash(URA)
+
+		with self.connection:
+			self.connection.execute('INSERT OR IGNORE INTO patterns (hash, URA) VALUES (?, ?)', (URA_hash, URA))
+
+			if name is not None:
+				existing = self.connection.execute('SELECT hash FROM names WHERE name = ?', (name,)).fetchone()
+				if existing is not None and existing[0] != URA_hash:
+					raise ValueError(f'The name {name} is already used by a different URA.')
+				self.connection.execute('INSERT OR REPLACE INTO names (name, hash, comment) VALUES (?, ?, ?)', (name, URA_hash, comment))
+
+			self.connection.executemany('INSERT OR IGNORE INTO tags (tag, hash) VALUES (?, ?)', [(tag, URA_hash) for tag in tags])
+
+		return URA_hash
+
+	# function to get a URA by name
+	def get(self, name):
+		'''
+		Returns the URA with this name, or None if there is none.
+
+		name: string of the name
+		'''
+
+		row = self.connection.execute(
+			'SELECT patterns.URA FROM names JOIN patterns ON names.hash = patterns.hash WHERE names.name = ?',
+			(name,),
+		).fetchone()
+
+		return None if row is None else row[0]
+
+	# function to get a URA by hash
+	def get_by_hash(self, URA_hash):
+		'''
+		Returns the URA with this hash, or None if there is none.
+
+		URA_hash: string of the hash (see get_hash)
+		'''
+
+		row = self.connection.execute('SELECT URA FROM patterns WHERE hash = ?', (URA_hash,)).fetchone()
+
+		return None if row is None else row[0]
+
+	# function to get the comment of a name
+	def get_comment(self, name):
+		row = self.connection.execute('SELECT comment FROM names WHERE name = ?', (name,)).fetchone()
+
+		return None if row is None else row[0]
+
+	# function to find URAs by tag
+	def find(self, tag_start, tag_end=None):
+		'''
+		Returns a list of the URAs with the tag tag_start, \
+		or with any tag from tag_start to tag_end (inclusive, in string order) if tag_end is given. \
+		eg: find('k=02', 'k=10') for tags written as 'k=02', 'k=03', ...
+
+		tag_start: string of the tag (or the first tag of the range)
+		tag_end: string of the last tag of the range (default: None)
+		'''
+
+		if tag_end is None:
+			tag_end = tag_start
+
+		rows = self.connection.execute(
+			'SELECT DISTINCT patterns.URA FROM tags JOIN patterns ON tags.hash = patterns.hash '
+			'WHERE tags.tag BETWEEN ? AND ? ORDER BY tags.tag, patterns.rowid',
+			(tag_start, tag_end),
+		).fetchall()
+
+		return [row[0] for row in rows]
+
+	# function to get every name
+	def names(self):
+		return [row[0] for row in self.connection.execute('SELECT name FROM names ORDER BY name')]
+
+	# function to copy the commands from a text file written by create_URA.write_URA
+	def migrate_text(self, filename='URA_commands', tags=('migrated',)):
+		'''
+		Adds every command in the text file filename (in the format of create_URA.write_URA) to the library. \
+		Each command is named by its comment, with ' (2)', ' (3)', ... added if the comment is used by a different URA. \
+		Returns the list of names added.
+
+		filename: string of the name of the .txt file to use (default: 'URA_commands')
+		tags: list of strings to tag every migrated URA with (default: ['migrated'])
+		'''
+
+		lines = read_URA(filename)
+
+		added = []
+		comment = ''
+		for line in lines:
+			if line.startswith('#'):
+				comment = line[1:].strip()
+			elif line.startswith('URA'):
+				# find a free name for this comment
+				name = comment
+				number = 1
+				existing = self.get(name)
+				while existing is not None and get_hash(existing) != get_hash(line):
+					number += 1
+					name = f'{comment} ({number})'
+					existing = self.get(name)
+
+				self.add(line, name=name, comment=comment, tags=tags)
+				added.append(name)
+
+		return added
+
+	# function to close the database
+	def close(self):
+		self.connection.close()
@@ -0,0 +1,237 @@
+import hashlib
+import numpy as np
+
+# VECTORIZED CHANNEL PATTERNS
+
+# the attenuations used for a channel that is on or off
+ON_ATTENUATION = 0.0
+OFF_ATTENUATION = 99.9
+
+class PatternSet:
+	'''
+	A set of channel patterns held as one attenuation matrix, one row per pattern and one column per channel. \
+	URA commands are only rendered when asked for, by iter_URAs.
+
+	Patterns can be combined with union, intersection and difference (comparing whole rows), \
+	and each pattern has a content hash (see hashes).
+	'''
+
+	def __init__(self, channels, attenuations, port=3):
+		'''
+		channels: 1D array of the channel numbers of the columns
+		attenuations: 2D array of attenuations, one row per pattern (a 1D array is treated as a single pattern)
+		port: the port to use (default: 3)
+		'''
+
+		self.channels = np.asarray(channels, dtype=int)
+		self.attenuations = np.atleast_2d(np.asarray(attenuations, dtype=np.float32))
+		self.port = port
+
+		if self.attenuations.shape[-1] != len(self.channels):
+			raise ValueError(f'Expected {len(self.channels)} attenuations per pattern, got {self.attenuations.shape[-1]}.')
+
+	# function to create patterns from a boolean matrix of which channels are on
+	@classmethod
+	def from_on(cls, channels, on, port=3):
+		'''
+		Creates patterns from a boolean matrix, where True is on (ON_ATTENUATION) and False is off (OFF_ATTENUATION).
+
+		channels: 1D array of the channel numbers of the columns
+		on: 2D boolean array, one row per pattern
+		port: the port to use (default: 3)
+		'''
+
+		return cls(channels, np.where(on, ON_ATTENUATION, OFF_ATTENUATION), port)
+
+	def __len__(self):
+		return len(self.attenuations)
+
+	def __getitem__(self, index):
+		# an integer index still returns a PatternSet (of one pattern)
+		if isinstance(index, (int, np.integer)):
+			index = [index]
+
+		return PatternSet(self.channels, self.attenuations[index], self.port)
+
+	def __iter__(self):
+		return self.iter_URAs()
+
+	def __add__(self, other):
+		return self.concatenate(other)
+
+	# boolean matrix of which channels are on
+	@property
+	def on(self):
+		return self.attenuations < OFF_ATTENUATION
+
+	# function to get a 1D array with one element per pattern, that compares whole rows
+	def _rows(self):
+		attenuations = np.ascontiguousarray(self.attenuations)
+		# add 0.0 to turn any -0.0 into 0.0, so equal patterns have equal bytes
+		attenuations = attenuations + np.float32(0.0)
+
+		return attenuations.view(np.dtype((np.void, attenuations.dtype.itemsize * attenuations.shape[-1]))).ravel()
+
+	# function to check two sets can be compared
+	def _check_compatible(self, other):
+		if not np.array_equal(self.channels, other.channels) or self.port != other.port:
+			raise ValueError('Pattern sets must have the same channels and port.')
+
+	# function to join two sets, keeping duplicates
+	def concatenate(self, other):
+		self._check_compatible(other)
+
+		return PatternSet(self.channels, np.concatenate([self.attenuations, other.attenuations]), self.port)
+
+	# function to remove duplicate patterns
+	def unique(self):
+		'''
+		Returns the set without duplicate patterns, in order of first appearance.
+		'''
+
+		_, first = np.unique(self._rows(), return_index=True)
+
+		return self[np.sort(first)]
+
+	# function to get the patterns in either set
+	def union(self, other):
+		return self.concatenate(other).unique()
+
+	# function to get the patterns in both sets
+	def intersection(self, other):
+		self._check_compatible(other)
+
+		return self[np.isin(self._rows(), other._rows())].unique()
+
+	# function to get the patterns in this set but not other
+	def difference(self, other):
+		self._check_compatible(other)
+
+		return self[~np.isin(self._rows(), other._rows())].unique()
+
+	# function to get the content hash of each pattern
+	def hashes(self):
+		'''
+		Returns a list of the hex digest of each pattern, which only depends on the port and the attenuation of each channel.
+		'''
+
+		prefix = np.asarray(self.port, dtype=np.int64).tobytes() + self.channels.astype(np.int64).tobytes()
+
+		return [hashlib.blake2b(prefix + row.tobytes(), digest_size=16).hexdigest() for row in self._rows()]
+
+	# function to render each URA command, one at a time
+	def iter_URAs(self):
+		'''
+		Yields the URA command of each pattern, only rendering each when it is needed.
+		'''
+
+		# attenuations are set to 0.1dB, so render each distinct value of each channel once
+		values, inverse = np.unique(np.round(self.attenuations.astype(float), 1), return_inverse=True)
+		inverse = inverse.reshape(self.attenuations.shape)
+		entries = [[f'{channel},{self.port},{float(value)};' for value in values] for channel in self.channels]
+
+		for row in inverse:
+			yield 'URA ' + ''.join(entries[column][value] for column, value in enumerate(row))
+
+	# function to get every URA command as a list
+	def get_URAs(self):
+		return list(self.iter_URAs())
+
+# FUNCTIONS TO GENERATE FAMILIES OF PATTERNS
+
+# function to get the channels in range (inclusive)
+def _channel_range(channel_start, channel_end):
+	return np.arange(channel_start, channel_end + 1)
+
+# function to turn on or off all channels in range
+def toggle_all_patterns(on, channel_start, channel_end, port=3):
+	'''
+	Returns one pattern with all channels in the range (inclusive) on (True) or off (False).
+
+	on: Boolean of whether channels should be turned on (True) or off (False)
+	channel_start: integer of the channel number to start the pattern at
+	channel_end: integer of the channel number to end the pattern at (inclusive)
+	port: the port to use (default: 3)
+	'''
+
+	channels = _channel_range(channel_start, channel_end)
+
+	return PatternSet.from_on(channels, np.full((1, len(channels)), bool(on)), port)
+
+# function to turn on every k channel, for each k
+def every_k_patterns(channel_start, channel_end, ks, port=3):
+	'''
+	Returns one pattern for each k in ks, with every k channel on (starting from channel_start) and the rest off. \
+	eg: if k=2, and channel_start=52, will turn on 52, 54, 56, etc.
+
+	channel_start: integer of the channel number to start the pattern at
+	channel_end: integer of the channel number to end the pattern at (inclusive)
+	ks: list of integers of the stepsizes
+	port: the port to use (default: 3)
+	'''
+
+	channels = _channel_range(channel_start, channel_end)
+	ks = np.atleast_1d(ks)
+
+	on = (np.arange(len(channels))[None, :] % ks[:, None]) == 0
+
+	return PatternSet.from_on(channels, on, port)
+
+# function to turn off each channel on its own
+def single_off_patterns(channel_start, channel_end, port=3):
+	'''
+	Returns one pattern per channel in the range, with only that channel off.
+
+	channel_start: integer of the channel number to start the pattern at
+	channel_end: integer of the channel number to end the pattern at (inclusive)
+	port: the port to use (default: 3)
+	'''
+
+	channels = _channel_range(channel_start, channel_end)
+
+	return PatternSet.from_on(channels, ~np.eye(len(channels), dtype=bool), port)
+
+# function to turn off every block of k adjacent channels
+def adjacent_patterns(channel_start, channel_end, ks=None, port=3):
+	'''
+	Returns one pattern for each block of k adjacent channels in the range, with only that block off. \
+	Ordered by k, then by the first channel of the block (the same order as create_URA.adjacent_channels).
+
+	channel_start: integer of the channel number to start the pattern at
+	channel_end: integer of the channel number to end the pattern at (inclusive)
+	ks: list of integers of the block sizes (default: every size from 1 up to one less than the number of channels)
+	port: the port to use (default: 3)
+	'''
+
+	channels = _channel_range(channel_start, channel_end)
+	number_channels = len(channels)
+	if ks is None:
+		ks = np.arange(1, number_channels)
+	ks = np.atleast_1d(ks)
+
+	# the size and first index of every block
+	sizes = np.repeat(ks, number_channels - ks + 1)
+	firsts = np.concatenate([np.arange(number_channels - k + 1) for k in ks])
+
+	indices = np.arange(number_channels)[None, :]
+	off = (indices >= firsts[:, None]) & (indices < (firsts + sizes)[:, None])
+
+	return PatternSet.from_on(channels, ~off, port)
+
+# function to choose random channels to turn on
+def random_patterns(channel_start, channel_end, number_patterns, probability=0.5, seed=None, port=3):
+	'''
+	Returns number_patterns patterns where each channel is on with the given probability.
+
+	channel_start: integer of the channel number to start the pattern at
+	channel_end: integer of the channel number to end the pattern at (inclusive)
+	number_patterns: integer of the number of patterns
+	probability: probability of each channel being on (default: 0.5)
+	seed: seed of the random number generator (default: None)
+	port: the port to use (default: 3)
+	'''
+
+	channels = _channel_range(channel_start, channel_end)
+	rng = np.random.default_rng(seed)
+
+	return PatternSet.from_on(channels, rng.random((number_patterns, len(channels))) < probability, port)
@@ -0,0 +1,408 @@
+import time
+import numpy as np
+
+try:
+	from nidaqmx.constants import AcquisitionType, TaskMode, Edge, Slope
+except ImportError:
+	# the emulated daq can be used without nidaqmx installed
+	from emulators import AcquisitionType, TaskMode, Edge, Slope
+
+from instruments import create_daq_task, create_reader
+
+# PERSISTENT DAQ ACQUISITION
+
+# the terminal wired to the sync output of the AFG, which rises at the start of every ramp
+AFG_SYNC_SOURCE = '/Dev1/PFI0'
+
+# the analog inputs read by default, {name: physical channel}
+# eg: {'signal': 'ai0', 'reference': 'ai2'} also reads a tap photodiode, to normalise the signal by the laser power
+DEFAULT_CHANNELS = {'signal': 'ai0'}
+
+class Trigger:
+	'''
+	A hardware trigger of an acquisition, so every sweep starts at the same phase of the AFG ramp \
+	and does not need to be aligned afterwards (see alignment.py).
+
+	A digital edge on source (eg: the AFG sync output) if level is None, otherwise an analog edge crossing level (V) \
+	on source, which must then be given (eg: the AFG ramp monitor on an analog input, '/Dev1/ai1', or the APFI0 terminal). \
+	A start trigger if pretrigger_samples is None, otherwise a reference trigger, \
+	where the sweep includes the pretrigger_samples samples before the trigger (finite sweeps only).
+	'''
+
+	def __init__(self, source=None, level=None, rising=True, pretrigger_samples=None):
+		'''
+		source: string of the trigger terminal or analog channel (default: AFG_SYNC_SOURCE for a digital trigger, required for an analog trigger)
+		level: voltage of an analog trigger, or None for a digital trigger (default: None)
+		rising: boolean of whether to trigger on a rising (or falling) edge (default: True)
+		pretrigger_samples: number of samples before the trigger, or None for a start trigger (default: None)
+		'''
+
+		# the AFG sync output is digital, so it cannot be the source of an analog trigger
+		if source is None:
+			if level is not None:
+				raise ValueError('An analog trigger (level given) needs the analog input or APFI terminal of its source, eg: /Dev1/ai1.')
+			source = AFG_SYNC_SOURCE
+
+		self.source = source
+		self.level = level
+		self.rising = rising
+		self.pretrigger_samples = pretrigger_samples
+
+	def __repr__(self):
+		kind = 'start' if self.pretrigger_samples is None else f'reference ({self.pretrigger_samples} pretrigger samples)'
+		edge = 'rising' if self.rising else 'falling'
+		return f'Trigger({kind}, {edge} {"digital" if self.level is None else f"{self.level}V analog"} edge on {self.source})'
+
+	# function to configure the trigger of a task
+	def configure(self, task, finite=True):
+		'''
+		Configures the trigger of task (real or emulated), before it is committed or started.
+
+		task: the nidaqmx task
+		finite: boolean of whether the task acquires finite sweeps, a reference trigger needs finite sweeps (default: True)
+		'''
+
+		edge = Edge.RISING if self.rising else Edge.FALLING
+		slope = Slope.RISING if self.rising else Slope.FALLING
+
+		if self.pretrigger_samples is None:
+			if self.level is None:
+				task.triggers.start_trigger.cfg_dig_edge_start_trig(self.source, trigger_edge=edge)
+			else:
+				task.triggers.start_trigger.cfg_anlg_edge_start_trig(self.source, trigger_slope=slope, trigger_level=self.level)
+			return
+
+		if not finite:
+			raise ValueError('A reference trigger can only be used for finite sweeps, use a start trigger for continuous acquisition.')
+
+		if self.level is None:
+			task.triggers.reference_trigger.cfg_dig_edge_ref_trig(self.source, self.pretrigger_samples, trigger_edge=edge)
+		else:
+			task.triggers.reference_trigger.cfg_anlg_edge_ref_trig(self.source, self.pretrigger_samples, trigger_slope=slope, trigger_level=self.level)
+
+class Acquisition:
+	'''
+	Holds one configured nidaqmx task open for a whole run, instead of creating a new task for every read. \
+	Each sweep is read through the stream reader straight into a preallocated numpy buffer, \
+	and read() returns a view of that buffer (no copies).
+
+	There are number_buffers buffers used in turn, so the last number_buffers - 1 sweeps stay valid while the next is read. \
+	Copy a sweep (np.array(sweep)) if it must be kept for longer.
+
+	Also offers a continuous mode (start_continuous), where a callback fills a ring buffer of blocks.
+
+	Several named analog inputs can be sampled together in the one task (channels). \
+	Each sweep (and block) is then a 2D array of shape (channels, samples) instead of 1D, \
+	with the rows in the order of channel_names (see get_channel and normalise).
+
+	With a trigger, every sweep (or the first block of the continuous mode) starts at the same phase of the AFG ramp.
+	'''
+
+	def __init__(self, device='Dev1', sample_rate=1e3, acquire_time=2, number_buffers=2, timeout=10.0, trigger=None, channels=None):
+		'''
+		device: the name of the device used as listed in NI MAX
+		sample_rate: sample rate in Hz
+		acquire_time: number of seconds over which to acquire each sweep
+		number_buffers: number of sweep buffers to use in turn (default: 2)
+		timeout: seconds to wait for each sweep (including waiting for the trigger) before raising an error (default: 10.0)
+		trigger: Trigger to start each sweep on, or None to start at once (default: None)
+		channels: dictionary of {name: physical channel} of the analog inputs, or a list of physical channels named as given, \
+			the device is added to channels without one, eg: 'ai0' is device/ai0 (default: DEFAULT_CHANNELS)
+		'''
+
+		self.device = device
+		self.sample_rate = sample_rate
+		self.acquire_time = acquire_time
+		self.timeout = timeout
+		self.trigger = trigger
+
+		if channels is None:
+			channels = DEFAULT_CHANNELS
+		if not isinstance(channels, dict):
+			channels = {channel: channel for channel in channels}
+		if len(channels) == 0:
+			raise ValueError('At least one channel is needed.')
+		# {name: physical channel}, with the device
+		self.channels = {name: channel if '/' in channel else f'{device}/{channel}' for name, channel in channels.items()}
+		self.channel_names = list(self.channels)
+
+		# the number of samples in each sweep
+		self.number_samples = int(sample_rate * acquire_time)
+
+		# preallocated buffers and the times at which samples are acquired (computed once)
+		# each buffer holds every channel, one after the other (see _get_buffer)
+		self.buffers = np.zeros((number_buffers, len(self.channels) * self.number_samples))
+		self.times = np.arange(self.number_samples) / sample_rate
+		self.sweeps_acquired = 0
+
+		# ring buffer of the continuous mode
+		self.ring = None
+		self.blocks_acquired = 0
+
+		self.task = None
+		self.reader = None
+		# seconds spent creating and configuring the task
+		self.setup_time = None
+
+	def __enter__(self):
+		self.open()
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	# function to add the input channels to a new task (real or emulated, see instruments.py)
+	def _create_task(self):
+		task = create_daq_task()
+		for name, channel in self.channels.items():
+			task.ai_channels.add_ai_voltage_chan(channel, name_to_assign_to_channel=name)
+
+		return task
+
+	# function to get a view of number_samples samples of every channel in a buffer, 1D for one channel or (channels, samples)
+	def _get_buffer(self, buffer_index, number_samples):
+		# the view must be contiguous for the stream reader, so the samples read are at the start of the buffer
+		buffer = self.buffers[buffer_index, :len(self.channels) * number_samples]
+		if len(self.channels) == 1:
+			return buffer
+
+		return buffer.reshape(len(self.channels), number_samples)
+
+	# function to get the index of a channel in each sweep
+	def get_channel_index(self, name):
+		if name not in self.channels:
+			raise KeyError(f'No channel {name}, the channels are {self.channel_names}.')
+
+		return self.channel_names.index(name)
+
+	# function to get one channel of a sweep or block
+	def get_channel(self, data, name):
+		'''
+		Returns a view of the samples of channel name in data (a sweep from read or a block from the continuous mode).
+
+		data: array of a sweep or block of this acquisition
+		name: string of the channel name
+		'''
+
+		index = self.get_channel_index(name)
+		if len(self.channels) == 1:
+			return data
+
+		return data[index]
+
+	# function to normalise a channel by a reference channel
+	def normalise(self, data, signal='signal', reference='reference', reference_level=None):
+		'''
+		Returns channel signal divided by channel reference, sample by sample (eg: the FPF signal by a tap photodiode, to remove laser power drift). \
+		With reference_level, the result is multiplied by it, so it stays in volts as if the reference were always reference_level.
+
+		data: 2D array of a sweep or block of this acquisition
+		signal: string of the channel name to normalise (default: 'signal')
+		reference: string of the channel name to normalise by (default: 'reference')
+		reference_level: voltage of the reference to scale to, or None for the ratio (default: None)
+		'''
+
+		normalised = self.get_channel(data, signal) / self.get_channel(data, reference)
+		if reference_level is not None:
+			normalised *= reference_level
+
+		return normalised
+
+	# function to create and configure the task for finite sweeps
+	def open(self):
+		'''
+		Creates and configures the task for finite sweeps of number_samples samples. \
+		The task is committed so that starting and stopping it for each sweep is cheap.
+		'''
+
+		start_time = time.perf_counter()
+
+		self.task = self._create_task()
+		self.task.timing.cfg_samp_clk_timing(
+			self.sample_rate,
+			samps_per_chan=self.number_samples,
+			sample_mode=AcquisitionType.FINITE,
+		)
+		if self.trigger is not None:
+			self.trigger.configure(self.task)
+		self.task.control(TaskMode.TASK_COMMIT)
+		self.reader = create_reader(self.task)
+
+		self.setup_time = time.perf_counter() - start_time
+
+	# function to acquire one sweep
+	def read(self, number_samples=None):
+		'''
+		Acquires one sweep of number_samples samples (of every channel) into the next buffer. \
+		Returns a view of that buffer, which is overwritten number_buffers sweeps later, \
+		1D for one channel or of shape (channels, number_samples).
+
+		number_samples: number of samples to read, fewer than a full sweep stops the task early (default: a full sweep)
+		'''
+
+		if number_samples is None:
+			number_samples = self.number_samples
+
+		buffer = self._get_buffer(self.sweeps_acquired % len(self.buffers), number_samples)
+
+		self.task.start()
+		try:
+			self.reader.read_many_sample(
+				buffer,
+				number_of_samples_per_channel=number_samples,
+				timeout=self.timeout,
+			)
+		finally:
+			self.task.stop()
+
+		self.sweeps_acquired += 1
+
+		return buffer
+
+	# function to acquire one sweep as a stream of short blocks
+	def iter_blocks(self, block_size):
+		'''
+		Starts one sweep and yields its samples block_size at a time, as they are acquired. \
+		The blocks follow on from each other in time, unlike separate reads, which each start at a new point of the sweep. \
+		Each block is a new array, 1D for one channel or of shape (channels, block_size). \
+		The task is stopped after number_samples samples, or as soon as the generator is closed (eg: once enough has been read).
+
+		block_size: number of samples in each block
+		'''
+
+		shape = (block_size,) if len(self.channels) == 1 else (len(self.channels), block_size)
+
+		self.task.start()
+		try:
+			for _ in range(self.number_samples // block_size):
+				block = np.zeros(shape)
+				self.reader.read_many_sample(block, number_of_samples_per_channel=block_size, timeout=self.timeout)
+				yield block
+		finally:
+			self.task.stop()
+
+	# function to acquire continuously into a ring buffer
+	def start_continuous(self, block_size, number_blocks=16, callback=None):
+		'''
+		Restarts the task in continuous mode. Every block_size samples the driver calls back, \
+		and the block is read into the next row of a ring buffer of number_blocks blocks. \
+		callback (if given) is then called with (block, block_index), where block is a view of the ring buffer row \
+		(1D for one channel or of shape (channels, block_size)). \
+		With a (start) trigger, the first block starts on the trigger, so blocks of a whole sweep period all start at the same phase.
+
+		block_size: number of samples in each block
+		number_blocks: number of blocks in the ring buffer (default: 16)
+		callback: function of (block, block_index) called for every block
+		'''
+
+		if self.task is not None:
+			self.task.close()
+
+		self.ring = np.zeros((number_blocks, block_size) if len(self.channels) == 1 else (number_blocks, len(self.channels), block_size))
+		self.blocks_acquired = 0
+
+		self.task = self._create_task()
+		# the driver buffer holds the whole ring so the callback has time to keep up
+		self.task.timing.cfg_samp_clk_timing(
+			self.sample_rate,
+			samps_per_chan=block_size * number_blocks,
+			sample_mode=AcquisitionType.CONTINUOUS,
+		)
+		if self.trigger is not None:
+			self.trigger.configure(self.task, finite=False)
+		self.reader = create_reader(self.task)
+
+		def every_n_samples(task_handle, every_n_samples_event_type, number_of_samples, callback_data):
+			block = self.ring[self.blocks_acquired % number_blocks]
+			self.reader.read_many_sample(block, number_of_samples_per_channel=block_size, timeout=self.timeout)
+
+			block_index = self.blocks_acquired
+			self.blocks_acquired += 1
+			if callback is not None:
+				callback(block, block_index)
+
+			return 0
+
+		self.task.register_every_n_samples_acquired_into_buffer_event(block_size, every_n_samples)
+		self.task.start()
+
+	# function to get a block from the ring buffer
+	def get_block(self, block_index):
+		'''
+		Returns a view of the block with index block_index from the ring buffer, \
+		or None if it has already been overwritten (or not yet acquired).
+
+		block_index: integer index of the block (counting from the start of the continuous acquisition)
+		'''
+
+		if block_index >= self.blocks_acquired or block_index < self.blocks_acquired - len(self.ring):
+			return None
+
+		return self.ring[block_index % len(self.ring)]
+
+	# function to stop and close the task
+	def close(self):
+		'''
+		Stops and closes the task.
+		'''
+
+		if self.task is not None:
+			self.task.close()
+			self.task = None
+			self.reader = None
+
+# function matching the read() in wss_automation.py, which creates a new task for every read
+# used only to compare against Acquisition
+def read_new_task(device='Dev1', sample_rate=1e3, acquire_time=2):
+	number_samples = int(sample_rate * acquire_time)
+
+	with create_daq_task() as task:
+		task.ai_channels.add_ai_voltage_chan(f'{device}/ai0')
+		task.timing.cfg_samp_clk_timing(
+			sample_rate,
+			samps_per_chan=number_samples,
+			sample_mode=AcquisitionType.FINITE,
+		)
+		task.start()
+		data = task.read(number_of_samples_per_channel=number_samples)
+
+		data_arr = np.array(data)
+		acquisition_times = np.array([(acquire_time / number_samples) * i for i in range(len(data))])
+
+		return np.array([acquisition_times, data_arr]).T
+
+# function to measure the overhead of each way of reading
+def compare_reads(device='Dev1', sample_rate=1e3, acquire_time=2, number_sweeps=10):
+	'''
+	Acquires number_sweeps sweeps with a new task per read (as in wss_automation.py) and with a persistent Acquisition. \
+	Returns a dictionary of the set-up time, mean seconds per sweep, and overhead per sweep (beyond acquire_time) of each.
+
+	device: the name of the device used as listed in NI MAX
+	sample_rate: sample rate in Hz
+	acquire_time: number of seconds over which to acquire each sweep
+	number_sweeps: number of sweeps to time for each (default: 10)
+	'''
+
+	results = {}
+
+	# new task for every read, set up is included in every sweep
+	start_time = time.perf_counter()
+	for _ in range(number_sweeps):
+		read_new_task(device, sample_rate, acquire_time)
+	per_sweep = (time.perf_counter() - start_time) / number_sweeps
+	results['new_task'] = {'setup_time': None, 'per_sweep': per_sweep, 'overhead': per_sweep - acquire_time}
+
+	# one persistent task
+	with Acquisition(device, sample_rate, acquire_time) as acquisition:
+		start_time = time.perf_counter()
+		for _ in range(number_sweeps):
+			acquisition.read()
+		per_sweep = (time.perf_counter() - start_time) / number_sweeps
+		results['persistent'] = {'setup_time': acquisition.setup_time, 'per_sweep': per_sweep, 'overhead': per_sweep - acquire_time}
+
+	return results
+
+# OPERATION
+if __name__ == '__main__':
+	for name, result in compare_reads().items():
+		print(f'{name}: {result}')
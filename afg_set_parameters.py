@@ -1,9 +1,13 @@
-import pyvisa
+from instruments import get_resource_manager, get_address
 
-rm = pyvisa.ResourceManager('@py')
+from retry import CommandSequence, RetryPolicy, RetryingResource
 
-afg_name = 'USB0::1689::835::C021197::0::INSTR'
-afg = rm.open_resource(afg_name)
+# real or emulated instruments, see instruments.py
+rm = get_resource_manager()
+
+afg_name = get_address('afg')
+# each command is retried on its own (at most 3 times, 10 retries in total), see retry.py
+afg = RetryingResource(rm.open_resource(afg_name), RetryPolicy(attempts=3, budget=10))
 
 afg.query_delay = 0.1
 afg.baud_rate = 9600
@@ -12,28 +16,28 @@ afg.read_termination = '\n'
 
 print(f'Trying {afg_name}')
 
-afg.write("*RST")
-afg.write("*CLS")
-
-valid_measurement = False
-while ((valid_measurement == False)):
-	try:
-		print("Connected to", afg.query('*IDN?'))
-
-		afg.write("FUNCTION RAMP")  # Set output waveform to RAMP
-		afg.write("SOURce1:FUNCtion:RAMP:SYMMetry 50")  # sets ramp to 100% symmetry
-		afg.write("FREQUENCY 9.61")  # Set frequency 645kHz
-		afg.write("VOLTAGE:AMPLITUDE 0.1")  # Set amplitude 2Vpp
-		afg.write("VOLTAGE:OFFSET 5.75")  # Set offset 0V
-		afg.write("PHASE:ADJUST 0DEG")  # Set phase 0degree
-
-		afg.write("OUTPut1:STATe 1")  # Turns on channel 1
-		#print(f'Channel 1 on? == {afg.query(f"OUTPut1:STATe?")}')  # 1 if yes
-
-		valid_measurement = True
-		print('SUCCESS')
-	except Exception as e:
-		print(f'FAILURE: {e}')
-		print('Trying again...')
+# a failed step can be resumed with steps.run()
+steps = CommandSequence()
+
+steps.add("*RST", afg.write, "*RST")
+steps.add("*CLS", afg.write, "*CLS")
+steps.add("*IDN?", lambda: print("Connected to", afg.query('*IDN?')))
+
+steps.add("FUNCTION RAMP", afg.write, "FUNCTION RAMP")  # Set output waveform to RAMP
+steps.add("SYMMETRY", afg.write, "SOURce1:FUNCtion:RAMP:SYMMetry 50")  # sets ramp to 100% symmetry
+steps.add("FREQUENCY", afg.write, "FREQUENCY 9.61")  # Set frequency 645kHz
+steps.add("AMPLITUDE", afg.write, "VOLTAGE:AMPLITUDE 0.1")  # Set amplitude 2Vpp
+steps.add("OFFSET", afg.write, "VOLTAGE:OFFSET 5.75")  # Set offset 0V
+steps.add("PHASE", afg.write, "PHASE:ADJUST 0DEG")  # Set phase 0degree
+
+steps.add("OUTPUT", afg.write, "OUTPut1:STATe 1")  # Turns on channel 1
+#steps.add("OUTPUT?", lambda: print(f'Channel 1 on? == {afg.query(f"OUTPut1:STATe?")}'))  # 1 if yes
+
+try:
+	steps.run()
+	print('SUCCESS')
+except Exception as e:
+	# steps.run() again would resume from the failed step
+	print(f'FAILURE at step {steps.steps[steps.next_step][0]}: {e}')
 
 afg.close()
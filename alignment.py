@@ -0,0 +1,131 @@
+import numpy as np
+
+from sweep_store import read_text_reading
+
+# FUNCTIONS FOR ALIGNING SWEEPS TO THE MARKER WINDOW
+
+# the index range of the marker channels (81-87 inclusive) in a reference sweep taken with all channels on
+# these match the values used in graphs.ipynb (Data/on_channels/reading_003.txt)
+MARKER_81 = 530
+MARKER_87 = 570
+
+# the reference sweep with all channels on, that the marker window is taken from (as in graphs.ipynb)
+REFERENCE_FILENAME = 'Data/on_channels/reading_003.txt'
+
+# function to get the marker window from a reference sweep
+def get_marker_window(signal_on, marker_start=MARKER_81, marker_end=MARKER_87):
+	'''
+	Returns the section of a reference sweep (all channels on) that contains the marker channels. \
+	This is the window that every other sweep is matched against.
+
+	signal_on: 1D array of the reference sweep
+	marker_start: integer index of the start of the marker window (default: MARKER_81)
+	marker_end: integer index of the end of the marker window (exclusive) (default: MARKER_87)
+	'''
+
+	return np.asarray(signal_on, dtype=float)[marker_start:marker_end].copy()
+
+# function to get the marker window of the reference sweep on disk
+def get_reference_window(filename=REFERENCE_FILENAME, periods=2):
+	'''
+	Returns the marker window (see get_marker_window) of the first period of the reference reading filename.
+
+	filename: string of the path to the reference reading (default: REFERENCE_FILENAME)
+	periods: number of periods in the reading, only the first is used (default: 2)
+	'''
+
+	_, _, signal_on = read_text_reading(filename)
+
+	return get_marker_window(signal_on[:len(signal_on) // periods])
+
+# function to get the sum of squared errors between the window and every circular shift of every sweep
+# uses fft cross-correlation so the cost is O(n log n) per sweep instead of O(n^2)
+def get_shift_errors(signals, signal_window):
+	'''
+	Computes the sum of squared errors between signal_window and the start of np.roll(signal, i), \
+	for every shift i and every sweep in signals at once. \
+	Returns a 2D array of shape (number of sweeps, number of points), where element [j, i] is the error of sweep j rolled by i.
+
+	signals: 2D array of sweeps, one sweep per row (a 1D array is treated as a single sweep)
+	signal_window: 1D array of the window to match (must not be longer than the sweeps)
+	'''
+
+	signals = np.atleast_2d(np.asarray(signals, dtype=float))
+	signal_window = np.asarray(signal_window, dtype=float)
+
+	number_points = signals.shape[-1]
+	window_length = len(signal_window)
+	if window_length > number_points:
+		raise ValueError(f'Window of length {window_length} is longer than the sweeps ({number_points} points).')
+
+	# zero pad the window (and a window of ones) to the length of the sweeps
+	window_padded = np.zeros(number_points)
+	window_padded[:window_length] = signal_window
+	ones_padded = np.zeros(number_points)
+	ones_padded[:window_length] = 1.0
+
+	# circular cross-correlation for every sweep, where element k is sum_j(window[j] * signal[j + k])
+	window_fft = np.conj(np.fft.rfft(window_padded))
+	ones_fft = np.conj(np.fft.rfft(ones_padded))
+	cross = np.fft.irfft(np.fft.rfft(signals, axis=-1) * window_fft, n=number_points, axis=-1)
+	# energy of each sweep inside the window for every offset k, sum_j(signal[j + k]**2)
+	energy = np.fft.irfft(np.fft.rfft(signals**2, axis=-1) * ones_fft, n=number_points, axis=-1)
+
+	# sum of squared errors for every offset k
+	errors = energy - 2 * cross + np.sum(signal_window**2)
+
+	# rolling by i moves element (j - i) to j, so shift i corresponds to offset k = -i
+	shifts = (-np.arange(number_points)) % number_points
+
+	# clip tiny negative values from floating point error
+	return errors[:, shifts].clip(min=0.0)
+
+# function to roll every sweep by its own shift in one indexing operation
+def roll_rows(signals, shifts):
+	'''
+	Rolls each row of signals by the corresponding shift, equivalent to np.roll(signals[j], shifts[j]) for each j. \
+	Returns a new 2D array.
+
+	signals: 2D array of sweeps, one sweep per row
+	shifts: 1D array of integer shifts (one per row)
+	'''
+
+	signals = np.atleast_2d(signals)
+	number_points = signals.shape[-1]
+
+	# index array of shape (number of sweeps, number of points)
+	indices = (np.arange(number_points)[None, :] - np.asarray(shifts)[:, None]) % number_points
+
+	return np.take_along_axis(signals, indices, axis=-1)
+
+# function to align a block of sweeps to the marker window
+# this replaces get_match_window from graphs.ipynb, which looped over every shift in python
+def align_sweeps(signals, signal_window, offset=MARKER_81):
+	'''
+	Finds the circular shift of each sweep that best matches signal_window (least sum of squared errors), \
+	and rolls each sweep so that the window sits at index offset. \
+	Returns (aligned, residuals, shifts), where aligned is a 2D array of the aligned sweeps, \
+	residuals is the sum of squared errors of the best match for each sweep, \
+	and shifts is the total roll applied to each sweep.
+
+	Equivalent to np.roll(get_match_window(t, signal, signal_window), offset) from graphs.ipynb, for every sweep at once.
+
+	signals: 2D array of sweeps, one sweep per row (a 1D array is treated as a single sweep)
+	signal_window: 1D array of the window to match, see get_marker_window
+	offset: integer index to place the start of the window at after alignment (default: MARKER_81)
+	'''
+
+	signals = np.atleast_2d(np.asarray(signals, dtype=float))
+
+	# errors for every shift of every sweep
+	errors = get_shift_errors(signals, signal_window)
+
+	# the best shift of each sweep (first minimum, matching the original loop)
+	best = np.argmin(errors, axis=-1)
+	residuals = errors[np.arange(len(best)), best]
+
+	# roll so the window starts at offset instead of at 0
+	shifts = (best + offset) % signals.shape[-1]
+	aligned = roll_rows(signals, shifts)
+
+	return aligned, residuals, shifts
@@ -0,0 +1,321 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import subprocess
+import tracemalloc
+import numpy as np
+
+from loader import load_run, iter_run
+from alignment import get_reference_window, align_sweeps
+from conversions import V_to_dBm, s_to_THz
+from running_stats import RunningStats
+from filtering import savgol
+
+# BENCHMARKS OF THE ANALYSIS PIPELINE
+# each stage of the analysis in graphs.ipynb is timed on the recorded runs, along with the whole pipeline from disk,
+# and the results are saved as json so they can be compared between commits, eg:
+# python benchmark.py
+# python benchmark.py --compare benchmarks/old.json benchmarks/new.json
+
+# the recorded runs to benchmark
+RUNS = [
+	'Data/channel_sim',
+	'Data/channel_sim_54off',
+	'Data/every_k',
+	'Data/adjacent_channels',
+]
+
+# the run used for the scaling benchmarks, and the multiples of its number of sweeps
+SCALING_RUN = 'Data/channel_sim'
+SCALES = (10, 100)
+
+# the savgol_filter settings used on the envelopes in graphs.ipynb
+SAVGOL_WINDOW = 6
+SAVGOL_ORDER = 3
+
+# where results are saved
+RESULTS_DIR = 'benchmarks'
+
+# function to time a function and measure its peak memory
+def measure(function, *args, repeats=3):
+	'''
+	Calls function(*args) repeats times and returns (result, stats), \
+	where stats is a dictionary of the best and mean time (s), and the peak memory allocated by the call (bytes). \
+	The peak memory is measured on a separate call, as tracemalloc slows down every allocation.
+	Memory allocated in other processes (eg: the loader workers) is not counted.
+
+	function: the function to measure
+	args: the arguments to call it with
+	repeats: number of timed calls (default: 3)
+	'''
+
+	times = []
+	for _ in range(repeats):
+		start_time = time.perf_counter()
+		result = function(*args)
+		times.append(time.perf_counter() - start_time)
+
+	tracemalloc.start()
+	try:
+		tracemalloc.reset_peak()
+		function(*args)
+		peak_memory = tracemalloc.get_traced_memory()[1]
+	finally:
+		tracemalloc.stop()
+
+	stats = {
+		'time': min(times),
+		'mean_time': float(np.mean(times)),
+		'peak_memory': peak_memory,
+	}
+
+	return result, stats
+
+# STAGES OF THE PIPELINE
+
+# function to get the min, mean and max of every point over the sweeps
+def reduce_sweeps(signals):
+	return signals.min(axis=0), signals.mean(axis=0), signals.max(axis=0)
+
+# function to smooth the min and max envelopes
+def smooth_envelopes(minimum, maximum):
+	smooth_minimum, smooth_maximum = savgol(np.stack([minimum, maximum]), SAVGOL_WINDOW, SAVGOL_ORDER)
+
+	return smooth_minimum, smooth_maximum
+
+# function to align and convert one block of sweeps
+def process_block(block, marker_window):
+	aligned, _, _ = align_sweeps(block, marker_window)
+
+	return V_to_dBm(aligned)
+
+# function to run the whole pipeline over blocks of sweeps, keeping only running statistics in memory
+def run_pipeline(times, blocks, marker_window):
+	'''
+	Aligns and converts every block of sweeps, and reduces them to the min, mean and max of every point, \
+	then smooths the min and max envelopes. \
+	Returns (frequencies, mean, smoothed min, smoothed max).
+
+	times: 1D array of the times of each sample in a sweep
+	blocks: iterable of 2D arrays of sweeps (eg: from loader.iter_run)
+	marker_window: 1D array of the marker window, see alignment.get_marker_window
+	'''
+
+	stats = RunningStats(quantiles=())
+	for block in blocks:
+		stats.update(process_block(block, marker_window))
+
+	smooth_minimum, smooth_maximum = smooth_envelopes(stats.minimum, stats.maximum)
+
+	return s_to_THz(times), stats.mean, smooth_minimum, smooth_maximum
+
+# function to generate synthetic sweeps from a recorded run
+def synthetic_blocks(signals, number_sweeps, chunk_size=200, noise=0.005, seed=0):
+	'''
+	Yields blocks of chunk_size sweeps (number_sweeps in total), each a randomly chosen sweep from signals \
+	rolled by a random shift (like a free running acquisition) with added gaussian noise.
+
+	signals: 2D array of recorded sweeps
+	number_sweeps: total number of sweeps to yield
+	chunk_size: number of sweeps per block (default: 200)
+	noise: standard deviation of the noise (V) (default: 0.005)
+	seed: seed of the random number generator (default: 0)
+	'''
+
+	rng = np.random.default_rng(seed)
+	number_points = signals.shape[-1]
+	for start in range(0, number_sweeps, chunk_size):
+		number = min(chunk_size, number_sweeps - start)
+		rows = rng.integers(len(signals), size=number)
+		shifts = rng.integers(number_points, size=number)
+		indices = (np.arange(number_points)[None, :] - shifts[:, None]) % number_points
+		block = np.take_along_axis(signals[rows], indices, axis=-1)
+
+		yield block + noise * rng.standard_normal(block.shape)
+
+# BENCHMARKS
+
+# function to benchmark every stage on one run
+def benchmark_run(run_dir, marker_window, repeats=3):
+	'''
+	Returns a dictionary of the stats (see measure) of each stage on the run in run_dir, \
+	plus the number of sweeps and points in the run.
+
+	run_dir: string of the directory of the run (eg: 'Data/channel_sim')
+	marker_window: 1D array of the marker window, see alignment.get_marker_window
+	repeats: number of timed calls of each stage (default: 3)
+	'''
+
+	results = {}
+
+	# parsing the text files is slow, so it is only timed once
+	_, results['load_text'] = measure(lambda: load_run(run_dir, cache=False), repeats=1)
+	# make sure the binary cache exists before timing it
+	load_run(run_dir)
+	(times, signals), results['load_cached'] = measure(load_run, run_dir, repeats=repeats)
+
+	(aligned, _, _), results['align'] = measure(align_sweeps, signals, marker_window, repeats=repeats)
+	dBm, results['dBm'] = measure(V_to_dBm, aligned, repeats=repeats)
+	_, results['frequency'] = measure(s_to_THz, times, repeats=repeats)
+	(minimum, _, maximum), results['reduce'] = measure(reduce_sweeps, dBm, repeats=repeats)
+	_, results['smooth'] = measure(smooth_envelopes, minimum, maximum, repeats=repeats)
+
+	# the whole pipeline from the cached run on disk
+	end_to_end = lambda: run_pipeline(times, (block for _, block in iter_run(run_dir)), marker_window)
+	_, results['end_to_end'] = measure(end_to_end, repeats=repeats)
+
+	results['number_sweeps'] = len(signals)
+	results['number_points'] = signals.shape[-1]
+
+	return results
+
+# function to benchmark the pipeline on more sweeps than were recorded
+def benchmark_scaling(run_dir, marker_window, scales=SCALES, repeats=1):
+	'''
+	Returns a dictionary of the stats (see measure) of run_pipeline on synthetic runs of each multiple in scales \
+	of the number of sweeps in run_dir, with the sweeps per second added.
+
+	run_dir: string of the directory of the recorded run to generate sweeps from
+	marker_window: 1D array of the marker window, see alignment.get_marker_window
+	scales: list of integer multiples of the number of sweeps (default: SCALES)
+	repeats: number of timed calls of each scale (default: 1)
+	'''
+
+	times, signals = load_run(run_dir)
+
+	results = {}
+	for scale in scales:
+		number_sweeps = scale * len(signals)
+		pipeline = lambda: run_pipeline(times, synthetic_blocks(signals, number_sweeps), marker_window)
+		_, stats = measure(pipeline, repeats=repeats)
+		stats['number_sweeps'] = number_sweeps
+		stats['sweeps_per_second'] = number_sweeps / stats['time']
+		results[f'x{scale}'] = stats
+
+	return results
+
+# function to get the current commit, so results can be matched to the code
+def get_commit():
+	try:
+		return subprocess.run(
+			['git', 'rev-parse', '--short', 'HEAD'],
+			capture_output=True,
+			text=True,
+			check=True,
+			cwd=os.path.dirname(os.path.abspath(__file__)),
+		).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return None
+
+# function to run every benchmark
+def run_benchmarks(runs=RUNS, scaling_run=SCALING_RUN, scales=SCALES, repeats=3):
+	'''
+	Benchmarks each run in runs (see benchmark_run) and the scaling runs (see benchmark_scaling). \
+	Returns a dictionary of the results, with the commit, time and machine they were taken on.
+
+	runs: list of strings of the run directories (default: RUNS)
+	scaling_run: string of the run directory to generate the scaling runs from (default: SCALING_RUN)
+	scales: list of integer multiples of the number of sweeps (default: SCALES)
+	repeats: number of timed calls of each stage (default: 3)
+	'''
+
+	marker_window = get_reference_window()
+
+	results = {
+		'commit': get_commit(),
+		'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+		'machine': {
+			'python': platform.python_version(),
+			'numpy': np.__version__,
+			'platform': platform.platform(),
+			'cpus': os.cpu_count(),
+		},
+		'runs': {},
+	}
+
+	for run_dir in runs:
+		print(f'Benchmarking {run_dir}')
+		results['runs'][run_dir] = benchmark_run(run_dir, marker_window, repeats=repeats)
+		print_stages(results['runs'][run_dir])
+
+	if len(scales) > 0:
+		print(f'Benchmarking scaling of {scaling_run}')
+		results['scaling'] = benchmark_scaling(scaling_run, marker_window, scales=scales)
+		print_stages(results['scaling'])
+
+	return results
+
+# function to print the stats of each stage
+def print_stages(results):
+	for stage, stats in results.items():
+		if isinstance(stats, dict):
+			print(f'\t{stage:<12} {1000 * stats["time"]:10.2f}ms {stats["peak_memory"] / 2**20:10.2f}MiB')
+
+# function to save results as json
+def save_results(results, directory=RESULTS_DIR):
+	'''
+	Saves results to a json file in directory, named by the date and commit. \
+	Returns the filename.
+	'''
+
+	os.makedirs(directory, exist_ok=True)
+	filename = os.path.join(directory, f'{results["date"].replace(":", "")}_{results["commit"]}.json')
+	with open(filename, 'w') as file:
+		json.dump(results, file, indent=4)
+
+	return filename
+
+# function to compare two saved results
+def compare_results(old_filename, new_filename):
+	'''
+	Prints the time and peak memory of each stage in both results, and the ratio of new to old. \
+	Returns a dictionary of {run: {stage: time ratio}}.
+
+	old_filename: string of the json file of the old results
+	new_filename: string of the json file of the new results
+	'''
+
+	with open(old_filename, 'r') as file:
+		old = json.load(file)
+	with open(new_filename, 'r') as file:
+		new = json.load(file)
+
+	print(f'{old["commit"]} -> {new["commit"]}')
+
+	old_groups = {**old['runs'], 'scaling': old.get('scaling', {})}
+	new_groups = {**new['runs'], 'scaling': new.get('scaling', {})}
+
+	ratios = {}
+	for group, new_stages in new_groups.items():
+		old_stages = old_groups.get(group, {})
+		ratios[group] = {}
+		print(group)
+		for stage, stats in new_stages.items():
+			if not isinstance(stats, dict) or stage not in old_stages:
+				continue
+			ratio = stats['time'] / old_stages[stage]['time']
+			ratios[group][stage] = ratio
+			print(
+				f'\t{stage:<12} {1000 * old_stages[stage]["time"]:10.2f}ms -> {1000 * stats["time"]:10.2f}ms ({ratio:5.2f}x)'
+				f' {old_stages[stage]["peak_memory"] / 2**20:8.2f}MiB -> {stats["peak_memory"] / 2**20:8.2f}MiB'
+			)
+
+	return ratios
+
+if __name__ == '__main__':
+	parser = argparse.ArgumentParser(description='Benchmark the analysis pipeline on the recorded runs.')
+	parser.add_argument('runs', nargs='*', default=RUNS, help='run directories to benchmark (default: the recorded runs)')
+	parser.add_argument('--repeats', type=int, default=3, help='number of timed calls of each stage')
+	parser.add_argument('--scales', type=int, nargs='*', default=list(SCALES), help='multiples of the sweeps of the scaling run')
+	parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two saved results instead of benchmarking')
+	args = parser.parse_args()
+
+	if args.compare is not None:
+		compare_results(*args.compare)
+		sys.exit()
+
+	results = run_benchmarks(args.runs, scales=args.scales, repeats=args.repeats)
+	print(f'Saved {save_results(results)}')
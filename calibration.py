@@ -0,0 +1,268 @@
+import numpy as np
+from functools import lru_cache
+from scipy.signal import find_peaks
+
+from loader import load_run, get_run_headers
+from create_URA import parse_URA
+from URA_patterns import OFF_ATTENUATION
+from alignment import align_sweeps, get_reference_window
+from conversions import V_to_dBm, channel_to_THz, s_to_THz
+
+# AUTOMATIC TIME TO FREQUENCY CALIBRATION
+# s_to_THz is a straight line through two points read by hand from one sweep
+# here the mapping is fitted (as a polynomial, for ramp non-linearity) to every channel that is on in a reference sweep,
+# and sweeps are resampled onto an evenly spaced frequency grid with one indexing operation
+
+class Calibration:
+	'''
+	A polynomial mapping from time in a sweep (s) to frequency (THz), fitted by calibrate. \
+	The residual of each fitted feature is kept, to check the fit.
+	'''
+
+	def __init__(self, coefficients, feature_times=(), feature_frequencies=()):
+		'''
+		coefficients: list of the polynomial coefficients, highest power first (as from np.polyfit)
+		feature_times: array of the times (s) of the features the mapping was fitted to
+		feature_frequencies: array of the known frequencies (THz) of those features
+		'''
+
+		self.coefficients = tuple(float(coefficient) for coefficient in coefficients)
+		self.feature_times = np.asarray(feature_times, dtype=float)
+		self.feature_frequencies = np.asarray(feature_frequencies, dtype=float)
+
+	def __repr__(self):
+		return f'Calibration(degree={self.degree}, rms_residual={self.rms_residual * 1000:.2f}GHz)'
+
+	# function to convert time in a sweep (s) to frequency (THz)
+	def __call__(self, times):
+		return np.polyval(self.coefficients, times)
+
+	@property
+	def degree(self):
+		return len(self.coefficients) - 1
+
+	# frequency (THz) of each feature minus its fitted frequency
+	@property
+	def residuals(self):
+		return self.feature_frequencies - self(self.feature_times)
+
+	@property
+	def rms_residual(self):
+		if len(self.feature_times) == 0:
+			return np.nan
+
+		return float(np.sqrt(np.mean(self.residuals**2)))
+
+	# function to get the resampler onto a frequency grid, cached for the session
+	def get_resampler(self, number_samples, sample_rate, grid_start=None, grid_stop=None, grid_step=0.001):
+		'''
+		Returns the Resampler (see get_resampler) of this mapping, for sweeps of number_samples samples at sample_rate.
+		'''
+
+		return get_resampler(self.coefficients, number_samples, sample_rate, grid_start, grid_stop, grid_step)
+
+class Resampler:
+	'''
+	Resamples sweeps from their samples in time onto an evenly spaced frequency grid, by linear interpolation. \
+	The pair of samples and the weight of each grid point are computed once, \
+	so any number of sweeps is resampled with one indexing operation.
+	'''
+
+	def __init__(self, sample_frequencies, grid):
+		'''
+		sample_frequencies: 1D array of the frequency (THz) of each sample of a sweep, increasing or decreasing
+		grid: 1D array of the frequencies (THz) to resample onto (points outside sample_frequencies are NaN)
+		'''
+
+		sample_frequencies = np.asarray(sample_frequencies, dtype=float)
+		self.grid = np.asarray(grid, dtype=float)
+
+		# the fractional sample index of each grid point
+		order = np.argsort(sample_frequencies)
+		positions = np.interp(self.grid, sample_frequencies[order], order.astype(float), left=np.nan, right=np.nan)
+
+		self.outside = np.isnan(positions)
+		positions = np.where(self.outside, 0.0, positions)
+		self.left = np.floor(positions).astype(int).clip(0, len(sample_frequencies) - 2)
+		self.weights = positions - self.left
+
+	def __call__(self, sweeps):
+		'''
+		Returns the sweeps resampled onto the grid, as a 2D array of shape (number of sweeps, number of grid points).
+
+		sweeps: 2D array of sweeps, one sweep per row (a 1D array is treated as a single sweep)
+		'''
+
+		sweeps = np.atleast_2d(sweeps)
+		resampled = sweeps[:, self.left] * (1 - self.weights) + sweeps[:, self.left + 1] * self.weights
+		resampled[:, self.outside] = np.nan
+
+		return resampled
+
+# function to get a resampler, cached so it is only computed once per calibration and sweep length in a session
+@lru_cache(maxsize=16)
+def get_resampler(coefficients, number_samples, sample_rate, grid_start=None, grid_stop=None, grid_step=0.001):
+	'''
+	Returns the Resampler of the polynomial mapping with coefficients, for sweeps of number_samples samples at sample_rate, \
+	onto a grid from grid_start to grid_stop (THz, default: the range of the sweep) in steps of grid_step (THz, default: 1GHz).
+
+	coefficients: tuple of the polynomial coefficients, highest power first (see Calibration)
+	number_samples: number of samples in each sweep
+	sample_rate: sample rate in Hz
+	'''
+
+	sample_frequencies = np.polyval(coefficients, np.arange(number_samples) / sample_rate)
+	if grid_start is None:
+		grid_start = sample_frequencies.min()
+	if grid_stop is None:
+		grid_stop = sample_frequencies.max()
+
+	grid = np.arange(grid_start, grid_stop + grid_step / 2, grid_step)
+
+	return Resampler(sample_frequencies, grid)
+
+# function to get the frequency of the feature each group of adjacent on channels makes in a sweep
+def get_expected_features(channels):
+	'''
+	Returns a 1D array of the centre frequency (THz) of each group of adjacent channels in channels, from the lowest. \
+	A single channel is a peak at its centre, and a group (eg: the markers 81-87) is one flat top around the centre of the group.
+
+	channels: list of integer WSS channel numbers that are on
+	'''
+
+	channels = np.unique(channels)
+	groups = np.split(channels, np.flatnonzero(np.diff(channels) > 1) + 1)
+
+	return np.array([channel_to_THz(group).mean() for group in groups if len(group) > 0])
+
+# function to get the channels that are on in a URA
+def get_on_channels(URA):
+	return [channel for channel, (port, attenuation) in parse_URA(URA).items() if attenuation < OFF_ATTENUATION]
+
+# function to find the features (peaks) of a sweep, with their centres to less than one sample
+def find_features(signal, prominence=3.0, region=None):
+	'''
+	Returns the fractional sample index of the centre of each peak in signal, \
+	as the power weighted centroid of the points within 3dB of the peak.
+
+	signal: 1D array of the sweep in dBm
+	prominence: least prominence (dB) of a peak (default: 3.0)
+	region: boolean array of the samples to look for peaks in (default: all)
+	'''
+
+	signal = np.asarray(signal, dtype=float)
+	if region is not None:
+		signal = np.where(region, signal, signal.min())
+
+	peaks, _ = find_peaks(signal, prominence=prominence)
+
+	centres = []
+	for peak in peaks:
+		# the contiguous points within 3dB of the peak
+		low = peak
+		while low > 0 and signal[low - 1] >= signal[peak] - 3:
+			low -= 1
+		high = peak
+		while high < len(signal) - 1 and signal[high + 1] >= signal[peak] - 3:
+			high += 1
+
+		weights = 10**(signal[low:high + 1] / 10)
+		centres.append(np.sum(np.arange(low, high + 1) * weights) / np.sum(weights))
+
+	return np.array(centres)
+
+# function to fit the time to frequency mapping of a sweep
+def calibrate(signal, times, channels, degree=2, initial=s_to_THz, prominence=3.0, iterations=3):
+	'''
+	Fits the time to frequency mapping of an aligned sweep to the known frequencies of the channels that are on. \
+	Peaks are found in the sweep, matched to the nearest expected feature (see get_expected_features) using the current mapping \
+	(starting from initial), and a polynomial of degree is fitted to the matches, repeated iterations times. \
+	Returns a Calibration.
+
+	signal: 1D array of the aligned sweep in dBm (eg: the mean of a run)
+	times: 1D array of the time (s) of each sample
+	channels: list of integer WSS channel numbers that are on in the sweep (see get_on_channels)
+	degree: degree of the polynomial (default: 2, 1 is a straight line like s_to_THz)
+	initial: function of the first guess of the mapping (default: s_to_THz)
+	prominence: least prominence (dB) of a peak (default: 3.0)
+	iterations: number of times to match and fit (default: 3)
+	'''
+
+	times = np.asarray(times, dtype=float)
+	expected = get_expected_features(channels)
+	if len(expected) <= degree:
+		raise ValueError(f'A degree {degree} fit needs more than {degree} features, the channels only give {len(expected)}.')
+
+	# features can only be matched within half the smallest gap between them
+	tolerance = np.min(np.diff(expected)) / 2 if len(expected) > 1 else np.inf
+
+	mapping = initial
+	coefficients = None
+	for _ in range(iterations):
+		frequencies = mapping(times)
+		# only look for peaks where the spectrum is expected
+		region = (frequencies > expected.min() - tolerance) & (frequencies < expected.max() + tolerance)
+		centres = find_features(signal, prominence, region)
+		feature_times = np.interp(centres, np.arange(len(times)), times)
+
+		# match each peak to the nearest expected feature
+		feature_frequencies = mapping(feature_times)
+		nearest = np.abs(feature_frequencies[:, None] - expected[None, :]).argmin(axis=-1)
+		matched = np.abs(feature_frequencies - expected[nearest]) < tolerance
+		# a feature matched by more than one peak is only kept for the closest
+		for feature in np.unique(nearest[matched]):
+			duplicates = np.flatnonzero(matched & (nearest == feature))
+			if len(duplicates) > 1:
+				keep = duplicates[np.abs(feature_frequencies[duplicates] - expected[feature]).argmin()]
+				matched[duplicates[duplicates != keep]] = False
+
+		if matched.sum() <= degree:
+			raise ValueError(f'Only {matched.sum()} peaks matched the channels, a degree {degree} fit needs more than {degree}.')
+
+		feature_times = feature_times[matched]
+		feature_frequencies = expected[nearest[matched]]
+		coefficients = np.polyfit(feature_times, feature_frequencies, degree)
+		mapping = lambda t, coefficients=coefficients: np.polyval(coefficients, t)
+
+	return Calibration(coefficients, feature_times, feature_frequencies)
+
+# function to calibrate from a run on disk
+def calibrate_run(run_dir, degree=2, marker_window=None, **kwargs):
+	'''
+	Calibrates (see calibrate) from the mean of the aligned sweeps of a run (text readings or a SweepStore), \
+	using the channels that are on in the URA in the headers of the readings. \
+	Returns a Calibration. \
+	Raises FileNotFoundError if the run has no readings, \
+	and ValueError if a reading has no URA line or the readings do not all have the same channels on.
+
+	run_dir: string of the directory of the run (eg: 'Data/channel_sim')
+	degree: degree of the polynomial (default: 2)
+	marker_window: 1D array of the marker window to align to (default: alignment.get_reference_window())
+	kwargs: passed to calibrate
+	'''
+
+	headers = get_run_headers(run_dir)
+	if len(headers) == 0:
+		raise FileNotFoundError(f'No readings in {run_dir}.')
+
+	# the channels that are on in the URA line of each reading
+	on_channels = []
+	for index, header in enumerate(headers):
+		URAs = [line for line in header.split('\n') if line.startswith('URA')]
+		if len(URAs) == 0:
+			raise ValueError(f'Reading {index} of {run_dir} has no URA line in its header.')
+		on_channels.append(tuple(sorted(set(channel for URA in URAs for channel in get_on_channels(URA)))))
+
+	# the mean sweep only has one set of features if every reading has the same channels on
+	if len(set(on_channels)) > 1:
+		raise ValueError(f'The readings of {run_dir} have {len(set(on_channels))} different sets of channels on, calibrate from a run of one URA.')
+
+	times, signals = load_run(run_dir)
+	aligned, _, _ = align_sweeps(signals, get_reference_window() if marker_window is None else marker_window)
+
+	return calibrate(V_to_dBm(aligned.mean(axis=0)), times, list(on_channels[0]), degree=degree, **kwargs)
+
+if __name__ == '__main__':
+	for degree in (1, 2, 3):
+		calibration = calibrate_run('Data/channel_sim', degree=degree)
+		print(calibration, np.round(calibration.residuals * 1000, 1))
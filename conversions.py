@@ -0,0 +1,63 @@
+import numpy as np
+
+# UNIT CONVERSIONS USED IN THE ANALYSIS
+# these were defined in graphs.ipynb, and are kept here so scripts and the notebooks use the same values
+
+# two points read from a sweep, used to map time in a sweep to frequency (a straight line)
+T1, T2 = 0.292, 0.49
+FREQ1, FREQ2 = 194.3945, 195.696
+
+# parameters of the line
+SLOPE_THZ = (FREQ2 - FREQ1) / (T2 - T1)
+INTERCEPT_THZ = FREQ1 - SLOPE_THZ * T1
+
+# period of the FPF sweep (the AFG ramp) recorded in Data/ (s), s_to_THz holds within one period
+SWEEP_PERIOD = 1.0
+
+# the frequency of WSS channel n is 191.70 + 0.05n THz (50GHz grid), so 52-87 cover 194.30-196.05THz
+CHANNEL_START_THZ = 191.70
+CHANNEL_SPACING_THZ = 0.05
+
+# max of watts to max of voltage
+WATT_CONVERSION = 4.2150234972104395e-07 / 1.421254738842842
+
+# voltages are clipped to this before converting to dBm, so a zero reading does not give -inf
+MINIMUM_VOLTAGE = 10**(-4)
+
+# the frequencies of the 13 measured channels (THz), from the highest to the lowest
+CHANNELS_THZ = np.array(
+	[195.69639741, 195.60003549, 195.50699408, 195.39641377,
+	 195.29075440, 195.196405540, 195.092561970, 194.995208250,
+	 194.90073920, 194.798007320, 194.696976860, 194.601204840,
+	 194.49799343]
+)
+
+# function to convert time in a sweep (s) to frequency (THz)
+def s_to_THz(t):
+	return SLOPE_THZ * t + INTERCEPT_THZ
+
+# function to convert a WSS channel number to its centre frequency (THz)
+def channel_to_THz(channel):
+	return CHANNEL_START_THZ + CHANNEL_SPACING_THZ * channel
+
+# function to convert wavelength (nm) to frequency (THz)
+def nm_to_THz(wavelength):
+	return (10**(-12)) * (2.99792458 * 10**8) / (wavelength * 10**(-9))
+
+# function to convert frequency (THz) to wavelength (nm), the same conversion as nm_to_THz
+def THz_to_nm(frequency):
+	return nm_to_THz(frequency)
+
+# function to convert voltage to dBm
+def V_to_dBm(voltage, clip=True):
+	'''
+	Converts voltage (V) to optical power (dBm), works on arrays of any shape.
+
+	voltage: array of voltages
+	clip: boolean of whether to clip voltages below MINIMUM_VOLTAGE first, as done in graphs.ipynb (default: True)
+	'''
+
+	if clip:
+		voltage = np.clip(voltage, MINIMUM_VOLTAGE, None)
+
+	return 10 * np.log10(1000 * voltage * WATT_CONVERSION)
@@ -1,3 +1,5 @@
+from URA_patterns import adjacent_patterns
+
 # FUNCTIONS FOR URA COMMANDS
 
 # function to generate URA commands given a list of channels and a list of attenuations corresponding to each channel
@@ -24,6 +26,41 @@ def get_URA(channels: list, attenuations: list, port=3):
 
 	return URA
 
+# function to get the channels, ports and attenuations back out of a URA command
+# also reads the channel table returned by RRA? (same format without the 'URA ')
+def parse_URA(URA: str):
+	'''
+	Parses a URA command (or the output of RRA?) into a dictionary of {channel: (port, attenuation)}.
+
+	URA: string of the URA command, eg: 'URA 52,3,0.0;53,3,99.9;'
+	'''
+
+	# remove the command name if there is one
+	if URA.startswith('URA'):
+		URA = URA[3:]
+
+	table = {}
+	for entry in URA.strip().split(';'):
+		# skip the empty entry after a trailing ';'
+		if entry.strip() == '':
+			continue
+
+		channel, port, attenuation = entry.split(',')
+		table[int(channel)] = (int(port), float(attenuation))
+
+	return table
+
+# function to generate a URA command from a dictionary of {channel: (port, attenuation)}
+# each channel can have its own port, unlike get_URA
+def URA_from_table(table: dict):
+	'''
+	Generates a URA command from a channel table, the inverse of parse_URA.
+
+	table: dictionary of {channel: (port, attenuation)}
+	'''
+
+	return 'URA ' + ''.join(f'{channel},{port},{attenuation};' for channel, (port, attenuation) in sorted(table.items()))
+
 # function to write URA commands to a file with comments
 def write_URA(URA: str, filename='URA_commands', comment=''):
 	'''
@@ -85,6 +122,44 @@ def read_URA(filename: str):
 
 	return text
 
+# function to add a URA command to the indexed library (URA_library.py), instead of appending to a text file
+def store_URA(URA: str, name: str, comment='', tags=(), filename='URA_commands'):
+	'''
+	Adds a URA command to the library filename.db under name, with a comment and tags. \
+	The same command is only stored once, however many names or tags it has. \
+	Returns the hash of the command.
+
+	URA: string of the URA command to use
+	name: string of the name to look the command up by
+	comment: string detailing what the command does
+	tags: list of strings to find the command by
+	filename: string of the name of the .db file to use
+	'''
+
+	# imported here as URA_library uses the functions in this file
+	from URA_library import URALibrary
+
+	with URALibrary(filename) as library:
+		URA_hash = library.add(URA, name=name, comment=comment, tags=tags)
+
+	return URA_hash
+
+# function to get a URA command from the indexed library by name
+def load_URA(name: str, filename='URA_commands'):
+	'''
+	Returns the URA command stored under name in the library filename.db, or None if there is none.
+
+	name: string of the name of the command
+	filename: string of the name of the .db file to use
+	'''
+
+	from URA_library import URALibrary
+
+	with URALibrary(filename) as library:
+		URA = library.get(name)
+
+	return URA
+
 # creates URAs of either attenuation 0.0 or 99.9, taking from a list of 0 (on) or 1 (off)
 # where 0 refers to 99.9 attenuation, and 1 refers to 0.0 attenuation
 # assumes port 3 default
@@ -157,23 +232,8 @@ def adjacent_channels(channel_start: int, channel_end: int):
 	# so if k=1, then we will have singles: [[52], [53], ...]
 	# so if k=2, then we will have doubles: [[52, 53], [53, 54], ...]
 	# this goes up to channel_end - channel_start, where we will have [[52, ..., 86], [53, ... 87]]
-	URA_list = []
-	for k in range(1, channel_end - channel_start + 1):
-		channels_list = [list(range(i, i + k)) for i in range(channel_start, channel_end + 1 - k + 1)]
-		for channels in channels_list:
-			# create attenuations where only channel index is off (att 99.9)
-			attenuations = [0.0] * len(all_channels)
-
-			# get an index of which channels to turn off by seeing how the channels in this sublist compare to the total channels looked at
-			indices = [channel - channel_start for channel in channels]
-			for index in indices:
-				attenuations[index] = 99.9
-
-			# create URA for these attenuations
-			new_URA = get_URA(all_channels, attenuations)
-
-			# add to URA list
-			URA_list.append(new_URA)
+	# every pattern is built at once as a matrix, then rendered to URAs
+	URA_list = adjacent_patterns(channel_start, channel_end).get_URAs()
 
 	return URA_list
 
@@ -221,7 +281,7 @@ URA_basic = 'URA 52,3,0.0;53,3,99.9;54,3,0.0;55,3,99.9;56,3,0.0;57,3,99.9;58,3,0
 
 # OPERATION
 if __name__ == '__main__':
-	action = input('What would you like to do? [(w)rite/(r)ead/(p)rint]\n> ').lower()
+	action = input('What would you like to do? [(w)rite/(r)ead/(p)rint/(m)igrate]\n> ').lower()
 	print('\n----------\n')
 
 	if action == 'w' or action == 'write':
@@ -243,4 +303,15 @@ if __name__ == '__main__':
 
 		print('PRINT START')
 		print(text)
-		print('PRINT FINISH')
\ No newline at end of file
+		print('PRINT FINISH')
+
+	if action == 'm' or action == 'migrate':
+		from URA_library import URALibrary
+
+		# copy every command in URA_commands.txt into URA_commands.db
+		with URALibrary('URA_commands') as library:
+			names = library.migrate_text('URA_commands')
+
+		print('MIGRATE START')
+		print(names)
+		print('MIGRATE FINISH')
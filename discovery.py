@@ -0,0 +1,201 @@
+import json
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from instruments import get_config, get_resource_manager, ADDRESS_CACHE_FILENAME
+
+# DISCOVERY OF THE CONNECTED INSTRUMENTS
+# every resource is probed at once, in each protocol dialect, with a timeout,
+# and the address of each recognised instrument is cached for instruments.get_address
+# python discovery.py
+
+# the settings and identity command of each protocol dialect
+# scpi: the N7714A and AFG reply to *IDN? with their identity
+# wss: the WSS echoes SNO?, then replies with the serial number and 'OK'
+DIALECTS = {
+	'scpi': {'baud_rate': 9600, 'termination': '\n'},
+	'wss': {'baud_rate': 115200, 'termination': '\r\n'},
+}
+
+# serial ports are tried as the WSS first, everything else as SCPI first
+SERIAL_PREFIX = 'ASRL'
+
+# function to get the instrument name of an identity, or None if not recognised
+def get_instrument_name(dialect, identity):
+	if dialect == 'wss':
+		return 'wss'
+	if 'N7714A' in identity:
+		return 'laser'
+	if 'AFG' in identity:
+		return 'afg'
+
+	return None
+
+# function to read and discard any replies left from a failed probe
+def _drain(resource, number_lines=4):
+	for _ in range(number_lines):
+		try:
+			resource.read()
+		except Exception:
+			return
+
+# function to ask a resource for its identity in one dialect
+def _probe_dialect(resource, dialect):
+	'''
+	Returns the identity of the resource in dialect, or None if it does not reply as expected.
+	'''
+
+	if dialect == 'scpi':
+		identity = resource.query('*IDN?').strip()
+		# an echo or an error code is not an identity
+		if ',' not in identity:
+			return None
+		return identity
+
+	resource.write('SNO?')
+	if resource.read().strip() != 'SNO?':
+		return None
+	serial_number = resource.read().strip()
+	if resource.read().strip() != 'OK':
+		return None
+
+	return f'WSS,{serial_number}'
+
+# function to probe one resource in every dialect
+def probe_resource(resource_manager, address, timeout=2.0):
+	'''
+	Opens address and asks for its identity in each dialect until one replies, waiting at most timeout seconds for each reply. \
+	Returns a dictionary of 'address', 'dialect', 'identity', 'name' (None if not recognised) and 'time' (seconds taken), \
+	with 'error' instead of 'dialect' and 'identity' if no dialect replied.
+
+	resource_manager: pyvisa ResourceManager to open the resource with
+	address: string of the resource name
+	timeout: seconds to wait for each reply (default: 2.0)
+	'''
+
+	start_time = time.perf_counter()
+	result = {'address': address, 'name': None}
+
+	dialects = ['wss', 'scpi'] if address.startswith(SERIAL_PREFIX) else ['scpi', 'wss']
+
+	try:
+		resource = resource_manager.open_resource(address)
+	except Exception as e:
+		result['error'] = f'could not open: {e}'
+		result['time'] = time.perf_counter() - start_time
+		return result
+
+	errors = []
+	try:
+		for dialect in dialects:
+			settings = DIALECTS[dialect]
+			resource.timeout = timeout * 1000
+			resource.query_delay = 0
+			resource.baud_rate = settings['baud_rate']
+			resource.write_termination = settings['termination']
+			resource.read_termination = settings['termination']
+
+			try:
+				identity = _probe_dialect(resource, dialect)
+			except Exception as e:
+				identity = None
+				errors.append(f'{dialect}: {e}')
+
+			if identity is not None:
+				result.update(dialect=dialect, identity=identity, name=get_instrument_name(dialect, identity))
+				break
+
+			_drain(resource)
+		else:
+			result['error'] = '; '.join(errors) if len(errors) > 0 else 'no dialect replied'
+	finally:
+		resource.close()
+
+	result['time'] = time.perf_counter() - start_time
+
+	return result
+
+# function to probe every resource at once
+def discover(resource_manager=None, timeout=2.0, max_workers=8):
+	'''
+	Probes every resource of resource_manager at the same time (see probe_resource). \
+	A resource that has not finished after every dialect has timed out is reported as timed out, without holding up the others. \
+	Returns a list of the result of each resource.
+
+	resource_manager: pyvisa ResourceManager to use (default: the configured one from instruments.py)
+	timeout: seconds to wait for each reply (default: 2.0)
+	max_workers: number of resources probed at once (default: 8)
+	'''
+
+	if resource_manager is None:
+		resource_manager = get_resource_manager()
+
+	addresses = list(resource_manager.list_resources())
+	if len(addresses) == 0:
+		return []
+
+	# the pool is not waited for, so a resource that hangs past its timeout does not hold up the results
+	number_workers = min(max_workers, len(addresses))
+	pool = ThreadPoolExecutor(max_workers=number_workers)
+	futures = {pool.submit(probe_resource, resource_manager, address, timeout): address for address in addresses}
+	# each dialect can wait for up to 3 replies, with a margin for opening, for each round of the pool
+	number_rounds = -(-len(addresses) // number_workers)
+	done, _ = wait(futures, timeout=(timeout * 3 + 1) * len(DIALECTS) * number_rounds)
+	pool.shutdown(wait=False)
+
+	results = []
+	for future, address in futures.items():
+		if future in done and future.exception() is None:
+			results.append(future.result())
+		else:
+			error = 'timed out' if future not in done else str(future.exception())
+			results.append({'address': address, 'name': None, 'error': error, 'time': None})
+
+	return results
+
+# function to write the addresses of the recognised instruments to the cache
+def save_addresses(results, backend=None):
+	'''
+	Writes the address, identity and dialect of each recognised instrument in results to ADDRESS_CACHE_FILENAME, \
+	where instruments.get_address reads them. Returns the cache.
+
+	results: list of the results of discover
+	backend: the backend the results are from (default: the configured one)
+	'''
+
+	cache = {
+		'backend': get_config()['backend'] if backend is None else backend,
+		'time': datetime.now().isoformat(timespec='seconds'),
+		'instruments': {},
+	}
+	for result in results:
+		if result['name'] is None:
+			continue
+		if result['name'] in cache['instruments']:
+			print(f'Found more than one {result["name"]}, using {cache["instruments"][result["name"]]["address"]} and not {result["address"]}')
+			continue
+		cache['instruments'][result['name']] = {key: result[key] for key in ('address', 'identity', 'dialect')}
+
+	with open(ADDRESS_CACHE_FILENAME, 'w') as file:
+		json.dump(cache, file, indent=4)
+
+	return cache
+
+# function to print the results of discover
+def print_results(results):
+	for result in sorted(results, key=lambda result: result['address']):
+		seconds = '' if result['time'] is None else f' ({result["time"]:.2f}s)'
+		if 'error' in result:
+			print(f'{result["address"]}: FAILURE {result["error"]}{seconds}')
+		else:
+			print(f'{result["address"]}: {result["name"] or "unknown"}, {result["identity"]} ({result["dialect"]}){seconds}')
+
+if __name__ == '__main__':
+	start_time = time.perf_counter()
+	results = discover()
+	print_results(results)
+	print(f'Probed {len(results)} resources in {time.perf_counter() - start_time:.2f}s')
+
+	cache = save_addresses(results)
+	print(f'Saved the addresses of {list(cache["instruments"])} to {ADDRESS_CACHE_FILENAME}')
@@ -0,0 +1,595 @@
+import re
+import time
+import threading
+import numpy as np
+from enum import IntEnum
+
+from create_URA import parse_URA
+from conversions import SLOPE_THZ, CHANNEL_SPACING_THZ, SWEEP_PERIOD, s_to_THz, channel_to_THz
+
+# LOCAL EMULATORS OF THE BENCH INSTRUMENTS
+# these stand in for the pyvisa resources (WSS, N7714A, AFG) and the nidaqmx task (DAQ),
+# with realistic timing, so sweep throughput can be measured off the bench
+# every delay is multiplied by time_scale, so 0 runs as fast as possible and 1 runs in real time
+
+# the addresses of the bench instruments, the emulated resource manager opens an emulator for each
+WSS_PREFIX = 'ASRL'
+N7714A_PREFIX = 'USB0::2391::'
+AFG_PREFIX = 'USB0::1689::'
+DEFAULT_RESOURCES = (
+	'ASRL4::INSTR',
+	'USB0::2391::14104::MY50701053::0::INSTR',
+	'USB0::1689::835::C021197::0::INSTR',
+)
+
+# constants matching nidaqmx.constants, so the emulated daq can be used without nidaqmx installed
+class AcquisitionType(IntEnum):
+	FINITE = 10178
+	CONTINUOUS = 10123
+
+class TaskMode(IntEnum):
+	TASK_COMMIT = 3
+
+class Edge(IntEnum):
+	FALLING = 10171
+	RISING = 10280
+
+class Slope(IntEnum):
+	FALLING = 10171
+	RISING = 10280
+
+# the ramp monitor of the AFG rises from RAMP_MINIMUM to RAMP_MAXIMUM (V) over each sweep period (afg_set_parameters.py)
+# and its sync output rises at the start of each ramp, and falls halfway through
+RAMP_MINIMUM, RAMP_MAXIMUM = 5.70, 5.80
+
+# the emulated laser power drifts by POWER_DRIFT (fraction) over POWER_DRIFT_PERIOD seconds of acquisition,
+# seen by the FPF signal (ai0) and by the tap photodiode (any other input except ai1, which is the ramp monitor)
+POWER_DRIFT = 0.05
+POWER_DRIFT_PERIOD = 60.0
+TAP_VOLTAGE = 1.0
+
+class EmulatedResource:
+	'''
+	Base of the emulated pyvisa resources. \
+	Commands are handled by respond, and every reply line is queued to be read with read().
+	'''
+
+	def __init__(self, name, time_scale=1.0):
+		'''
+		name: string of the resource name
+		time_scale: multiplier of every delay (default: 1.0, real time)
+		'''
+
+		self.resource_name = name
+		self.time_scale = time_scale
+
+		# the settings that scripts apply to resources
+		self.query_delay = 0.0
+		self.baud_rate = 9600
+		self.write_termination = '\n'
+		self.read_termination = '\n'
+		self.data_bits = 8
+		self.stop_bits = 10
+		self.timeout = 2000
+
+		self._replies = []
+		self._lock = threading.Lock()
+
+	# function to wait for a number of (real) seconds, scaled by time_scale
+	def _sleep(self, seconds):
+		if seconds * self.time_scale > 0:
+			time.sleep(seconds * self.time_scale)
+
+	# function to wait for the time taken to send a line over the serial port (10 bits per character)
+	def _transmit(self, line):
+		self._sleep(10 * (len(line) + len(self.write_termination)) / self.baud_rate)
+
+	def write(self, command):
+		with self._lock:
+			self._transmit(command)
+			self._replies.extend(self.respond(command.strip()))
+
+	def read(self):
+		with self._lock:
+			if len(self._replies) == 0:
+				self._sleep(self.timeout / 1000)
+				raise TimeoutError(f'{self.resource_name}: no reply to read (timeout).')
+
+			line = self._replies.pop(0)
+			self._transmit(line)
+
+			return line
+
+	def query(self, command):
+		self.write(command)
+		self._sleep(self.query_delay)
+
+		return self.read()
+
+	# function matching the device clear of pyvisa, discards any replies not yet read
+	def clear(self):
+		with self._lock:
+			self._replies = []
+
+	def close(self):
+		pass
+
+	# function to handle a command, returns a list of reply lines
+	def respond(self, command):
+		raise NotImplementedError
+
+class EmulatedWSS(EmulatedResource):
+	'''
+	Emulates the WSS serial protocol: every command is echoed, followed by any output and 'OK'. \
+	Supports SNO?, MFD?, RRA?, URA and RSW. RSW takes switch_time seconds, \
+	and the optical output then takes settle_time seconds to reach the new channels (seen by the emulated DAQ).
+	'''
+
+	def __init__(self, name, time_scale=1.0, switch_time=0.25, settle_time=0.3):
+		'''
+		name: string of the resource name
+		time_scale: multiplier of every delay (default: 1.0, real time)
+		switch_time: seconds taken by RSW before replying (default: 0.25)
+		settle_time: seconds the output takes to reach the new channels after RSW (default: 0.3)
+		'''
+
+		super().__init__(name, time_scale)
+		self.baud_rate = 115200
+		self.switch_time = switch_time
+		self.settle_time = settle_time
+
+		# channels 0-87, as read from the bench (Data/all_log.txt)
+		self.channels = {channel: (1, 0.0) for channel in range(88)}
+		self.channels[0] = (4, 0.0)
+		self.pending = {}
+
+		# the channels before the last switch, and when it finished
+		self.previous_channels = dict(self.channels)
+		self.switched_at = -np.inf
+
+	def respond(self, command):
+		if command == 'SNO?':
+			return [command, 'SN000000', 'OK']
+		if command == 'MFD?':
+			return [command, '01-JAN-2000', 'OK']
+		if command == 'RRA?':
+			return [command, ';'.join(f'{channel},{port},{attenuation}' for channel, (port, attenuation) in sorted(self.channels.items())), 'OK']
+		if command.startswith('URA'):
+			try:
+				self.pending.update(parse_URA(command))
+			except ValueError:
+				return [command, 'AER']
+			return [command, 'OK']
+		if command == 'RSW':
+			self._sleep(self.switch_time)
+			self.previous_channels = dict(self.channels)
+			self.channels.update(self.pending)
+			self.pending = {}
+			self.switched_at = time.perf_counter()
+			return [command, 'OK']
+
+		return [command, 'CER']
+
+	# function to get the fraction of the way through settling to the new channels (0 to 1)
+	def settled_fraction(self):
+		if self.settle_time * self.time_scale <= 0:
+			return 1.0
+
+		return float(np.clip((time.perf_counter() - self.switched_at) / (self.settle_time * self.time_scale), 0.0, 1.0))
+
+	# function to get the transmission of each channel on port 3 (1 on, 0 off), partway through settling
+	def get_transmission(self, channel_numbers):
+		new = np.array([self.channels.get(channel, (0, 99.9)) for channel in channel_numbers])
+		old = np.array([self.previous_channels.get(channel, (0, 99.9)) for channel in channel_numbers])
+
+		# attenuation in dB to linear transmission, only port 3 goes to the FPF
+		to_linear = lambda settings: np.where(settings[:, 0] == 3, 10**(-settings[:, 1] / 10), 0.0)
+		fraction = self.settled_fraction()
+
+		return (1 - fraction) * to_linear(old) + fraction * to_linear(new)
+
+class EmulatedSCPI(EmulatedResource):
+	'''
+	Emulates a generic SCPI instrument. Any 'HEADER value' command stores value, and 'HEADER?' returns it. \
+	Also supports *IDN?, *RST, *CLS, *OPC? and SYSTem:ERRor?.
+	'''
+
+	identity = 'EMULATED,SCPI,0,0'
+
+	def __init__(self, name, time_scale=1.0):
+		super().__init__(name, time_scale)
+		self.settings = {}
+
+	# function to get the canonical form of a header, so 'sour1:pow' and 'SOUR1:POW' match
+	@staticmethod
+	def _key(header):
+		return header.strip().upper()
+
+	# function to check whether every operation has completed
+	def operations_complete(self):
+		return True
+
+	def respond(self, command):
+		header, _, value = command.partition(' ')
+		key = self._key(header)
+
+		if key == '*IDN?':
+			return [self.identity]
+		if key == '*RST':
+			self.settings = {}
+			return []
+		if key == '*CLS':
+			return []
+		if key == '*OPC?':
+			return ['1' if self.operations_complete() else '0']
+		if key in ('SYST:ERR?', 'SYSTEM:ERROR?'):
+			return ['+0,"No error"']
+		if key.endswith('?'):
+			return [self.get(key[:-1])]
+
+		self.set(key, value.strip())
+		return []
+
+	def get(self, key):
+		return self.settings.get(key, '0')
+
+	def set(self, key, value):
+		self.settings[key] = value
+
+class EmulatedN7714A(EmulatedSCPI):
+	'''
+	Emulates the N7714A four port laser source. Turning a source on (sour{i}:pow:state 1) \
+	takes warmup_time seconds, and tuning (sour{i}:wav or sour{i}:freq) takes tune_time seconds. \
+	While any source is busy, *OPC? returns 0 (sour{i}:pow:state? returns the state set, as on the instrument).
+	'''
+
+	identity = 'Keysight Technologies,N7714A,EMULATED,0.0'
+
+	def __init__(self, name, time_scale=1.0, warmup_time=8.0, tune_time=3.0, ports=4):
+		super().__init__(name, time_scale)
+		self.warmup_time = warmup_time
+		self.tune_time = tune_time
+		self.ports = ports
+
+		# the time each source will be ready
+		self.ready_at = {port: 0.0 for port in range(1, ports + 1)}
+
+	# function to get the source number of a header, eg: 'SOUR2:POW' -> 2
+	@staticmethod
+	def _source(key):
+		match = re.match(r'SOUR(?:CE)?(\d)', key)
+
+		return int(match.group(1)) if match else None
+
+	def _busy(self, port):
+		return time.perf_counter() < self.ready_at[port]
+
+	def operations_complete(self):
+		return not any(self._busy(port) for port in self.ready_at)
+
+	def set(self, key, value):
+		super().set(key, value)
+
+		port = self._source(key)
+		if port is None or port not in self.ready_at:
+			return
+
+		# turning on, or retuning while on, takes time
+		if key.endswith(':POW:STATE') and value in ('1', 'ON'):
+			self.ready_at[port] = time.perf_counter() + self.warmup_time * self.time_scale
+		elif ':WAV' in key or ':FREQ' in key:
+			self.ready_at[port] = max(self.ready_at[port], time.perf_counter() + self.tune_time * self.time_scale)
+
+	def get(self, key):
+		if key.endswith(':POW:STATE'):
+			return '1' if self.settings.get(key) in ('1', 'ON') else '0'
+
+		return super().get(key)
+
+class EmulatedAFG(EmulatedSCPI):
+	'''
+	Emulates the AFG that sweeps the FPF. Settings are stored and read back as sent.
+	'''
+
+	identity = 'TEKTRONIX,AFG3021B,EMULATED,0.0'
+
+class EmulatedResourceManager:
+	'''
+	Stands in for pyvisa.ResourceManager('@py'). Opens an emulator for each address, \
+	and every open of the same address shares the same emulator (as with a real instrument).
+	'''
+
+	_instruments = {}
+
+	def __init__(self, time_scale=1.0):
+		self.time_scale = time_scale
+
+	def list_resources(self):
+		return DEFAULT_RESOURCES
+
+	def open_resource(self, name):
+		if name not in self._instruments:
+			if name.startswith(WSS_PREFIX):
+				instrument = EmulatedWSS(name, self.time_scale)
+			elif name.startswith(N7714A_PREFIX):
+				instrument = EmulatedN7714A(name, self.time_scale)
+			elif name.startswith(AFG_PREFIX):
+				instrument = EmulatedAFG(name, self.time_scale)
+			else:
+				raise ValueError(f'No emulator for {name}.')
+			self._instruments[name] = instrument
+
+		return self._instruments[name]
+
+	# function to get the emulated WSS (if one has been opened)
+	@classmethod
+	def get_wss(cls):
+		for instrument in cls._instruments.values():
+			if isinstance(instrument, EmulatedWSS):
+				return instrument
+
+		return None
+
+	def close(self):
+		pass
+
+# EMULATED DAQ
+
+# function to get the FPF trace of the channels on the WSS, at the given sweep phases (0 to 1)
+def get_FPF_trace(phases, transmission, channel_numbers, amplitude=2.0, noise_floor=0.01, noise=0.005, fpf_width_THz=0.02, rng=None):
+	'''
+	Returns the voltage of the photodiode after the FPF for each sweep phase. \
+	Each channel that is on passes a 50GHz wide flat-topped band, and the FPF (Lorentzian of width fpf_width_THz) sweeps across them.
+
+	phases: array of sweep phases from 0 to 1 (fraction of SWEEP_PERIOD)
+	transmission: array of the transmission of each channel (0 to 1)
+	channel_numbers: array of the WSS channel numbers
+	'''
+
+	if rng is None:
+		rng = np.random.default_rng()
+
+	frequencies = s_to_THz(np.asarray(phases) * SWEEP_PERIOD)
+	centres = channel_to_THz(np.asarray(channel_numbers))
+
+	# flat-topped (super Gaussian) passband of each channel, with a tilt across the band
+	offsets = (frequencies[:, None] - centres[None, :]) / (CHANNEL_SPACING_THZ / 2)
+	passbands = np.exp(-offsets**6) * transmission[None, :] * (1 + 0.3 * (centres[None, :] - centres.mean()))
+	spectrum = passbands.sum(axis=1)
+
+	# the FPF smooths the spectrum
+	step = SLOPE_THZ * SWEEP_PERIOD / len(frequencies) if len(frequencies) > 1 else 1.0
+	half_width = max(int(4 * fpf_width_THz / step), 1)
+	lorentzian = 1 / (1 + (np.arange(-half_width, half_width + 1) * step / (fpf_width_THz / 2))**2)
+	spectrum = np.convolve(spectrum, lorentzian / lorentzian.sum(), mode='same')
+
+	return amplitude * spectrum + noise_floor + noise * rng.standard_normal(len(frequencies))
+
+class _EmulatedChannels:
+	def __init__(self):
+		self.names = []
+
+	# physical_channel can list several channels, eg: 'Dev1/ai0, Dev1/ai2'
+	def add_ai_voltage_chan(self, physical_channel, name_to_assign_to_channel='', **kwargs):
+		self.names.extend(name.strip() for name in physical_channel.split(','))
+
+	@property
+	def channel_names(self):
+		return list(self.names)
+
+class _EmulatedTiming:
+	def __init__(self):
+		self.sample_rate = 1e3
+		self.samples_per_channel = 1000
+		self.sample_mode = AcquisitionType.FINITE
+
+	def cfg_samp_clk_timing(self, rate, samps_per_chan=1000, sample_mode=AcquisitionType.FINITE, **kwargs):
+		self.sample_rate = rate
+		self.samples_per_channel = samps_per_chan
+		self.sample_mode = sample_mode
+
+class _EmulatedStartTrigger:
+	def __init__(self):
+		self.source = None
+		self.phase = None
+
+	def cfg_dig_edge_start_trig(self, trigger_source, trigger_edge=Edge.RISING):
+		self.source = trigger_source
+		self.phase = get_trigger_phase(trigger_edge)
+
+	def cfg_anlg_edge_start_trig(self, trigger_source='', trigger_slope=Slope.RISING, trigger_level=0.0):
+		self.source = trigger_source
+		self.phase = get_trigger_phase(trigger_slope, trigger_level)
+
+	def disable_start_trig(self):
+		self.source = None
+		self.phase = None
+
+class _EmulatedReferenceTrigger:
+	def __init__(self):
+		self.source = None
+		self.phase = None
+		self.pretrig_samples = 0
+
+	def cfg_dig_edge_ref_trig(self, trigger_source, pretrigger_samples, trigger_edge=Edge.RISING):
+		self.source = trigger_source
+		self.pretrig_samples = pretrigger_samples
+		self.phase = get_trigger_phase(trigger_edge)
+
+	def cfg_anlg_edge_ref_trig(self, trigger_source, pretrigger_samples, trigger_slope=Slope.RISING, trigger_level=0.0):
+		self.source = trigger_source
+		self.pretrig_samples = pretrigger_samples
+		self.phase = get_trigger_phase(trigger_slope, trigger_level)
+
+	def disable_ref_trig(self):
+		self.source = None
+		self.phase = None
+		self.pretrig_samples = 0
+
+class _EmulatedTriggers:
+	def __init__(self):
+		self.start_trigger = _EmulatedStartTrigger()
+		self.reference_trigger = _EmulatedReferenceTrigger()
+
+# function to get the sweep phase (0 to 1) at which the simulated trigger line fires
+def get_trigger_phase(slope, level=None):
+	'''
+	With no level, the trigger is the sync output of the AFG (a digital edge), which rises at phase 0 and falls at phase 0.5. \
+	With a level, the trigger is the ramp monitor crossing level (V), which rises through it once per sweep and falls only at the reset (phase 0).
+	'''
+
+	if level is None:
+		return 0.0 if slope == Edge.RISING else 0.5
+	if slope != Slope.RISING:
+		return 0.0
+	if not RAMP_MINIMUM <= level < RAMP_MAXIMUM:
+		raise ValueError(f'Trigger level {level}V is outside the ramp ({RAMP_MINIMUM}V to {RAMP_MAXIMUM}V).')
+
+	return (level - RAMP_MINIMUM) / (RAMP_MAXIMUM - RAMP_MINIMUM)
+
+class EmulatedTask:
+	'''
+	Stands in for nidaqmx.Task. Produces the FPF trace of the channels currently on the emulated WSS, \
+	at a random ramp phase for every start (the AFG ramp is free running), and takes the real acquisition time (scaled by time_scale).
+
+	A start or reference trigger (task.triggers) is simulated from the AFG sync output or ramp monitor (see get_trigger_phase). \
+	The acquisition then waits for the trigger, which arrives at a random time within one sweep period, \
+	and every record starts at the same phase (pretrig_samples before the trigger, for a reference trigger).
+
+	Several inputs can be read together: ai0 is the FPF signal, ai1 the AFG ramp monitor, \
+	and any other input a tap photodiode that sees the same laser power drift as ai0.
+	'''
+
+	def __init__(self, time_scale=1.0, seed=None):
+		self.time_scale = time_scale
+		self.ai_channels = _EmulatedChannels()
+		self.timing = _EmulatedTiming()
+		self.triggers = _EmulatedTriggers()
+		self.in_stream = self
+
+		self._rng = np.random.default_rng(seed)
+		self._start_phase = 0.0
+		self._samples_read = 0
+		# samples acquired since the task was created, the clock of the power drift
+		self._samples_total = 0
+		self._running = False
+		self._callback_thread = None
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def control(self, mode):
+		pass
+
+	def start(self):
+		self._samples_read = 0
+		self._started_at = time.perf_counter()
+		self._running = True
+
+		start_trigger = self.triggers.start_trigger
+		reference_trigger = self.triggers.reference_trigger
+		if start_trigger.phase is None and reference_trigger.phase is None:
+			self._start_phase = self._rng.random()
+		else:
+			# the free running ramp reaches the trigger after a random part of a period
+			trigger_phase = start_trigger.phase if start_trigger.phase is not None else reference_trigger.phase
+			trigger_delay = self._rng.random() * SWEEP_PERIOD
+			pretrigger_time = reference_trigger.pretrig_samples / self.timing.sample_rate if reference_trigger.phase is not None else 0.0
+			# a reference trigger is only accepted once the pretrigger samples have been acquired
+			while trigger_delay < pretrigger_time:
+				trigger_delay += SWEEP_PERIOD
+
+			# the samples are acquired from pretrigger_time before the trigger
+			self._started_at += (trigger_delay - pretrigger_time) * self.time_scale
+			self._start_phase = (trigger_phase - pretrigger_time / SWEEP_PERIOD) % 1.0
+
+		if self._callback_thread is not None:
+			self._callback_thread.start()
+
+	def stop(self):
+		self._running = False
+
+	def close(self):
+		self._running = False
+		if self._callback_thread is not None and self._callback_thread.is_alive():
+			self._callback_thread.join()
+		self._callback_thread = None
+
+	@property
+	def number_of_channels(self):
+		return len(self.ai_channels.names)
+
+	# function to generate the next number_samples samples of every channel, shape (channels, number_samples)
+	def _generate(self, number_samples):
+		rate = self.timing.sample_rate
+
+		# wait until the samples would have been acquired
+		acquired_at = self._started_at + (self._samples_read + number_samples) / rate * self.time_scale
+		wait = acquired_at - time.perf_counter()
+		if wait > 0:
+			time.sleep(wait)
+
+		sample_indices = self._samples_read + np.arange(number_samples)
+		phases = (self._start_phase + sample_indices / (rate * SWEEP_PERIOD)) % 1.0
+		self._samples_read += number_samples
+
+		drift = 1 + POWER_DRIFT * np.sin(2 * np.pi * (self._samples_total + np.arange(number_samples)) / (rate * POWER_DRIFT_PERIOD))
+		self._samples_total += number_samples
+
+		data = np.empty((max(self.number_of_channels, 1), number_samples))
+		for i, name in enumerate(self.ai_channels.names or ['ai0']):
+			match = re.search(r'ai(\d+)$', name)
+			channel = int(match.group(1)) if match else 0
+			if channel == 0:
+				channel_numbers = np.arange(52, 88)
+				wss = EmulatedResourceManager.get_wss()
+				if wss is None:
+					transmission = np.ones(len(channel_numbers))
+				else:
+					transmission = wss.get_transmission(channel_numbers)
+				data[i] = drift * get_FPF_trace(phases, transmission, channel_numbers, rng=self._rng)
+			elif channel == 1:
+				data[i] = RAMP_MINIMUM + (RAMP_MAXIMUM - RAMP_MINIMUM) * phases + 0.001 * self._rng.standard_normal(number_samples)
+			else:
+				data[i] = drift * TAP_VOLTAGE + 0.002 * self._rng.standard_normal(number_samples)
+
+		return data
+
+	# function matching AnalogSingleChannelReader.read_many_sample (1D data) and AnalogMultiChannelReader.read_many_sample (2D data)
+	def read_many_sample(self, data, number_of_samples_per_channel=None, timeout=10.0):
+		if number_of_samples_per_channel is None:
+			number_of_samples_per_channel = data.shape[-1]
+
+		generated = self._generate(number_of_samples_per_channel)
+		if data.ndim == 1:
+			data[:number_of_samples_per_channel] = generated[0]
+		else:
+			data[:, :number_of_samples_per_channel] = generated
+
+		return number_of_samples_per_channel
+
+	# function matching Task.read, a list for one channel and a list of lists for several
+	def read(self, number_of_samples_per_channel=1, timeout=10.0):
+		generated = self._generate(number_of_samples_per_channel)
+		if self.number_of_channels <= 1:
+			return list(generated[0])
+
+		return [list(channel) for channel in generated]
+
+	# function matching Task.register_every_n_samples_acquired_into_buffer_event
+	def register_every_n_samples_acquired_into_buffer_event(self, sample_interval, callback_method):
+		# calls back from a thread for as long as the task runs, the callback reads the samples
+		def run():
+			while self._running:
+				target = self._started_at + (self._samples_read + sample_interval) / self.timing.sample_rate * self.time_scale
+				wait = target - time.perf_counter()
+				if wait > 0:
+					time.sleep(wait)
+				if not self._running:
+					break
+				callback_method(None, None, sample_interval, None)
+
+		self._callback_thread = threading.Thread(target=run, daemon=True)
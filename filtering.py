@@ -0,0 +1,181 @@
+import time
+import numpy as np
+from functools import lru_cache
+from scipy import fft as sp_fft
+from scipy.signal import butter, firwin, savgol_filter, sosfiltfilt
+
+# FILTERING OF BLOCKS OF SWEEPS
+# every function works on a whole 2D block (one sweep per row) at once, along the last axis
+# signal_filtering.ipynb removed the bins above 10Hz from the fft of one trace, this is lowpass(sweeps, 1e3, 10)
+
+# function to get the response of a lowpass filter at each rfft bin, cached so it is only computed once per length
+@lru_cache(maxsize=32)
+def get_lowpass_response(number_points, sample_rate, cutoff, order=None):
+	'''
+	Returns the real (zero phase) response of a lowpass filter at each bin of np.fft.rfft of number_points points. \
+	With order None the response is 1 below cutoff and 0 above (the cut in signal_filtering.ipynb), \
+	otherwise it is the magnitude of a Butterworth filter of that order, which rings less.
+
+	number_points: number of points in each sweep
+	sample_rate: sample rate in Hz
+	cutoff: cutoff frequency in Hz
+	order: order of the Butterworth response, or None for a sharp cut (default: None)
+	'''
+
+	frequencies = np.fft.rfftfreq(number_points, 1 / sample_rate)
+	if order is None:
+		response = (frequencies < cutoff).astype(float)
+	else:
+		response = 1 / np.sqrt(1 + (frequencies / cutoff)**(2 * order))
+
+	# the cached array is shared, so it must not be changed
+	response.flags.writeable = False
+
+	return response
+
+# function to lowpass filter a block of sweeps in the frequency domain
+def lowpass(sweeps, sample_rate, cutoff, order=None):
+	'''
+	Lowpass filters every sweep at once with rfft, a cached response (see get_lowpass_response) and irfft. \
+	The response is real, so there is no phase shift, and the sweeps are treated as periodic (as one full sweep period is). \
+	Returns an array of the same shape as sweeps.
+
+	sweeps: array of sweeps, one sweep per row (any number of dimensions, filtered along the last axis)
+	sample_rate: sample rate in Hz
+	cutoff: cutoff frequency in Hz
+	order: order of the Butterworth response, or None for a sharp cut (default: None)
+	'''
+
+	sweeps = np.asarray(sweeps, dtype=float)
+	number_points = sweeps.shape[-1]
+
+	response = get_lowpass_response(number_points, float(sample_rate), float(cutoff), order)
+
+	return np.fft.irfft(np.fft.rfft(sweeps, axis=-1) * response, n=number_points, axis=-1)
+
+# function to get the second order sections of a Butterworth lowpass filter, cached
+@lru_cache(maxsize=32)
+def get_butter_sos(sample_rate, cutoff, order=4):
+	return butter(order, cutoff, btype='low', fs=sample_rate, output='sos')
+
+# function to lowpass filter a block of sweeps forwards and backwards in time
+def filtfilt_lowpass(sweeps, sample_rate, cutoff, order=4):
+	'''
+	Lowpass filters every sweep at once with a Butterworth filter run forwards and backwards (zero phase). \
+	Use this rather than lowpass for sweeps that are not periodic (eg: part of a sweep). \
+	Returns an array of the same shape as sweeps.
+
+	sweeps: array of sweeps, one sweep per row (filtered along the last axis)
+	sample_rate: sample rate in Hz
+	cutoff: cutoff frequency in Hz
+	order: order of the Butterworth filter (default: 4)
+	'''
+
+	return sosfiltfilt(get_butter_sos(float(sample_rate), float(cutoff), order), np.asarray(sweeps, dtype=float), axis=-1)
+
+# function to smooth a block of sweeps with a Savitzky-Golay filter
+def savgol(sweeps, window_length, polyorder, mode='interp'):
+	'''
+	Smooths every sweep at once with savgol_filter (as used on the min and max envelopes in graphs.ipynb). \
+	Returns an array of the same shape as sweeps.
+
+	sweeps: array of sweeps, one sweep per row (filtered along the last axis)
+	window_length: number of points in the window
+	polyorder: order of the polynomial fitted in each window
+	mode: how the ends are handled, 'wrap' for periodic sweeps (default: 'interp', as in graphs.ipynb)
+	'''
+
+	return savgol_filter(np.asarray(sweeps, dtype=float), window_length, polyorder, axis=-1, mode=mode)
+
+class OverlapSaveFilter:
+	'''
+	Lowpass filters a continuous stream (eg: the blocks from Acquisition.start_continuous) one block at a time, \
+	with a linear phase FIR filter applied by fft convolution (overlap-save). \
+	The last number_taps - 1 samples of each block are kept, so the output is the same as filtering the whole stream at once, \
+	delayed by delay samples.
+
+	Blocks can have any length, and can be 2D (eg: channels x samples) to filter several channels together. \
+	As the callback of Acquisition.start_continuous, each filtered block is passed to on_output and kept as last_output.
+	'''
+
+	def __init__(self, sample_rate, cutoff, number_taps=101, on_output=None):
+		'''
+		sample_rate: sample rate in Hz
+		cutoff: cutoff frequency in Hz
+		number_taps: number of taps of the FIR filter, more gives a sharper cut (default: 101)
+		on_output: function of (filtered block, block index) called by callback with each filtered block, eg: stats.callback of a RunningStats (default: None)
+		'''
+
+		self.taps = firwin(number_taps, cutoff, fs=sample_rate)
+		# the delay of a linear phase filter, in samples
+		self.delay = (number_taps - 1) // 2
+
+		self.on_output = on_output
+
+		# the end of the previous block, None until the first block
+		self.history = None
+		# the last filtered block of callback, None until the first block
+		self.last_output = None
+		# the fft of the taps for each fft length used
+		self._responses = {}
+
+	# function to get the fft of the taps, cached for each fft length
+	def _get_response(self, fft_length):
+		if fft_length not in self._responses:
+			self._responses[fft_length] = np.fft.rfft(self.taps, n=fft_length)
+
+		return self._responses[fft_length]
+
+	# function to filter the next block of the stream
+	def process(self, block):
+		'''
+		Returns the filtered block, the same shape as block.
+
+		block: array of the next samples of the stream (filtered along the last axis)
+		'''
+
+		block = np.asarray(block, dtype=float)
+		number_history = len(self.taps) - 1
+
+		# the stream starts from zero
+		if self.history is None:
+			self.history = np.zeros(block.shape[:-1] + (number_history,))
+
+		extended = np.concatenate([self.history, block], axis=-1)
+		fft_length = sp_fft.next_fast_len(extended.shape[-1])
+		filtered = np.fft.irfft(np.fft.rfft(extended, n=fft_length, axis=-1) * self._get_response(fft_length), n=fft_length, axis=-1)
+
+		self.history = extended[..., -number_history:]
+
+		# the first number_history points wrapped around the circular convolution, only the rest are kept
+		return filtered[..., number_history:extended.shape[-1]]
+
+	# function matching the callback of Acquisition.start_continuous, eg: acquisition.start_continuous(1000, callback=lowpass_filter.callback)
+	def callback(self, block, block_index):
+		self.last_output = self.process(block)
+
+		if self.on_output is not None:
+			self.on_output(self.last_output, block_index)
+
+	# function to start the stream again
+	def reset(self):
+		self.history = None
+		self.last_output = None
+
+if __name__ == '__main__':
+	from loader import load_run
+
+	times, signals = load_run('Data/adjacent_channels')
+	sample_rate = 1 / (times[1] - times[0])
+
+	# one trace at a time, as in signal_filtering.ipynb
+	start_time = time.perf_counter()
+	for signal in signals:
+		fft_signal = np.fft.fft(signal)
+		fft_signal[np.abs(np.fft.fftfreq(signal.size, 1 / sample_rate)) >= 10] = 0
+		np.fft.ifft(fft_signal).real
+	print(f'Per trace fft: {time.perf_counter() - start_time:.4f}s for {len(signals)} sweeps')
+
+	start_time = time.perf_counter()
+	lowpass(signals, sample_rate, 10)
+	print(f'Batched rfft: {time.perf_counter() - start_time:.4f}s for {len(signals)} sweeps')
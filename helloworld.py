@@ -1,31 +1,17 @@
-import pyvisa
+from instruments import get_resource_manager
 
-rm = pyvisa.ResourceManager('@py')
+from discovery import discover, print_results, save_addresses
 
-instruments = rm.list_resources()
-print(f'All instruments: \n{instruments}')
-
-for inst in instruments:
-	this_resource = rm.open_resource(inst)
+# real or emulated instruments, see instruments.py
+rm = get_resource_manager()
 
-	this_resource.query_delay = 0.1
-	this_resource.baud_rate = 115200  # usually 9600
-	this_resource.write_termination = '\n'
-	this_resource.read_termination = '\n'
+instruments = rm.list_resources()
+print(f'All instruments: \n{instruments}\n')
 
-	print(f'\nTrying {inst}')
-	
-	valid_measurement = False
-	while ((valid_measurement == False)):
-		try:
-			#this_resource.write("*RST")
-			this_resource.write("*CLS")
-			print("Connected to ", this_resource.query('*IDN?'))
-			valid_measurement = True
-			print('SUCCESS')
-		except Exception as e:
-			print(f'FAILURE: {e}')
-			print('Trying again...')
+# every instrument is asked for its identity at once (*IDN? or the WSS SNO?), each reply waits at most 2s
+results = discover(rm, timeout=2.0)
+print_results(results)
 
-	this_resource.close()
-	print(f'\nClosing {inst}')
+# the addresses found are used by the other scripts, see instruments.get_address
+cache = save_addresses(results)
+print(f'\nFound {list(cache["instruments"])}')
@@ -0,0 +1,277 @@
+import sys
+import json
+import time
+import socket
+import threading
+import socketserver
+
+from instruments import get_config, get_resource_manager, get_address
+from wss import WSS
+from laser_source import LaserSource
+from retry import TRANSFER_ERRORS
+
+# PERSISTENT INSTRUMENT SESSIONS
+# a local server keeps the WSS, N7714A and AFG open with their settings applied,
+# so scripts and notebooks send commands to it instead of opening (and resetting) the instruments every time
+# python instrument_server.py   (then, eg: InstrumentClient().laser.query('sour1:pow?'))
+
+# every request and reply is one line of json
+# request: {"instrument": "laser", "method": "query", "args": ["sour1:pow?"], "kwargs": {}}
+# reply: {"result": ...} or {"error": "message", "type": "exception name"}
+# dictionary keys in results come back as strings (eg: the channels of wss.get_channels)
+
+# function to open the AFG and apply the settings
+def open_afg(name=None, resource_manager=None):
+	if name is None:
+		name = get_address('afg')
+	if resource_manager is None:
+		resource_manager = get_resource_manager()
+
+	afg = resource_manager.open_resource(name)
+
+	# settings
+	afg.query_delay = 0.1
+	afg.baud_rate = 9600
+	afg.write_termination = '\n'
+	afg.read_termination = '\n'
+
+	return afg
+
+# the function to open each instrument, and the methods that clients can call
+INSTRUMENTS = {
+	'wss': (WSS.open, ('command', 'query', 'serial_number', 'manufacture_date', 'get_channels', 'get_changes', 'set_URA')),
+	'laser': (LaserSource.open, ('write', 'query', 'identify', 'get_error', 'bring_up', 'wait_ready', 'turn_off')),
+	'afg': (open_afg, ('write', 'query')),
+}
+
+class InstrumentServerError(Exception):
+	'''
+	Raised by the client when the server replies with an error.
+	'''
+
+class InstrumentSessions:
+	'''
+	Holds one open session of each instrument, opened when first used and kept open. \
+	Each instrument has its own lock, so commands to one instrument are never interleaved, \
+	while commands to different instruments run at the same time.
+	'''
+
+	def __init__(self, instruments=INSTRUMENTS):
+		'''
+		instruments: dictionary of {name: (function to open the instrument, names of the methods that can be called)} (default: INSTRUMENTS)
+		'''
+
+		self.instruments = instruments
+		self.sessions = {}
+		self.locks = {name: threading.Lock() for name in instruments}
+
+		# number of calls and seconds spent in them, for each instrument
+		self.calls = {name: 0 for name in instruments}
+		self.busy_time = {name: 0.0 for name in instruments}
+
+	# function to call a method of an instrument
+	def call(self, instrument, method, args=(), kwargs=None):
+		'''
+		Calls method of instrument with args and kwargs, holding the lock of the instrument, and returns the result. \
+		The instrument is opened first if it is not open. \
+		It is closed if the call fails to reach it (TRANSFER_ERRORS, eg: a timeout), so the next call opens it again, \
+		while any other error (eg: a wrong argument) is raised with the session left open.
+
+		instrument: string of the instrument name, eg: 'laser'
+		method: string of the method name, eg: 'query'
+		args: list of the positional arguments (default: ())
+		kwargs: dictionary of the keyword arguments (default: None)
+		'''
+
+		if instrument not in self.instruments:
+			raise ValueError(f'Unknown instrument {instrument}, expected one of {list(self.instruments)}.')
+		opener, methods = self.instruments[instrument]
+		if method not in methods:
+			raise ValueError(f'{instrument} has no method {method}, expected one of {list(methods)}.')
+
+		with self.locks[instrument]:
+			start_time = time.perf_counter()
+			try:
+				if instrument not in self.sessions:
+					print(f'Opening {instrument}')
+					self.sessions[instrument] = opener()
+
+				return getattr(self.sessions[instrument], method)(*args, **(kwargs or {}))
+			except TRANSFER_ERRORS:
+				# the state of the session is not known after a failed transfer
+				self._close(instrument)
+				raise
+			finally:
+				self.calls[instrument] += 1
+				self.busy_time[instrument] += time.perf_counter() - start_time
+
+	# function to close the session of an instrument, if open
+	def _close(self, instrument):
+		session = self.sessions.pop(instrument, None)
+		if session is not None:
+			try:
+				session.close()
+			except Exception as e:
+				print(f'Closing {instrument} failed: {e}')
+
+	# function to close the session of an instrument, so the next call opens it again
+	def reopen(self, instrument):
+		with self.locks[instrument]:
+			self._close(instrument)
+
+	# function to get the state of every session
+	def status(self):
+		return {name: {'open': name in self.sessions, 'calls': self.calls[name], 'busy_time': self.busy_time[name]} for name in self.instruments}
+
+	# function to close every session
+	def close(self):
+		for instrument in self.instruments:
+			self.reopen(instrument)
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+	# function to handle every request of one client connection
+	def handle(self):
+		sessions = self.server.sessions
+		for line in self.rfile:
+			try:
+				request = json.loads(line)
+				method = request['method']
+				instrument = request.get('instrument')
+
+				# requests to the server itself have no instrument
+				if instrument is None:
+					if method == 'ping':
+						result = 'pong'
+					elif method == 'status':
+						result = sessions.status()
+					elif method == 'reopen':
+						sessions.reopen(request['args'][0])
+						result = None
+					else:
+						raise ValueError(f'Unknown server method {method}.')
+				else:
+					result = sessions.call(instrument, method, request.get('args', ()), request.get('kwargs'))
+
+				reply = {'result': result}
+			except Exception as e:
+				reply = {'error': str(e), 'type': type(e).__name__}
+
+			self.wfile.write((json.dumps(reply, default=str) + '\n').encode())
+
+class InstrumentServer(socketserver.ThreadingTCPServer):
+	'''
+	Serves the InstrumentSessions to local clients, one thread per client connection.
+	'''
+
+	daemon_threads = True
+	allow_reuse_address = True
+
+	def __init__(self, host=None, port=None, sessions=None):
+		'''
+		host: string of the address to listen on (default: the 'server' host of instruments.py, this computer only)
+		port: port to listen on (default: the 'server' port of instruments.py)
+		sessions: InstrumentSessions to serve (default: a new one of every instrument)
+		'''
+
+		server_config = get_config()['server']
+		host = server_config['host'] if host is None else host
+		port = server_config['port'] if port is None else port
+
+		self.sessions = InstrumentSessions() if sessions is None else sessions
+		super().__init__((host, port), _RequestHandler)
+
+	def server_close(self):
+		super().server_close()
+		self.sessions.close()
+
+class _InstrumentProxy:
+	'''
+	Calls the methods of one instrument on the server, eg: client.laser.query('*IDN?').
+	'''
+
+	def __init__(self, client, instrument):
+		self._client = client
+		self._instrument = instrument
+
+	def __getattr__(self, method):
+		return lambda *args, **kwargs: self._client.call(self._instrument, method, *args, **kwargs)
+
+class InstrumentClient:
+	'''
+	Connection to a running InstrumentServer. \
+	Each instrument is an attribute, eg: client.wss.set_URA(URA) or client.afg.write('OUTPut1:STATe 1').
+	'''
+
+	def __init__(self, host=None, port=None, timeout=60.0):
+		'''
+		host: string of the address of the server (default: the 'server' host of instruments.py)
+		port: port of the server (default: the 'server' port of instruments.py)
+		timeout: seconds to wait for a reply (default: 60.0, long enough for a laser bring_up)
+		'''
+
+		server_config = get_config()['server']
+		host = server_config['host'] if host is None else host
+		port = server_config['port'] if port is None else port
+
+		self._socket = socket.create_connection((host, port), timeout=timeout)
+		self._file = self._socket.makefile('rwb')
+		# one request at a time on the connection
+		self._lock = threading.Lock()
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	def __getattr__(self, instrument):
+		if instrument in INSTRUMENTS:
+			return _InstrumentProxy(self, instrument)
+
+		raise AttributeError(instrument)
+
+	# function to send a request and return the result
+	def _request(self, request):
+		with self._lock:
+			self._file.write((json.dumps(request) + '\n').encode())
+			self._file.flush()
+			line = self._file.readline()
+
+		if not line:
+			raise InstrumentServerError('The server closed the connection.')
+
+		reply = json.loads(line)
+		if 'error' in reply:
+			raise InstrumentServerError(f'{reply["type"]}: {reply["error"]}')
+
+		return reply['result']
+
+	# function to call a method of an instrument on the server
+	def call(self, instrument, method, *args, **kwargs):
+		return self._request({'instrument': instrument, 'method': method, 'args': args, 'kwargs': kwargs})
+
+	# function to check the server is running
+	def ping(self):
+		return self._request({'method': 'ping'}) == 'pong'
+
+	# function to get the state of every session on the server
+	def status(self):
+		return self._request({'method': 'status'})
+
+	# function to close and reopen the session of an instrument on the next call
+	def reopen(self, instrument):
+		self._request({'method': 'reopen', 'args': [instrument]})
+
+	def close(self):
+		self._file.close()
+		self._socket.close()
+
+if __name__ == '__main__':
+	server = InstrumentServer(port=int(sys.argv[1]) if len(sys.argv) > 1 else None)
+	print(f'Serving instruments on {server.server_address[0]}:{server.server_address[1]}, stop with Ctrl+C')
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
@@ -0,0 +1,130 @@
+import os
+import json
+import pyvisa
+
+try:
+	import nidaqmx
+	from nidaqmx.stream_readers import AnalogSingleChannelReader, AnalogMultiChannelReader
+except ImportError:
+	# only the emulated daq can be used without nidaqmx
+	nidaqmx = None
+
+from emulators import EmulatedResourceManager, EmulatedTask
+
+# CHOOSING BETWEEN THE REAL AND EMULATED INSTRUMENTS
+
+# the configuration is read from instruments.json (next to this file), eg: {"backend": "emulated", "time_scale": 0}
+# the OSNR_BACKEND environment variable overrides the backend in the file
+CONFIG_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instruments.json')
+
+# the addresses found by discovery.py, used instead of the default addresses for the same backend
+ADDRESS_CACHE_FILENAME = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instrument_addresses.json')
+
+DEFAULT_CONFIG = {
+	# 'real' or 'emulated'
+	'backend': 'real',
+	# multiplier of every emulated delay, 1 is real time and 0 is as fast as possible
+	'time_scale': 1.0,
+	# the address of each instrument
+	'addresses': {
+		'wss': 'ASRL4::INSTR',
+		'laser': 'USB0::2391::14104::MY50701053::0::INSTR',
+		'afg': 'USB0::1689::835::C021197::0::INSTR',
+	},
+	# where instrument_server.py listens, only on this computer
+	'server': {'host': '127.0.0.1', 'port': 50714},
+}
+
+# function to read the configuration
+def get_config():
+	'''
+	Returns the configuration, from instruments.json if it exists (otherwise DEFAULT_CONFIG), \
+	with the backend overridden by the OSNR_BACKEND environment variable if it is set. \
+	Addresses are the defaults, replaced by those found by discovery.py for the backend, replaced by those in instruments.json.
+	'''
+
+	config = json.loads(json.dumps(DEFAULT_CONFIG))
+	file_addresses = {}
+	if os.path.exists(CONFIG_FILENAME):
+		with open(CONFIG_FILENAME, 'r') as file:
+			file_config = json.load(file)
+		file_addresses = file_config.pop('addresses', {})
+		config.update(file_config)
+
+	if 'OSNR_BACKEND' in os.environ:
+		config['backend'] = os.environ['OSNR_BACKEND']
+
+	config['addresses'].update(get_cached_addresses(config['backend']))
+	config['addresses'].update(file_addresses)
+
+	return config
+
+# function to read the addresses found by discovery.py
+def get_cached_addresses(backend):
+	'''
+	Returns the addresses found by the last discovery with backend, as a dictionary of {name: address} \
+	(empty if there has been no discovery with that backend).
+
+	backend: 'real' or 'emulated'
+	'''
+
+	if not os.path.exists(ADDRESS_CACHE_FILENAME):
+		return {}
+
+	with open(ADDRESS_CACHE_FILENAME, 'r') as file:
+		cache = json.load(file)
+	if cache.get('backend') != backend:
+		return {}
+
+	return {name: instrument['address'] for name, instrument in cache['instruments'].items()}
+
+# function to check whether the emulators are used
+def is_emulated():
+	return get_config()['backend'] == 'emulated'
+
+# function to get the address of an instrument
+def get_address(name):
+	'''
+	Returns the address of the instrument name ('wss', 'laser' or 'afg') from the configuration.
+	'''
+
+	return get_config()['addresses'][name]
+
+# function to get a resource manager for the configured backend
+def get_resource_manager():
+	'''
+	Returns pyvisa.ResourceManager('@py'), or an EmulatedResourceManager if the backend is 'emulated'.
+	'''
+
+	config = get_config()
+	if config['backend'] == 'emulated':
+		return EmulatedResourceManager(time_scale=config['time_scale'])
+
+	return pyvisa.ResourceManager('@py')
+
+# function to create a daq task for the configured backend
+def create_daq_task():
+	'''
+	Returns a new nidaqmx.Task, or an EmulatedTask if the backend is 'emulated'.
+	'''
+
+	config = get_config()
+	if config['backend'] == 'emulated':
+		return EmulatedTask(time_scale=config['time_scale'])
+
+	return nidaqmx.Task()
+
+# function to create the stream reader of a daq task
+def create_reader(task):
+	'''
+	Returns an AnalogSingleChannelReader of the task (an AnalogMultiChannelReader if it has more than one channel), \
+	or the task itself if it is emulated (it reads the same way).
+	'''
+
+	if isinstance(task, EmulatedTask):
+		return task
+
+	if task.number_of_channels > 1:
+		return AnalogMultiChannelReader(task.in_stream)
+
+	return AnalogSingleChannelReader(task.in_stream)
@@ -0,0 +1,240 @@
+import time
+from pyvisa.errors import VisaIOError
+
+from instruments import get_resource_manager, get_address
+from retry import RetryingResource
+
+# CONTROLLER FOR THE N7714A LASER SOURCE
+
+# the sources of the N7714A
+PORTS = (1, 2, 3, 4)
+
+class LaserSourceError(Exception):
+	'''
+	Raised when the sources do not settle before the timeout, or a source is not on once they have.
+	'''
+
+class LaserSource:
+	'''
+	Owns the session with the N7714A. \
+	bring_up sends the settings of every source in one pass and then polls *OPC? until every operation has completed, \
+	so bringing up all sources takes as long as the slowest one, instead of a fixed sleep per source.
+
+	sour{i}:pow:state? only returns the state each source was set to, not whether it has warmed up or finished tuning, \
+	so *OPC? (which covers every source) is the only settling indicator, and the time is of all the sources together.
+	'''
+
+	def __init__(self, resource, verbose=False):
+		'''
+		Should usually be created with LaserSource.open.
+
+		resource: an open pyvisa resource of the N7714A, with the settings applied
+		verbose: boolean of whether to print every command sent (default: False)
+		'''
+
+		self.resource = resource
+		self.verbose = verbose
+
+		# seconds the sources took to settle in the last bring_up
+		self.settle_time = None
+
+	# function to open and configure the session
+	@classmethod
+	def open(cls, name=None, resource_manager=None, verbose=False):
+		'''
+		Opens the N7714A and applies the settings.
+
+		name: string of the resource name (default: the address of 'laser' in instruments.py)
+		resource_manager: pyvisa ResourceManager to use (default: the configured one from instruments.py)
+		verbose: boolean of whether to print every command sent (default: False)
+		'''
+
+		if name is None:
+			name = get_address('laser')
+		if resource_manager is None:
+			resource_manager = get_resource_manager()
+
+		resource = resource_manager.open_resource(name)
+
+		# settings
+		resource.query_delay = 0.5
+		resource.baud_rate = 9600
+		resource.write_termination = '\n'
+		resource.read_termination = '\n'
+
+		if verbose:
+			print(f'Trying {name}')
+
+		return cls(resource, verbose=verbose)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	# function to send a command
+	def write(self, command):
+		if self.verbose:
+			print(command)
+
+		self.resource.write(command)
+
+	# function to send a command and return the reply
+	def query(self, command):
+		if self.verbose:
+			print(command)
+
+		return self.resource.query(command).strip()
+
+	# function to get the identity
+	def identify(self):
+		return self.query('*IDN?')
+
+	# function to get the oldest error in the error queue
+	def get_error(self):
+		return self.query('SYSTem:ERRor?')
+
+	# function to get the commands that apply the settings of one source, before and after it is turned on
+	@staticmethod
+	def _get_commands(port, settings):
+		'''
+		Returns (commands sent while the source is off, commands sent once it is turned on, whether it is turned on).
+
+		port: source number
+		settings: dictionary of the settings of the source (see bring_up)
+		'''
+
+		before = []
+		after = []
+
+		# the mode can only be changed while the source is off
+		if 'grid' in settings:
+			grid = settings['grid']
+			before += [f'sour{port}:pow:state 0', f'sour{port}:freq:auto 0']
+			before += [f'sour{port}:freq:{header} {grid[name]}' for name, header in (('reference', 'ref'), ('spacing', 'grid'), ('offset', 'offs')) if name in grid]
+			before.append(f'sour{port}:freq:togr {grid["frequency"]}')
+		elif 'wavelength' in settings:
+			before += [f'sour{port}:pow:state 0', f'sour{port}:freq:auto 1']
+			before.append(f'sour{port}:wav {settings["wavelength"]}nm')
+
+		state = settings.get('state', True)
+		if state:
+			after.append(f'sour{port}:pow:state 1')
+		else:
+			before.append(f'sour{port}:pow:state 0')
+
+		# 0 is dBm, 1 is W
+		after.append(f'sour{port}:pow:unit {settings.get("unit", 0)}')
+		if 'power' in settings:
+			after.append(f'sour{port}:pow {settings["power"]}')
+
+		return before, after, state
+
+	# function to check whether every operation has completed
+	def operations_complete(self):
+		'''
+		Returns True if *OPC? reads 1. An instrument that only replies once the operations have completed \
+		makes the query time out instead, which is taken as not complete (the late reply is cleared so it is not read later).
+		'''
+
+		# a timeout is expected while polling, so it is not retried (and does not use up the retry budget)
+		resource = self.resource.resource if isinstance(self.resource, RetryingResource) else self.resource
+
+		if self.verbose:
+			print('*OPC?')
+
+		try:
+			return resource.query('*OPC?').strip() == '1'
+		except (VisaIOError, TimeoutError):
+			resource.clear()
+			return False
+
+	# function to wait until every operation (eg: warming up or tuning) has completed
+	def wait_ready(self, ports=(), timeout=60.0, poll_interval=0.2, start_time=None):
+		'''
+		Polls *OPC? until every operation has completed, then checks that each source in ports is set on (sour{i}:pow:state?). \
+		Returns the seconds taken. \
+		Raises LaserSourceError if the operations have not completed after timeout seconds, or a source in ports is not on.
+
+		ports: list of the sources that should be on (default: (), none are checked)
+		timeout: seconds to wait for (default: 60.0)
+		poll_interval: seconds between polls (default: 0.2)
+		start_time: time.perf_counter() the settings were sent, that the time is from (default: now)
+		'''
+
+		if start_time is None:
+			start_time = time.perf_counter()
+
+		while not self.operations_complete():
+			if time.perf_counter() - start_time > timeout:
+				raise LaserSourceError(f'Operations were not complete within {timeout}s.')
+
+			time.sleep(poll_interval)
+
+		settle_time = time.perf_counter() - start_time
+
+		off = [port for port in ports if self.query(f'sour{port}:pow:state?') != '1']
+		if len(off) > 0:
+			raise LaserSourceError(f'Lasers {off} are not on.')
+
+		return settle_time
+
+	# function to get the commands of bring_up, in the order they are sent
+	def get_bring_up_commands(self, settings):
+		'''
+		Returns (list of the commands that apply settings to every source, list of the sources that are turned on), \
+		with all the settings that need a source off first, then turning on and setting the power (see bring_up).
+
+		settings: dictionary of {port: settings} (see bring_up)
+		'''
+
+		commands = {port: self._get_commands(port, port_settings) for port, port_settings in settings.items()}
+
+		before = [command for port_before, _, _ in commands.values() for command in port_before]
+		after = [command for _, port_after, _ in commands.values() for command in port_after]
+
+		return before + after, [port for port, (_, _, state) in commands.items() if state]
+
+	# function to apply the settings of every source and wait until they have settled
+	def bring_up(self, settings, timeout=60.0, poll_interval=0.2):
+		'''
+		Sends the settings of every source in one pass (all the settings that need the source off first, \
+		then turning on and setting the power), and waits for every operation to complete (see wait_ready). \
+		Returns the seconds the sources took to settle.
+
+		settings: dictionary of {port: settings}, where the settings of each source are a dictionary of
+			'power': power in the unit (eg: 10)
+			'unit': 0 for dBm or 1 for W (default: 0)
+			'wavelength': wavelength in nm, tuned in auto mode (eg: 1552)
+			'grid': dictionary of 'reference', 'spacing', 'offset' and 'frequency' with their units, tuned in grid mode (eg: {'frequency': '193.41THz', 'spacing': '100GHz'})
+			'state': boolean of whether to turn the source on (default: True)
+		timeout: seconds to wait for the sources to settle (default: 60.0)
+		poll_interval: seconds between polls (default: 0.2)
+		'''
+
+		commands, ports = self.get_bring_up_commands(settings)
+
+		start_time = time.perf_counter()
+		for command in commands:
+			self.write(command)
+
+		self.settle_time = self.wait_ready(ports, timeout, poll_interval, start_time)
+		print(f'LASERS {ports} READY after {self.settle_time:.1f}s')
+
+		return self.settle_time
+
+	# function to turn sources off
+	def turn_off(self, ports=PORTS):
+		for port in ports:
+			self.write(f'sour{port}:pow:state 0')
+
+	# function to close the session
+	def close(self):
+		self.resource.close()
+
+if __name__ == '__main__':
+	with LaserSource.open(verbose=True) as laser:
+		print('Connected to', laser.identify())
+		laser.bring_up({port: {'power': 10, 'wavelength': 1552} for port in PORTS})
+		laser.turn_off()
@@ -0,0 +1,181 @@
+import os
+import glob
+import json
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+from sweep_store import HEADER_NAME, SweepStore, read_text_header, read_text_reading
+
+# FUNCTIONS FOR LOADING A RUN OF READINGS FROM DATA/
+
+# the sidecar cache written next to the readings of a run
+# the cache is only used while every reading has the same name, modification time and size as when it was written
+CACHE_NAME = '.reading_cache.npy'
+CACHE_TIMES_NAME = '.reading_cache_times.npy'
+CACHE_KEY_NAME = '.reading_cache.json'
+
+# function to read only the signal of one reading, run in the worker processes
+def _read_reading(filename):
+	_, times, signal = read_text_reading(filename)
+	return times, signal
+
+# function to get the key of the readings in a run, used to check the cache is up to date
+def get_cache_key(filenames):
+	'''
+	Returns a list of [name, modification time (ns), size (bytes)] for each file.
+
+	filenames: list of strings of the paths to the readings
+	'''
+
+	key = []
+	for filename in filenames:
+		stat = os.stat(filename)
+		key.append([os.path.basename(filename), stat.st_mtime_ns, stat.st_size])
+
+	return key
+
+# function to open the cache of a run, returns None if there is no cache or it is out of date
+def _open_cache(run_dir, key):
+	try:
+		with open(os.path.join(run_dir, CACHE_KEY_NAME), 'r') as file:
+			cached_key = json.load(file)
+		if cached_key != key:
+			return None
+
+		times = np.load(os.path.join(run_dir, CACHE_TIMES_NAME))
+		signals = np.load(os.path.join(run_dir, CACHE_NAME), mmap_mode='r')
+	except (OSError, ValueError):
+		return None
+
+	return times, signals
+
+# function to yield (times, signals) blocks of a text run, filling the cache as it goes
+def _iter_text_run(run_dir, filenames, key, chunk_size, processes, cache):
+	cache_arr = None
+	cache_path = os.path.join(run_dir, CACHE_NAME)
+	key_path = os.path.join(run_dir, CACHE_KEY_NAME)
+
+	# remove any old key first, so a half written cache is never used
+	if cache and os.path.exists(key_path):
+		os.remove(key_path)
+
+	with ProcessPoolExecutor(max_workers=processes) as executor:
+		for start in range(0, len(filenames), chunk_size):
+			results = list(executor.map(_read_reading, filenames[start:start + chunk_size]))
+			times = results[0][0]
+			block = np.array([signal for _, signal in results])
+
+			if cache:
+				# create the cache once the number of samples is known
+				if cache_arr is None:
+					np.save(os.path.join(run_dir, CACHE_TIMES_NAME), times)
+					cache_arr = np.lib.format.open_memmap(
+						cache_path,
+						mode='w+',
+						dtype=block.dtype,
+						shape=(len(filenames), block.shape[-1]),
+					)
+				cache_arr[start:start + len(block)] = block
+
+			yield times, block
+
+	# only write the key once every reading is in the cache
+	if cache_arr is not None:
+		cache_arr.flush()
+		del cache_arr
+		with open(key_path, 'w') as file:
+			json.dump(key, file)
+
+# function to get the header of every reading of a run, without reading the data
+def get_run_headers(run_dir):
+	'''
+	Returns a list of the header of each reading in run_dir, in order. \
+	The header of a text reading is its '#' lines joined by '\\n', \
+	and the header of a SweepStore sweep is the URA it was saved with (an imported text run keeps the whole header there).
+
+	run_dir: string of the directory of the run (eg: 'Data/channel_sim')
+	'''
+
+	if os.path.exists(os.path.join(run_dir, HEADER_NAME)):
+		return [metadata.get('URA', '') for metadata in SweepStore.open(run_dir).metadata]
+
+	filenames = sorted(glob.glob(os.path.join(run_dir, 'reading_*.txt')))
+	if len(filenames) == 0:
+		raise FileNotFoundError(f'No reading_*.txt files in {run_dir}.')
+
+	return [read_text_header(filename) for filename in filenames]
+
+# function to load a run in chunks, for runs too large to hold in memory
+def iter_run(run_dir, chunk_size=50, periods=2, processes=None, cache=True):
+	'''
+	Yields (times, signals) for each chunk of chunk_size readings in run_dir, \
+	where times is a 1D array and signals is a 2D array with one reading per row. \
+	Only the first of the periods in each reading is kept (the readings are periodic).
+
+	Text runs (reading_NNN.txt files) are read in a process pool, and a binary cache is written next to them, \
+	so later loads are read from the cache. A SweepStore directory is read directly from its memory map.
+
+	run_dir: string of the directory of the run (eg: 'Data/channel_sim')
+	chunk_size: number of readings per chunk (default: 50)
+	periods: number of periods in each reading, only the first is kept (default: 2, readings are 2s of a 1s period)
+	processes: number of worker processes (default: number of cpus)
+	cache: boolean of whether to use and write the binary cache (default: True)
+	'''
+
+	# the number of samples to keep in each reading
+	keep = lambda number_samples: number_samples // periods
+
+	# binary stores are already memory mapped
+	if os.path.exists(os.path.join(run_dir, HEADER_NAME)):
+		store = SweepStore.open(run_dir)
+		number_samples = keep(store.number_samples)
+		times = store.times[:number_samples]
+		for start in range(0, len(store), chunk_size):
+			yield times, store.data[start:start + chunk_size, :number_samples]
+		return
+
+	filenames = sorted(glob.glob(os.path.join(run_dir, 'reading_*.txt')))
+	if len(filenames) == 0:
+		raise FileNotFoundError(f'No reading_*.txt files in {run_dir}.')
+	key = get_cache_key(filenames)
+
+	cached = _open_cache(run_dir, key) if cache else None
+	if cached is not None:
+		times, signals = cached
+		number_samples = keep(signals.shape[-1])
+		for start in range(0, len(signals), chunk_size):
+			yield times[:number_samples], signals[start:start + chunk_size, :number_samples]
+		return
+
+	for times, block in _iter_text_run(run_dir, filenames, key, chunk_size, processes, cache):
+		number_samples = keep(block.shape[-1])
+		yield times[:number_samples], block[:, :number_samples]
+
+# function to load a whole run as one array
+def load_run(run_dir, periods=2, processes=None, cache=True, chunk_size=50):
+	'''
+	Loads every reading in run_dir into one array, reading chunk_size readings at a time (see iter_run) and joining them. \
+	Returns (times, signals), where times is a 1D array and signals is a 2D array with one reading per row. \
+	Only the first of the periods in each reading is kept (the readings are periodic). \
+	Raises FileNotFoundError if the run has no readings.
+
+	Replaces the loop of np.loadtxt(f'Data/channel_sim/reading_{i:03}.txt', ...) in graphs.ipynb, see iter_run.
+
+	run_dir: string of the directory of the run (eg: 'Data/channel_sim')
+	periods: number of periods in each reading, only the first is kept (default: 2, readings are 2s of a 1s period)
+	processes: number of worker processes (default: number of cpus)
+	cache: boolean of whether to use and write the binary cache (default: True)
+	chunk_size: number of readings per chunk (default: 50)
+	'''
+
+	blocks = []
+	times = None
+	for times, block in iter_run(run_dir, chunk_size=chunk_size, periods=periods, processes=processes, cache=cache):
+		blocks.append(block)
+
+	# a text run without readings is raised by iter_run, an empty SweepStore yields nothing
+	if len(blocks) == 0:
+		raise FileNotFoundError(f'No readings in {run_dir}.')
+
+	# copied into memory, rather than returned as a memory map of a store or cache
+	return np.array(times), np.concatenate(blocks)
@@ -0,0 +1,189 @@
+import sys
+import time
+import threading
+from collections import deque
+import numpy as np
+import matplotlib.pyplot as plt
+
+from acquisition import Acquisition
+from alignment import get_reference_window, align_sweeps
+from conversions import V_to_dBm, s_to_THz, SWEEP_PERIOD
+from osnr import ChannelWindows, compute_OSNR
+
+# LIVE OSNR MONITOR
+# acquires continuously and redraws one persistent figure with blitting, instead of a new plt.show() per acquisition
+# python monitor.py [seconds]
+
+class OSNRMonitor:
+	'''
+	Shows the aligned dBm trace and the OSNR of each channel of the latest sweep, while acquiring continuously. \
+	The figure is drawn once, and each frame only redraws the changing artists over a saved background (blitting).
+
+	Sweeps arrive in the ring buffer of the acquisition (see Acquisition.start_continuous), so memory is bounded. \
+	If drawing is slower than acquisition, only the latest sweep is drawn and the sweeps in between are counted as dropped.
+	'''
+
+	def __init__(self, acquisition, marker_window=None, windows=None, number_blocks=16):
+		'''
+		acquisition: an Acquisition (it does not need to be open)
+		marker_window: 1D array of the marker window to align each sweep to (default: alignment.get_reference_window())
+		windows: ChannelWindows of the frequency axis (default: the measured channels on the s_to_THz axis)
+		number_blocks: number of sweeps in the ring buffer (default: 16)
+		'''
+
+		self.acquisition = acquisition
+		self.marker_window = get_reference_window() if marker_window is None else marker_window
+		self.number_blocks = number_blocks
+
+		# one block is one full sweep period
+		self.block_size = int(acquisition.sample_rate * SWEEP_PERIOD)
+		self.frequencies = s_to_THz(np.arange(self.block_size) / acquisition.sample_rate)
+		self.windows = ChannelWindows(self.frequencies) if windows is None else windows
+
+		# index of the latest block acquired, set from the acquisition callback
+		self._latest = -1
+		self._new_block = threading.Event()
+
+		# counts for the report
+		self.frames = 0
+		self.dropped = 0
+		self.overwritten = 0
+		# times of the last 100 frames, for the frame rate
+		self.frame_times = deque(maxlen=100)
+		self.start_time = None
+		self.end_time = None
+
+		self.figure = None
+		self.background = None
+
+	# function called by the acquisition for every block
+	def _on_block(self, block, block_index):
+		self._latest = block_index
+		self._new_block.set()
+
+	# function to create the figure and the artists updated every frame
+	def _create_figure(self):
+		self.figure, (self.trace_ax, self.OSNR_ax) = plt.subplots(2, 1, figsize=(12, 8))
+
+		self.trace_line, = self.trace_ax.plot(self.frequencies, np.full(self.block_size, np.nan), 'b', animated=True)
+		self.trace_ax.set_xlim(self.frequencies.min(), self.frequencies.max())
+		self.trace_ax.set_ylim(-70, -30)
+		self.trace_ax.set_xlabel('Frequency (THz)')
+		self.trace_ax.set_ylabel('Power (dBm)')
+
+		channels = self.windows.channels_THz
+		self.OSNR_line, = self.OSNR_ax.plot(channels, np.full(len(channels), np.nan), 'ro', animated=True)
+		self.OSNR_ax.set_xlim(channels.min() - 0.1, channels.max() + 0.1)
+		self.OSNR_ax.set_ylim(0, 20)
+		self.OSNR_ax.set_xlabel('Frequency (THz)')
+		self.OSNR_ax.set_ylabel('OSNR (dB)')
+
+		self.status_text = self.trace_ax.text(0.01, 0.95, '', transform=self.trace_ax.transAxes, va='top', animated=True)
+
+		# the background is saved again whenever the whole figure is redrawn (eg: resized)
+		self.figure.canvas.mpl_connect('draw_event', self._save_background)
+		plt.show(block=False)
+		self.figure.canvas.draw()
+
+	# function to save the figure without the animated artists
+	def _save_background(self, event=None):
+		self.background = self.figure.canvas.copy_from_bbox(self.figure.bbox)
+		self._draw_artists()
+
+	# function to draw the animated artists
+	def _draw_artists(self):
+		for artist in (self.trace_line, self.OSNR_line, self.status_text):
+			artist.axes.draw_artist(artist)
+
+	# function to process and draw one sweep
+	def _draw_frame(self, block):
+		aligned, _, _ = align_sweeps(block, self.marker_window)
+		signal = V_to_dBm(aligned[0])
+		OSNR, _, _ = compute_OSNR(signal, self.windows)
+
+		self.trace_line.set_ydata(signal)
+		self.OSNR_line.set_ydata(OSNR[0])
+		self.status_text.set_text(f'{self.get_frame_rate():.1f} fps, {self.dropped} dropped')
+
+		canvas = self.figure.canvas
+		canvas.restore_region(self.background)
+		self._draw_artists()
+		canvas.blit(self.figure.bbox)
+		canvas.flush_events()
+
+	# function to get the frame rate over the last frames
+	def get_frame_rate(self):
+		if len(self.frame_times) < 2:
+			return 0.0
+
+		return (len(self.frame_times) - 1) / (self.frame_times[-1] - self.frame_times[0])
+
+	# function to run the monitor
+	def run(self, duration=None):
+		'''
+		Acquires and draws until the figure is closed, or for duration seconds.
+
+		duration: seconds to run for (default: None, until the figure is closed)
+		'''
+
+		self._create_figure()
+		self.acquisition.start_continuous(self.block_size, number_blocks=self.number_blocks, callback=self._on_block)
+
+		self.start_time = time.perf_counter()
+		last_drawn = -1
+		try:
+			while plt.fignum_exists(self.figure.number):
+				if duration is not None and time.perf_counter() - self.start_time > duration:
+					break
+
+				# wait for a new sweep, keeping the figure responsive
+				if not self._new_block.wait(timeout=0.05):
+					self.figure.canvas.flush_events()
+					continue
+				self._new_block.clear()
+
+				latest = self._latest
+				self.dropped += latest - last_drawn - 1
+				last_drawn = latest
+
+				# copy the sweep out of the ring buffer before it can be overwritten
+				block = self.acquisition.get_block(latest)
+				if block is None:
+					self.overwritten += 1
+					continue
+				block = np.array(block)
+
+				self.frames += 1
+				self.frame_times.append(time.perf_counter())
+
+				self._draw_frame(block)
+		finally:
+			self.end_time = time.perf_counter()
+			self.acquisition.close()
+
+	# function to print the frame rate and dropped sweeps
+	def report(self):
+		elapsed = self.end_time - self.start_time
+		sweeps = self.frames + self.dropped + self.overwritten
+		print(f'Drew {self.frames} of {sweeps} sweeps in {elapsed:.2f}s ({self.frames / elapsed:.2f} fps)')
+		print(f'Dropped {self.dropped} sweeps (drawing was behind acquisition), {self.overwritten} overwritten before drawing')
+
+# function to run the monitor on the configured daq
+def monitor(device='Dev1', sample_rate=1e3, duration=None):
+	'''
+	Opens the daq (real or emulated, see instruments.py) and runs an OSNRMonitor until the figure is closed, \
+	or for duration seconds, then prints the report.
+
+	device: the name of the device used as listed in NI MAX
+	sample_rate: sample rate in Hz
+	duration: seconds to run for (default: None, until the figure is closed)
+	'''
+
+	osnr_monitor = OSNRMonitor(Acquisition(device, sample_rate, acquire_time=SWEEP_PERIOD))
+	osnr_monitor.run(duration)
+	osnr_monitor.report()
+
+	return osnr_monitor
+
+if __name__ == '__main__':
+	monitor(duration=float(sys.argv[1]) if len(sys.argv) > 1 else None)
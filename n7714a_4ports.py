@@ -1,59 +1,51 @@
-import pyvisa
-import time
+from instruments import get_resource_manager, get_address
 
-rm = pyvisa.ResourceManager('@py')
+from laser_source import LaserSource, PORTS
+from retry import CommandSequence, RetryPolicy, RetryingResource
 
-tl_name = 'USB0::2391::14104::MY50701053::0::INSTR'
-tl = rm.open_resource(tl_name)
+# real or emulated instruments, see instruments.py
+rm = get_resource_manager()
 
-tl.query_delay = 0.5
-tl.baud_rate = 9600
-tl.write_termination = '\n'
-tl.read_termination = '\n'
+tl_name = get_address('laser')
+tl = LaserSource.open(tl_name, rm)
 
 print(f'Trying {tl_name}')
 
-tl.write("*RST")
-tl.write("*CLS")
-
-time.sleep(5)
-
-valid_measurement = False
-while ((valid_measurement == False)):
-	try:
-		print("Connected to", tl.query('*IDN?'))
-
-		print("Any Errors?", tl.query("SYSTem:ERRor?"), "\n")
-
-		for i in range(1, 5):  # check all 4 sources
-			print(f"LASER {i}")
-			
-			# power
-			tl.write(f"sour{i}:pow:state 1")  # turn on laser
-			time.sleep(10)
-
-			tl.write(f'sour{i}:pow:unit 0')  # set to dBm
-			tl.write(f'sour{i}:pow 10')  # set to 10dBm / 10mW
-			print(f"sour{i}:pow?", tl.query(f'sour{i}:pow?'))
-
-			# wavelength
-			tl.write(f"sour{i}:wav:auto on")  # turn on auto mode
-			print(f"sour{i}:wav:auto?", tl.query(f"sour{i}:wav:auto?"))
-
-			tl.write(f"sour{i}:wav 1552nm")  # changes wavelength to 1552nm
-			print(f"sour{i}:wav?", tl.query(f"sour{i}:wav?"), "\n")
-
-			time.sleep(5)
-
-		tl.write("sour1:pow:state 0")  # turn off laser
-		tl.write("sour2:pow:state 0")  # turn off laser
-		tl.write("sour3:pow:state 0")  # turn off laser
-		tl.write("sour4:pow:state 0")  # turn off laser
-
-		valid_measurement = True
-		print('SUCCESS')
-	except Exception as e:
-		print(f'FAILURE: {e}')
-		print('Trying again...')
+# each command is retried on its own (at most 3 times, 10 retries in total), see retry.py
+tl.resource = RetryingResource(tl.resource, RetryPolicy(attempts=3, budget=10))
+
+# a failed step can be resumed with steps.run()
+steps = CommandSequence()
+
+steps.add("*RST", tl.write, "*RST")
+steps.add("*CLS", tl.write, "*CLS")
+# wait for the reset to complete
+steps.add("reset complete", tl.wait_ready, [], timeout=30)
+
+steps.add("*IDN?", lambda: print("Connected to", tl.identify()))
+steps.add("errors", lambda: print("Any Errors?", tl.get_error(), "\n"))
+
+# all 4 sources at 10dBm / 10mW and 1552nm, brought up together (see LaserSource.bring_up)
+commands, ports = tl.get_bring_up_commands({i: {'power': 10, 'unit': 0, 'wavelength': 1552} for i in PORTS})
+for command in commands:
+	steps.add(command, tl.write, command)
+steps.add("lasers ready", lambda: print(f"LASERS {ports} READY after {tl.wait_ready(ports):.1f}s"))
+
+for i in PORTS:  # check all 4 sources
+	steps.add(f"check laser {i}", lambda i=i: print(
+		f"LASER {i}\n"
+		f"sour{i}:pow? {tl.query(f'sour{i}:pow?')}\n"
+		f"sour{i}:freq:auto? {tl.query(f'sour{i}:freq:auto?')}\n"
+		f"sour{i}:wav? {tl.query(f'sour{i}:wav?')}\n"
+	))
+
+steps.add("turn off", tl.turn_off, PORTS)  # turn off lasers
+
+try:
+	steps.run()
+	print('SUCCESS')
+except Exception as e:
+	# steps.run() again would resume from the failed step
+	print(f'FAILURE at step {steps.steps[steps.next_step][0]}: {e}')
 
 tl.close()
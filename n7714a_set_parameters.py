@@ -1,58 +1,46 @@
-import pyvisa
-import time
+from instruments import get_resource_manager, get_address
 
-rm = pyvisa.ResourceManager('@py')
+from laser_source import LaserSource
+from retry import CommandSequence, RetryPolicy, RetryingResource
 
-tl_name = 'USB0::2391::14104::MY50701053::0::INSTR'
-tl = rm.open_resource(tl_name)
+# real or emulated instruments, see instruments.py
+rm = get_resource_manager()
 
-tl.query_delay = 0.5
-tl.baud_rate = 9600
-tl.write_termination = '\n'
-tl.read_termination = '\n'
+tl_name = get_address('laser')
+tl = LaserSource.open(tl_name, rm)
 
 print(f'Trying {tl_name}')
 
-#tl.write("*RST")
-tl.write("*CLS")
+# each command is retried on its own (at most 3 times, 10 retries in total), see retry.py
+tl.resource = RetryingResource(tl.resource, RetryPolicy(attempts=3, budget=10))
 
-time.sleep(5)
+i = 1  # which laser to use
 
-valid_measurement = False
-while ((valid_measurement == False)):
-	try:
-		print("Connected to", tl.query('*IDN?'))
+# a failed step can be resumed with steps.run()
+steps = CommandSequence()
 
-		print("Any Errors?", tl.query("SYSTem:ERRor?"), "\n")
+#steps.add("*RST", tl.write, "*RST")
+steps.add("*CLS", tl.write, "*CLS")
 
-		i = 1  # which laser to use
+steps.add("*IDN?", lambda: print("Connected to", tl.identify()))
+steps.add("errors", lambda: print("Any Errors?", tl.get_error(), "\n"))
 
-		tl.write(f"sour{i}:pow:state 0")  # turn off laser
-		print(f"LASER {i} OFF")
+# auto mode at 1550nm, at 6dBm
+commands, ports = tl.get_bring_up_commands({i: {'power': 6, 'unit': 0, 'wavelength': 1550}})
+for command in commands:
+	steps.add(command, tl.write, command)
+steps.add("laser ready", lambda: print(f"LASER {i} READY after {tl.wait_ready(ports):.1f}s"))
 
-		# wavelength
-		tl.write(f"sour{i}:freq:auto on")  # turns on auto mode (laser must be off to do this)
-		print(f"LASER {i} MODE:", "AUTO" if tl.query(f"sour{i}:freq:auto?") == "1" else "GRID")  # if output 0 then its grid
+steps.add("mode", lambda: print(f"LASER {i} MODE:", "AUTO" if tl.query(f"sour{i}:freq:auto?") == "1" else "GRID"))  # if output 0 then its grid
+steps.add("wavelength", lambda: print(f"LASER {i} WAVELENGTH (m):", tl.query(f'sour{i}:wav?')))  # works only if auto mode is on
+steps.add("power", lambda: print(f"LASER {i} POWER (dBm):", tl.query(f'sour{i}:pow?')))
 
-		tl.write(f"sour{i}:wav 1550nm") # changes wavelength
-		print(f"LASER {i} WAVELENGTH (m):", tl.query(f'sour{i}:wav?'))  # works only if auto mode is on
-		
-		# power
-		tl.write(f"sour{i}:pow:state 1")  # turn on laser
-		print(f"LASER {i} ON")
-		time.sleep(10)
-
-		tl.write(f'sour{i}:pow:unit 0')  # set to dBm
-		tl.write(f'sour{i}:pow 6')  # set to 10dBm / 10mW
-		print(f"LASER {i} POWER (dBm):", tl.query(f'sour{i}:pow?'))
-
-		time.sleep(5)
-		print(f"LASER {i} SETTINGS CHANGED")
-
-		valid_measurement = True
-		print('\nSUCCESS')
-	except Exception as e:
-		print(f'FAILURE: {e}')
-		print('Trying again...')
+try:
+	steps.run()
+	print(f"LASER {i} SETTINGS CHANGED")
+	print('\nSUCCESS')
+except Exception as e:
+	# steps.run() again would resume from the failed step
+	print(f'FAILURE at step {steps.steps[steps.next_step][0]}: {e}')
 
 tl.close()
@@ -0,0 +1,240 @@
+import os
+import sys
+import glob
+import json
+import time
+import numpy as np
+
+from loader import get_cache_key
+
+# READING AQ6370B OSA CSV EXPORTS
+
+# the line before the trace, the header (settings) is everything above it
+TRACE_MARKER = '"[TRACE DATA]"'
+
+# the settings in the header, as {header name: (attribute name, type)}
+HEADER_FIELDS = {
+	'CTRWL': ('center_wavelength', float),
+	'SPAN': ('span', float),
+	'START WL': ('start_wavelength', float),
+	'STOP WL': ('stop_wavelength', float),
+	'WLFREQ': ('wavelength_frequency', int),
+	'REFL': ('reference_level', float),
+	'LSCL': ('level_scale', float),
+	'RESLN': ('resolution', float),
+	'AVG': ('average', int),
+	'SMPLAUTO': ('sampling_auto', int),
+	'SMPL': ('sampling_points', int),
+	'SMPLINTVL': ('sampling_interval', float),
+	'LSUNT': ('level_unit', int),
+	'RESCOR': ('resolution_correction', int),
+}
+
+# the sidecar cache written next to a directory of exports
+CACHE_NAME = '.osa_cache.npz'
+CACHE_KEY_NAME = '.osa_cache.json'
+
+# function to convert a header value to a number if it is one
+def _parse_value(value):
+	value = value.strip().strip('"')
+	for value_type in (int, float):
+		try:
+			return value_type(value)
+		except ValueError:
+			pass
+
+	return value
+
+class OSASettings:
+	'''
+	The settings from the header of an AQ6370B CSV export. \
+	The known settings (see HEADER_FIELDS) are attributes with their types, eg: settings.resolution is RESLN (nm). \
+	Every setting is also kept in values, as {header name: value}, and lines without a value (eg: HIGH3) are kept in flags.
+	'''
+
+	def __init__(self, values, flags=(), model=''):
+		'''
+		Should usually be created with OSASettings.from_header.
+
+		values: dictionary of {header name: value}
+		flags: list of strings of the header lines without a value
+		model: string of the model line of the header
+		'''
+
+		self.values = dict(values)
+		self.flags = list(flags)
+		self.model = model
+
+		for name, (attribute, attribute_type) in HEADER_FIELDS.items():
+			value = self.values.get(name)
+			setattr(self, attribute, None if value is None else attribute_type(value))
+
+	def __repr__(self):
+		return f'OSASettings(center_wavelength={self.center_wavelength}, span={self.span}, resolution={self.resolution}, sampling_points={self.sampling_points})'
+
+	# function to parse the header lines of an export
+	@classmethod
+	def from_header(cls, lines):
+		'''
+		Creates the settings from the lines above "[TRACE DATA]".
+
+		lines: list of strings of the header lines
+		'''
+
+		values = {}
+		flags = []
+		model = ''
+		for line in lines:
+			line = line.strip()
+			if line.startswith('//'):
+				model = line.strip('/ ')
+			elif line.startswith('"'):
+				name, _, value = line.partition(',')
+				name = name.strip('"')
+				if value == '':
+					flags.append(name)
+				else:
+					values[name] = _parse_value(value)
+
+		return cls(values, flags, model)
+
+	# function to get the settings as a dictionary that can be saved as json
+	def to_dict(self):
+		return {'values': self.values, 'flags': self.flags, 'model': self.model}
+
+# function to read one export
+def read_OSA(filename):
+	'''
+	Reads an AQ6370B CSV export. \
+	Returns (settings, wavelengths, powers), where settings is an OSASettings, \
+	wavelengths is a 1D array of the wavelengths (nm) and powers is a 1D array of the powers (dBm).
+
+	Replaces np.loadtxt(filename, delimiter=',', skiprows=29) in graphs.ipynb and reading_OSA.ipynb, \
+	without assuming the length of the header.
+
+	filename: string of the path to the export (eg: 'Data/OSA/OSA_SIGNAL_000.CSV')
+	'''
+
+	with open(filename, 'r') as file:
+		# read the header up to the trace marker
+		header = []
+		for line in file:
+			if line.strip() == TRACE_MARKER:
+				break
+			header.append(line)
+		else:
+			raise ValueError(f'No [TRACE DATA] in {filename}.')
+
+		# the rest of the file is the trace, parsed in one call from where the header ended
+		trace = np.loadtxt(file, delimiter=',', ndmin=2)
+
+	settings = OSASettings.from_header(header)
+
+	return settings, trace[:, 0], trace[:, 1]
+
+# function to make the table of settings of a list of exports
+def get_settings_table(filenames, settings_list):
+	'''
+	Returns a numpy structured array with one row per export, with the filename and every known setting (see HEADER_FIELDS). \
+	Missing settings are NaN (or -1 for integers).
+
+	filenames: list of strings of the paths to the exports
+	settings_list: list of OSASettings, one per export
+	'''
+
+	dtype = [('filename', f'U{max([len(os.path.basename(name)) for name in filenames] + [1])}')]
+	dtype += [(attribute, attribute_type) for attribute, attribute_type in HEADER_FIELDS.values()]
+
+	table = np.zeros(len(filenames), dtype=dtype)
+	for row, (filename, settings) in enumerate(zip(filenames, settings_list)):
+		table[row]['filename'] = os.path.basename(filename)
+		for attribute, attribute_type in HEADER_FIELDS.values():
+			value = getattr(settings, attribute)
+			if value is None:
+				value = np.nan if attribute_type is float else -1
+			table[row][attribute] = value
+
+	return table
+
+# function to open the cache of a directory, returns None if there is no cache or it is out of date
+def _open_cache(directory, key):
+	try:
+		with open(os.path.join(directory, CACHE_KEY_NAME), 'r') as file:
+			cached = json.load(file)
+		if cached['key'] != key:
+			return None
+
+		with np.load(os.path.join(directory, CACHE_NAME)) as arrays:
+			wavelengths, powers = arrays['wavelengths'], arrays['powers']
+	except (OSError, ValueError, KeyError):
+		return None
+
+	settings_list = [OSASettings(**settings) for settings in cached['settings']]
+
+	return wavelengths, powers, settings_list
+
+# function to write the cache of a directory
+def _write_cache(directory, key, wavelengths, powers, settings_list):
+	key_path = os.path.join(directory, CACHE_KEY_NAME)
+
+	# remove any old key first, so a half written cache is never used
+	if os.path.exists(key_path):
+		os.remove(key_path)
+
+	np.savez(os.path.join(directory, CACHE_NAME), wavelengths=wavelengths, powers=powers)
+	with open(key_path, 'w') as file:
+		json.dump({'key': key, 'settings': [settings.to_dict() for settings in settings_list]}, file)
+
+# function to load every export in a directory
+def load_OSA_dir(directory, pattern='*.CSV', cache=True):
+	'''
+	Loads every export in directory (sorted by name). \
+	Returns (wavelengths, powers, table), where wavelengths and powers are 2D arrays with one export per row, \
+	and table is the structured array of settings (see get_settings_table).
+
+	A binary cache is written next to the exports, so later loads skip the text parsing, \
+	and is only used while every export has the same name, modification time and size as when it was written.
+
+	directory: string of the directory of the exports (eg: 'Data/OSA')
+	pattern: string of the glob pattern of the exports (default: '*.CSV')
+	cache: boolean of whether to use and write the binary cache (default: True)
+	'''
+
+	filenames = sorted(glob.glob(os.path.join(directory, pattern)))
+	if len(filenames) == 0:
+		raise FileNotFoundError(f'No {pattern} files in {directory}.')
+	key = get_cache_key(filenames)
+
+	cached = _open_cache(directory, key) if cache else None
+	if cached is not None:
+		wavelengths, powers, settings_list = cached
+		return wavelengths, powers, get_settings_table(filenames, settings_list)
+
+	settings_list = []
+	wavelengths = []
+	powers = []
+	for filename in filenames:
+		settings, file_wavelengths, file_powers = read_OSA(filename)
+		settings_list.append(settings)
+		wavelengths.append(file_wavelengths)
+		powers.append(file_powers)
+
+	number_points = set(len(file_powers) for file_powers in powers)
+	if len(number_points) > 1:
+		raise ValueError(f'Exports in {directory} have different numbers of points ({sorted(number_points)}).')
+	wavelengths = np.array(wavelengths)
+	powers = np.array(powers)
+
+	if cache:
+		_write_cache(directory, key, wavelengths, powers, settings_list)
+
+	return wavelengths, powers, get_settings_table(filenames, settings_list)
+
+if __name__ == '__main__':
+	# load each directory given, eg: python osa.py Data/OSA
+	for directory in sys.argv[1:]:
+		start_time = time.perf_counter()
+		wavelengths, powers, table = load_OSA_dir(directory)
+		print(f'{directory}: {powers.shape[0]} exports of {powers.shape[1]} points in {time.perf_counter() - start_time:.3f}s')
+		for row in table:
+			print(f'\t{row["filename"]}: CTRWL {row["center_wavelength"]}nm, SPAN {row["span"]}nm, RESLN {row["resolution"]}nm')
@@ -0,0 +1,281 @@
+import time
+import numpy as np
+
+from osa import load_OSA_dir
+from conversions import CHANNELS_THZ, nm_to_THz, THz_to_nm
+
+# BATCH OSNR EXTRACTION FROM FPF SWEEPS
+
+# the spacing of the measured channels in CHANNELS_THZ (100GHz grid), not the 50GHz WSS grid of conversions.CHANNEL_SPACING_THZ
+MEASURED_CHANNEL_SPACING_THZ = 0.1
+
+# the noise bandwidth that OSNR is quoted in (nm), the OSA noise is scaled to this from its resolution (RESLN)
+REFERENCE_BANDWIDTH_NM = 0.1
+
+class ChannelWindows:
+	'''
+	Precomputed index windows of each channel on a frequency axis, so every channel of every sweep is measured \
+	with one indexing operation instead of a loop over channels.
+
+	Each channel has a signal window around its centre, where the peak is found, \
+	and two noise windows centred half a channel spacing either side, where the noise floor (the minimum) is found.
+	'''
+
+	def __init__(self, frequencies, channels_THz=CHANNELS_THZ, spacing_THz=MEASURED_CHANNEL_SPACING_THZ, signal_width_THz=0.04, noise_width_THz=0.05):
+		'''
+		frequencies: 1D array of the frequency (THz) of each point of the sweeps, increasing or decreasing
+		channels_THz: 1D array of the centre frequency (THz) of each channel (default: CHANNELS_THZ)
+		spacing_THz: spacing of the channels (THz) (default: MEASURED_CHANNEL_SPACING_THZ)
+		signal_width_THz: width of the window the peak is found in (THz) (default: 0.04)
+		noise_width_THz: width of each window the noise floor is found in (THz) (default: 0.05)
+		'''
+
+		self.frequencies = np.asarray(frequencies, dtype=float)
+		self.channels_THz = np.asarray(channels_THz, dtype=float)
+		self.spacing_THz = spacing_THz
+
+		self.signal = self._get_windows(self.channels_THz, signal_width_THz)
+		self.noise_low = self._get_windows(self.channels_THz - spacing_THz / 2, noise_width_THz)
+		self.noise_high = self._get_windows(self.channels_THz + spacing_THz / 2, noise_width_THz)
+
+	def __len__(self):
+		return len(self.channels_THz)
+
+	# function to get the indices of the points within width/2 of each centre, as a 2D array (one row per centre)
+	def _get_windows(self, centres, width):
+		# the number of points in a window, from the mean step of the frequency axis
+		step = np.abs(np.mean(np.diff(self.frequencies)))
+		number_points = max(int(round(width / step)), 1)
+
+		# the nearest point to each centre, then the points either side of it
+		nearest = np.abs(self.frequencies[None, :] - centres[:, None]).argmin(axis=-1)
+		indices = nearest[:, None] + np.arange(number_points)[None, :] - number_points // 2
+
+		# windows at the ends of the sweep are shortened by repeating the end point
+		return indices.clip(0, len(self.frequencies) - 1)
+
+# function to convert dBm to mW
+def dBm_to_mW(power):
+	return 10**(np.asarray(power) / 10)
+
+# function to convert mW to dBm
+def mW_to_dBm(power):
+	return 10 * np.log10(power)
+
+# function to find the floor (minimum) of each channel in its noise windows, and the frequency it is at
+def _get_floor(signals, noise_windows, frequencies):
+	values = signals[:, noise_windows]
+	lowest = values.argmin(axis=-1)
+
+	floor = np.take_along_axis(values, lowest[..., None], axis=-1)[..., 0]
+	floor_frequencies = frequencies[noise_windows[np.arange(len(noise_windows))[None, :], lowest]]
+
+	return floor, floor_frequencies
+
+# function to compute the OSNR of every channel of every sweep
+def compute_OSNR(signals, windows, subtract_noise=False):
+	'''
+	Measures every channel of every sweep at once. \
+	The signal is the peak in the signal window of each channel, \
+	and the noise is the floor either side of the channel, linearly interpolated (in mW) to the channel centre. \
+	Returns (OSNR, peaks, noise), each a 2D array of shape (number of sweeps, number of channels), in dB/dBm.
+
+	signals: 2D array of aligned sweeps in dBm, on the frequency axis of windows (a 1D array is treated as a single sweep)
+	windows: ChannelWindows of the frequency axis
+	subtract_noise: boolean of whether to subtract the noise from the peak before dividing, \
+	ie: (P - N) / N rather than P / N (the peak to floor ratio used in graphs.ipynb) (default: False)
+	'''
+
+	signals = np.atleast_2d(np.asarray(signals, dtype=float))
+	# peak of each channel, shape (sweeps, channels)
+	peaks = signals[:, windows.signal].max(axis=-1)
+
+	# floor either side of each channel, and where it was found
+	noise_low, frequencies_low = _get_floor(signals, windows.noise_low, windows.frequencies)
+	noise_high, frequencies_high = _get_floor(signals, windows.noise_high, windows.frequencies)
+
+	# interpolate the floor (in mW) to the channel centre
+	distance_low = np.abs(windows.channels_THz[None, :] - frequencies_low)
+	distance_high = np.abs(frequencies_high - windows.channels_THz[None, :])
+	total_distance = distance_low + distance_high
+	# if both floors are at the same point, weight them equally
+	weight_low = np.divide(distance_high, total_distance, out=np.full_like(total_distance, 0.5), where=total_distance > 0)
+	noise_mW = weight_low * dBm_to_mW(noise_low) + (1 - weight_low) * dBm_to_mW(noise_high)
+	noise = mW_to_dBm(noise_mW)
+
+	if subtract_noise:
+		# a peak at (or below) the noise has no signal, so its OSNR is -inf
+		with np.errstate(divide='ignore', invalid='ignore'):
+			OSNR = mW_to_dBm((dBm_to_mW(peaks) - noise_mW).clip(min=0.0) / noise_mW)
+	else:
+		OSNR = peaks - noise
+
+	return OSNR, peaks, noise
+
+# function to summarise the OSNR of each channel over the sweeps
+def summarise_OSNR(OSNR):
+	'''
+	Returns (mean, standard deviation) of the OSNR of each channel over the sweeps, \
+	ready to use with curve_fit, eg: curve_fit(quadratic, CHANNELS_THZ, mean, sigma=std).
+
+	OSNR: 2D array of OSNR, shape (number of sweeps, number of channels), see compute_OSNR
+	'''
+
+	OSNR = np.atleast_2d(OSNR)
+
+	return OSNR.mean(axis=0), OSNR.std(axis=0)
+
+# OSNR FROM OSA TRACES (INTERPOLATION METHOD)
+
+# function to get the indices of the points within half_width (nm) of each centre (nm), for each trace
+def _get_trace_windows(wavelengths, centres, half_widths):
+	'''
+	Returns (indices, valid), 3D arrays of shape (number of traces, number of centres, number of points in the widest window). \
+	Windows of different widths are padded to the same length, and valid is False for the padding (and points off the trace).
+
+	wavelengths: 2D array of the wavelengths (nm) of each trace, evenly spaced, one trace per row
+	centres: 2D array of the centre (nm) of each window, shape (number of traces, number of centres)
+	half_widths: array of half the width (nm) of each window, broadcastable to the shape of centres
+	'''
+
+	number_points = wavelengths.shape[-1]
+	step = (wavelengths[:, -1] - wavelengths[:, 0]) / (number_points - 1)
+
+	# the nearest point to each centre, and the number of points either side of it
+	nearest = np.rint((centres - wavelengths[:, :1]) / step[:, None]).astype(int)
+	half_points = np.rint(np.broadcast_to(half_widths, centres.shape) / np.abs(step[:, None])).astype(int)
+
+	offsets = np.arange(-half_points.max(), half_points.max() + 1)
+	indices = nearest[..., None] + offsets
+	valid = (np.abs(offsets) <= half_points[..., None]) & (indices >= 0) & (indices < number_points)
+
+	return indices.clip(0, number_points - 1), valid
+
+# function to find the noise floor around each midpoint of each trace, and its frequency
+def _get_trace_floor(wavelengths, powers_mW, midpoints, half_widths, average_points):
+	'''
+	Returns (floor, floor_frequencies), 2D arrays of shape (number of traces, number of midpoints), \
+	the lowest mean power (mW) of average_points neighbouring points within half_widths (nm) of each midpoint (nm), \
+	and the frequency (THz) of the centre of those points.
+	'''
+
+	indices, valid = _get_trace_windows(wavelengths, midpoints, half_widths)
+	trace_index = np.arange(len(powers_mW))[:, None, None]
+
+	# running mean over average_points, NaN wherever it includes a point outside the window
+	values = np.where(valid, powers_mW[trace_index, indices], np.nan)
+	average_points = min(average_points, values.shape[-1])
+	means = np.lib.stride_tricks.sliding_window_view(values, average_points, axis=-1).mean(axis=-1)
+
+	lowest = np.nanargmin(means, axis=-1)
+	floor = np.take_along_axis(means, lowest[..., None], axis=-1)[..., 0]
+	centres = np.take_along_axis(indices, (lowest + average_points // 2)[..., None], axis=-1)[..., 0]
+
+	return floor, nm_to_THz(wavelengths[trace_index[..., 0], centres])
+
+# function to compute the OSNR of every channel of every OSA trace
+def compute_OSA_OSNR(wavelengths, powers, resolutions, channels_THz=CHANNELS_THZ, spacing_THz=MEASURED_CHANNEL_SPACING_THZ, search_width_THz=0.04, noise_width_THz=0.05, average_width_THz=0.005, reference_bandwidth=REFERENCE_BANDWIDTH_NM, subtract_noise=False):
+	'''
+	Measures every channel of every OSA trace at once, with the interpolation method. \
+	The signal is the peak within search_width_THz of each channel on the grid, \
+	and the noise is the floor between the channel and each neighbour (the lowest mean power over average_width_THz, \
+	within noise_width_THz of the midpoint), linearly interpolated (in mW) to the peak, \
+	then scaled from the resolution of the trace to reference_bandwidth. \
+	Returns (OSNR, peaks, noise), each a 2D array of shape (number of traces, number of channels), in dB/dBm, \
+	where noise is in reference_bandwidth.
+
+	wavelengths: 2D array of the wavelengths (nm) of each trace, evenly spaced, one trace per row (a 1D array is treated as a single trace)
+	powers: 2D array of the powers (dBm) of each trace, the same shape as wavelengths
+	resolutions: array of the resolution (nm) of each trace, the RESLN setting (eg: table['resolution'] from osa.load_OSA_dir)
+	channels_THz: 1D array of the centre frequency (THz) of each channel on the grid (default: CHANNELS_THZ)
+	spacing_THz: spacing of the channels (THz) (default: MEASURED_CHANNEL_SPACING_THZ)
+	search_width_THz: width around each channel to find the peak in (THz) (default: 0.04)
+	noise_width_THz: width around each midpoint to find the noise floor in (THz) (default: 0.05)
+	average_width_THz: width the noise is averaged over (THz) (default: 0.005)
+	reference_bandwidth: the noise bandwidth to quote the OSNR in (nm) (default: REFERENCE_BANDWIDTH_NM)
+	subtract_noise: boolean of whether to subtract the noise (in the resolution of the trace) from the peak before dividing (default: False)
+	'''
+
+	wavelengths = np.atleast_2d(np.asarray(wavelengths, dtype=float))
+	powers = np.atleast_2d(np.asarray(powers, dtype=float))
+	resolutions = np.broadcast_to(np.asarray(resolutions, dtype=float), (len(powers),))
+	channels_THz = np.asarray(channels_THz, dtype=float)
+
+	# the same centres (nm) for every trace
+	to_centres = lambda frequencies: np.broadcast_to(THz_to_nm(frequencies), (len(powers), len(channels_THz)))
+	# a width in frequency is a width in wavelength of wavelength * width / frequency
+	to_half_width = lambda width: THz_to_nm(channels_THz) * (width / 2) / channels_THz
+	trace_index = np.arange(len(powers))[:, None, None]
+
+	# peak of each channel
+	indices, valid = _get_trace_windows(wavelengths, to_centres(channels_THz), to_half_width(search_width_THz))
+	values = np.where(valid, powers[trace_index, indices], -np.inf)
+	highest = values.argmax(axis=-1)
+	peaks = np.take_along_axis(values, highest[..., None], axis=-1)[..., 0]
+	peak_frequencies = nm_to_THz(wavelengths[trace_index[..., 0], np.take_along_axis(indices, highest[..., None], axis=-1)[..., 0]])
+
+	# the noise floor either side of each channel, from the finest step of the traces
+	step_THz = np.min(np.abs(np.diff(nm_to_THz(wavelengths[:, :2]), axis=-1)))
+	average_points = max(int(round(average_width_THz / step_THz)), 1)
+	powers_mW = dBm_to_mW(powers)
+	noise_low, frequencies_low = _get_trace_floor(wavelengths, powers_mW, to_centres(channels_THz - spacing_THz / 2), to_half_width(noise_width_THz), average_points)
+	noise_high, frequencies_high = _get_trace_floor(wavelengths, powers_mW, to_centres(channels_THz + spacing_THz / 2), to_half_width(noise_width_THz), average_points)
+
+	# interpolate the noise (in mW) to the frequency of the peak
+	distance_low = np.abs(peak_frequencies - frequencies_low)
+	distance_high = np.abs(frequencies_high - peak_frequencies)
+	total_distance = distance_low + distance_high
+	weight_low = np.divide(distance_high, total_distance, out=np.full_like(total_distance, 0.5), where=total_distance > 0)
+	noise_mW = weight_low * noise_low + (1 - weight_low) * noise_high
+
+	# scale the noise from the resolution of the trace to the reference bandwidth
+	noise_reference_mW = noise_mW * reference_bandwidth / resolutions[:, None]
+
+	signal_mW = dBm_to_mW(peaks)
+	if subtract_noise:
+		signal_mW = (signal_mW - noise_mW).clip(min=0.0)
+	with np.errstate(divide='ignore'):
+		OSNR = mW_to_dBm(signal_mW / noise_reference_mW)
+
+	return OSNR, peaks, mW_to_dBm(noise_reference_mW)
+
+# function to compute the OSNR of every export in a directory
+def get_OSA_OSNR(directory='Data/OSA', pattern='OSA_SIGNAL_*.CSV', **kwargs):
+	'''
+	Loads the OSA exports (see osa.load_OSA_dir) and computes the OSNR of every channel (see compute_OSA_OSNR), \
+	using the resolution of each export. \
+	Returns (OSNR, peaks, noise, table), where table is the settings of each export.
+
+	directory: string of the directory of the exports (default: 'Data/OSA')
+	pattern: string of the glob pattern of the exports (default: 'OSA_SIGNAL_*.CSV')
+	kwargs: passed to compute_OSA_OSNR
+	'''
+
+	wavelengths, powers, table = load_OSA_dir(directory, pattern)
+	OSNR, peaks, noise = compute_OSA_OSNR(wavelengths, powers, table['resolution'], **kwargs)
+
+	return OSNR, peaks, noise, table
+
+if __name__ == '__main__':
+	from loader import load_run
+	from alignment import align_sweeps, get_reference_window
+	from conversions import V_to_dBm, s_to_THz
+
+	times, signals = load_run('Data/channel_sim')
+
+	start_time = time.perf_counter()
+	aligned, _, _ = align_sweeps(signals, get_reference_window())
+	windows = ChannelWindows(s_to_THz(times))
+	OSNR, peaks, noise = compute_OSNR(V_to_dBm(aligned), windows)
+	mean, std = summarise_OSNR(OSNR)
+	print(f'{len(signals)} sweeps of {len(windows)} channels in {time.perf_counter() - start_time:.4f}s')
+
+	for channel, channel_mean, channel_std in zip(windows.channels_THz, mean, std):
+		print(f'{channel:.4f}THz: {channel_mean:.2f} +/- {channel_std:.2f}dB')
+
+	start_time = time.perf_counter()
+	OSA_OSNR, _, _, table = get_OSA_OSNR()
+	print(f'{len(table)} OSA exports of {OSA_OSNR.shape[-1]} channels in {time.perf_counter() - start_time:.4f}s')
+
+	for channel, channel_OSNR in zip(CHANNELS_THZ, OSA_OSNR[0]):
+		print(f'{channel:.4f}THz: {channel_OSNR:.2f}dB ({table["filename"][0]})')
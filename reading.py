@@ -1,4 +1,5 @@
-import nidaqmx
+from instruments import create_daq_task
+from acquisition import AcquisitionType
 import numpy as np
 import matplotlib.pyplot as plt
 
@@ -17,13 +18,14 @@ def read(device='Dev1', sample_rate=10, acquire_time=1):
     print(f'Acquiring {number_samples} data points.')
 
     # create task of this name
-    with nidaqmx.Task('read') as task:
+    # real or emulated, see instruments.py
+    with create_daq_task() as task:
         # configure task
         task.ai_channels.add_ai_voltage_chan(f'{device}/ai0')
         task.timing.cfg_samp_clk_timing(
             sample_rate, 
             samps_per_chan=number_samples, 
-            sample_mode=nidaqmx.constants.AcquisitionType(10178)
+            sample_mode=AcquisitionType(10178)
         )
 
         # start task         
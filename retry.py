@@ -0,0 +1,200 @@
+import time
+from pyvisa.errors import VisaIOError
+
+# RETRYING INSTRUMENT COMMANDS
+# a failed command is retried on its own (with a growing wait between attempts), instead of rerunning the whole sequence,
+# and a sequence that still fails can be run again from the step that failed
+
+# the errors of a failed transfer (timeouts and lost connections), only these are retried by default
+# programming errors (eg: TypeError) and errors of the instruments' own checks (eg: LaserSourceError) are raised at once
+TRANSFER_ERRORS = (VisaIOError, OSError)
+
+class RetryBudgetExceeded(Exception):
+	'''
+	Raised when a command fails after the retry budget of its RetryPolicy has been used up.
+	'''
+
+class RetryPolicy:
+	'''
+	Retries a failed command up to attempts times, waiting initial_delay seconds before the first retry \
+	and factor times longer before each one after (exponential backoff, at most max_delay). \
+	The budget is the number of retries allowed in total, across every command using the policy, \
+	so a disconnected instrument fails quickly instead of retrying every command.
+
+	Only use it for commands that can safely be sent twice (settings and queries, not eg: a relative step).
+	'''
+
+	def __init__(self, attempts=3, initial_delay=0.1, factor=2.0, max_delay=2.0, budget=10, exceptions=TRANSFER_ERRORS, verbose=True):
+		'''
+		attempts: number of times to try each command (default: 3)
+		initial_delay: seconds to wait before the first retry (default: 0.1)
+		factor: multiplier of the wait before each further retry (default: 2.0)
+		max_delay: most seconds to wait before a retry (default: 2.0)
+		budget: number of retries allowed in total (default: 10)
+		exceptions: tuple of the exception types to retry, others are raised at once (default: TRANSFER_ERRORS)
+		verbose: boolean of whether to print every retry (default: True)
+		'''
+
+		self.attempts = attempts
+		self.initial_delay = initial_delay
+		self.factor = factor
+		self.max_delay = max_delay
+		self.budget = budget
+		self.exceptions = exceptions
+		self.verbose = verbose
+
+		# number of retries used so far
+		self.retries = 0
+
+	# function to get the seconds to wait before a retry, attempt is the number of the failed attempt from 1
+	def get_delay(self, attempt):
+		return min(self.initial_delay * self.factor**(attempt - 1), self.max_delay)
+
+	# function to call a function, retrying it if it fails
+	def call(self, function, *args, description=None, before_retry=None, **kwargs):
+		'''
+		Returns function(*args, **kwargs), retried while it raises one of exceptions, \
+		until it has been tried attempts times (the last exception is then raised) or the budget is used up (RetryBudgetExceeded).
+
+		function: the function to call, eg: resource.query
+		description: string describing the call in printed retries (default: the name of the function and args)
+		before_retry: function of () called before each retry, eg: to clear replies left from the failed attempt (default: None)
+		'''
+
+		if description is None:
+			description = f'{getattr(function, "__name__", "call")}{args}'
+
+		attempt = 1
+		while True:
+			try:
+				return function(*args, **kwargs)
+			except self.exceptions as e:
+				if attempt >= self.attempts:
+					raise
+				if self.retries >= self.budget:
+					raise RetryBudgetExceeded(f'{description} failed ({e}) after all {self.budget} retries were used.') from e
+
+				delay = self.get_delay(attempt)
+				self.retries += 1
+				attempt += 1
+				if self.verbose:
+					print(f'RETRY {description} in {delay:.2f}s (attempt {attempt} of {self.attempts}): {e}')
+				time.sleep(delay)
+				if before_retry is not None:
+					before_retry()
+
+class RetryingResource:
+	'''
+	Wraps a pyvisa resource so every write, read and query is retried with a RetryPolicy. \
+	Before a read or query is retried, the input of the instrument is cleared, \
+	so a late reply to the failed attempt is not read as the reply to the retry. \
+	Every other attribute (eg: baud_rate, close) is the one of the resource, and the wrapped resource is resource.
+	'''
+
+	def __init__(self, resource, policy=None):
+		'''
+		resource: an open pyvisa resource
+		policy: RetryPolicy to use (default: RetryPolicy())
+		'''
+
+		# set directly, as __setattr__ passes attributes to the resource
+		object.__setattr__(self, 'resource', resource)
+		object.__setattr__(self, 'policy', RetryPolicy() if policy is None else policy)
+
+	def __getattr__(self, name):
+		return getattr(self.resource, name)
+
+	def __setattr__(self, name, value):
+		setattr(self.resource, name, value)
+
+	# function to discard any replies not yet read, with the device clear or by reading until a read fails
+	def _clear(self):
+		try:
+			self.resource.clear()
+			return
+		except Exception:
+			pass
+
+		timeout = self.resource.timeout
+		self.resource.timeout = 100
+		try:
+			for _ in range(4):
+				self.resource.read()
+		except Exception:
+			pass
+		finally:
+			self.resource.timeout = timeout
+
+	def write(self, command):
+		return self.policy.call(self.resource.write, command, description=command)
+
+	def read(self):
+		return self.policy.call(self.resource.read, description='read', before_retry=self._clear)
+
+	# a query is retried as a whole, so a lost reply does not leave the command unanswered
+	def query(self, command):
+		return self.policy.call(self.resource.query, command, description=command, before_retry=self._clear)
+
+class CommandSequence:
+	'''
+	A list of steps (eg: configuring an instrument) run in order. \
+	If a step fails, run raises and the sequence stays at that step, \
+	so calling run again resumes from the failed step without repeating the ones that succeeded.
+
+	Steps are usually single commands on a RetryingResource, which retries each command. \
+	A policy retries whole steps instead, for steps that are not (only use it for steps that can safely be repeated).
+	'''
+
+	def __init__(self, policy=None):
+		'''
+		policy: RetryPolicy of every step, or None to run each step once (default: None)
+		'''
+
+		self.policy = policy
+
+		# (description, function) of each step
+		self.steps = []
+		# index of the next step to run
+		self.next_step = 0
+		# the return value of each step that has run, {description: value}
+		self.results = {}
+
+	def __len__(self):
+		return len(self.steps)
+
+	# function to add a step
+	def add(self, description, function, *args, **kwargs):
+		'''
+		Adds a step that calls function(*args, **kwargs). Returns the sequence, so adds can be chained.
+
+		description: string describing the step, used in printed retries and as its key in results
+		function: the function to call
+		'''
+
+		self.steps.append((description, lambda: function(*args, **kwargs)))
+
+		return self
+
+	# function to run the remaining steps
+	def run(self):
+		'''
+		Runs every step from next_step, retrying each with the policy (if any). Returns results. \
+		If a step fails, the exception is raised and next_step is the failed step.
+		'''
+
+		while self.next_step < len(self.steps):
+			description, function = self.steps[self.next_step]
+			self.results[description] = function() if self.policy is None else self.policy.call(function, description=description)
+			self.next_step += 1
+
+		return self.results
+
+	# function to run the sequence from the start again
+	def reset(self):
+		self.next_step = 0
+		self.results = {}
+
+	# function to check whether every step has run
+	@property
+	def done(self):
+		return self.next_step >= len(self.steps)
@@ -0,0 +1,218 @@
+import numpy as np
+
+from loader import iter_run
+
+# RUNNING STATISTICS OF REPEATED SWEEPS
+# updated as sweeps arrive, so the memory used depends on the number of points in a sweep, not the number of sweeps
+
+# the quantiles estimated by default
+QUANTILES = (0.05, 0.5, 0.95)
+
+# the desired position increments of the 5 markers of the P-square algorithm, for quantile p
+_marker_increments = lambda p: np.array([0.0, p / 2, p, (1 + p) / 2, 1.0])
+
+class RunningStats:
+	'''
+	Running mean, variance, min, max and quantiles of every point of a sweep, updated one sweep (or block of sweeps) at a time.
+
+	The mean and variance use Welford updates (combined per block with the parallel form of the update), \
+	and each quantile is estimated with the P-square algorithm (Jain and Chlamtac, 1985), \
+	which keeps 5 markers per point instead of every sweep. \
+	The quantiles are exact for the first 5 sweeps and estimates after that.
+
+	Can be used on a run on disk (see from_run) or as the callback of Acquisition.start_continuous (see callback).
+	'''
+
+	def __init__(self, quantiles=QUANTILES):
+		'''
+		quantiles: list of the quantiles to estimate, from 0 to 1 (default: QUANTILES, use () for none)
+		'''
+
+		self.quantile_levels = np.asarray(quantiles, dtype=float)
+
+		# the arrays are created on the first update, once the number of points is known
+		self.count = 0
+		self.mean = None
+		self._M2 = None
+		self.minimum = None
+		self.maximum = None
+
+		# P-square markers of shape (quantiles, 5, points): heights, positions and desired positions
+		self._heights = None
+		self._positions = None
+		self._desired = None
+		self._increments = np.array([_marker_increments(p) for p in self.quantile_levels]).reshape(-1, 5)
+		# the first 5 sweeps, kept to start the markers
+		self._first = []
+
+	def __len__(self):
+		return self.count
+
+	# function to add sweeps
+	def update(self, sweeps):
+		'''
+		Adds sweeps to the statistics.
+
+		sweeps: 2D array of sweeps, one sweep per row (a 1D array is treated as a single sweep)
+		'''
+
+		sweeps = np.atleast_2d(np.asarray(sweeps, dtype=float))
+		if len(sweeps) == 0:
+			return
+
+		self._update_moments(sweeps)
+
+		if len(self.quantile_levels) > 0:
+			for sweep in sweeps:
+				self._update_quantiles(sweep)
+
+	# function matching the callback of Acquisition.start_continuous, eg: acquisition.start_continuous(1000, callback=stats.callback)
+	def callback(self, block, block_index):
+		self.update(block)
+
+	# function to update the mean, variance, min and max with a block of sweeps
+	def _update_moments(self, sweeps):
+		block_count = len(sweeps)
+		block_mean = sweeps.mean(axis=0)
+		block_M2 = ((sweeps - block_mean)**2).sum(axis=0)
+
+		if self.count == 0:
+			self.mean = block_mean
+			self._M2 = block_M2
+			self.minimum = sweeps.min(axis=0)
+			self.maximum = sweeps.max(axis=0)
+			self.count = block_count
+			return
+
+		if sweeps.shape[-1] != len(self.mean):
+			raise ValueError(f'Expected sweeps of {len(self.mean)} points, got {sweeps.shape[-1]}.')
+
+		# combine the block with the running values
+		total = self.count + block_count
+		delta = block_mean - self.mean
+		self.mean = self.mean + delta * block_count / total
+		self._M2 = self._M2 + block_M2 + delta**2 * self.count * block_count / total
+		self.count = total
+
+		np.minimum(self.minimum, sweeps.min(axis=0), out=self.minimum)
+		np.maximum(self.maximum, sweeps.max(axis=0), out=self.maximum)
+
+	# function to update the P-square markers with one sweep
+	def _update_quantiles(self, sweep):
+		# start the markers from the first 5 sweeps
+		if self._heights is None:
+			self._first.append(sweep.copy())
+			if len(self._first) == 5:
+				first = np.sort(np.array(self._first), axis=0)
+				number_quantiles = len(self.quantile_levels)
+				self._heights = np.repeat(first[None], number_quantiles, axis=0)
+				self._positions = np.broadcast_to(np.arange(5.0)[None, :, None], self._heights.shape).copy()
+				self._desired = np.broadcast_to((4 * self._increments)[..., None], self._heights.shape).copy()
+				self._first = []
+			return
+
+		heights = self._heights
+		positions = self._positions
+
+		# extend the end markers, and find the cell k (0 to 3) of each point
+		np.minimum(heights[:, 0], sweep, out=heights[:, 0])
+		np.maximum(heights[:, 4], sweep, out=heights[:, 4])
+		cell = (sweep[None, None, :] >= heights[:, 1:4]).sum(axis=1)
+
+		# markers above the cell move up one position
+		positions += np.arange(5)[None, :, None] > cell[:, None, :]
+		self._desired += self._increments[..., None]
+
+		# adjust the middle markers that are more than one position from where they should be
+		for i in (1, 2, 3):
+			offset = self._desired[:, i] - positions[:, i]
+			step_up = positions[:, i + 1] - positions[:, i]
+			step_down = positions[:, i - 1] - positions[:, i]
+			adjust = ((offset >= 1) & (step_up > 1)) | ((offset <= -1) & (step_down < -1))
+			if not adjust.any():
+				continue
+			direction = np.sign(offset)
+
+			# parabolic prediction of the new height
+			parabolic = heights[:, i] + direction / (positions[:, i + 1] - positions[:, i - 1]) * (
+				(positions[:, i] - positions[:, i - 1] + direction) * (heights[:, i + 1] - heights[:, i]) / step_up
+				+ (positions[:, i + 1] - positions[:, i] - direction) * (heights[:, i] - heights[:, i - 1]) / -step_down
+			)
+			# linear prediction, used where the parabolic one is not between the neighbouring markers
+			neighbour_heights = np.where(direction > 0, heights[:, i + 1], heights[:, i - 1])
+			neighbour_steps = np.where(direction > 0, step_up, step_down)
+			linear = heights[:, i] + direction * (neighbour_heights - heights[:, i]) / neighbour_steps
+
+			in_order = (heights[:, i - 1] < parabolic) & (parabolic < heights[:, i + 1])
+			new_heights = np.where(in_order, parabolic, linear)
+
+			heights[:, i] = np.where(adjust, new_heights, heights[:, i])
+			positions[:, i] += np.where(adjust, direction, 0.0)
+
+	# variance of every point
+	def get_variance(self, ddof=0):
+		'''
+		Returns the variance of every point.
+
+		ddof: delta degrees of freedom, the divisor is count - ddof (default: 0)
+		'''
+
+		if self.count - ddof <= 0:
+			return np.full_like(self.mean, np.nan)
+
+		return self._M2 / (self.count - ddof)
+
+	@property
+	def variance(self):
+		return self.get_variance()
+
+	@property
+	def std(self):
+		return np.sqrt(self.get_variance())
+
+	# quantiles of every point, shape (quantiles, points)
+	@property
+	def quantiles(self):
+		if len(self.quantile_levels) == 0 or self.count == 0:
+			return None
+
+		# exact while there are fewer than 5 sweeps
+		if self._heights is None:
+			return np.quantile(np.array(self._first), self.quantile_levels, axis=0)
+
+		return self._heights[:, 2].copy()
+
+	# function to get the estimate of one quantile
+	def get_quantile(self, p):
+		'''
+		Returns the estimate of the quantile p of every point, which must be one of the quantiles given when created.
+
+		p: the quantile, from 0 to 1
+		'''
+
+		matches = np.flatnonzero(np.isclose(self.quantile_levels, p))
+		if len(matches) == 0:
+			raise ValueError(f'Quantile {p} is not estimated, only {list(self.quantile_levels)}.')
+
+		return self.quantiles[matches[0]]
+
+	# function to compute the statistics of a run on disk
+	@classmethod
+	def from_run(cls, run_dir, transform=None, quantiles=QUANTILES, chunk_size=50, **kwargs):
+		'''
+		Computes the statistics of every reading in run_dir, one chunk at a time (see loader.iter_run). \
+		Returns (times, stats).
+
+		run_dir: string of the directory of the run (eg: 'Data/channel_sim')
+		transform: function applied to each chunk of sweeps before it is added, eg: to align and convert to dBm (default: None)
+		quantiles: list of the quantiles to estimate (default: QUANTILES)
+		chunk_size: number of readings per chunk (default: 50)
+		kwargs: passed to loader.iter_run
+		'''
+
+		stats = cls(quantiles)
+		times = None
+		for times, block in iter_run(run_dir, chunk_size=chunk_size, **kwargs):
+			stats.update(block if transform is None else transform(block))
+
+		return times, stats
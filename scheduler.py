@@ -0,0 +1,131 @@
+import time
+import queue
+import threading
+import numpy as np
+
+# PIPELINED SWEEP SCHEDULER
+
+# the stages of each sweep, in order
+# switch, settle and acquire run in the calling thread, process and save run in the background
+STAGES = ['switch', 'settle', 'acquire', 'process', 'save']
+
+class SweepScheduler:
+	'''
+	Runs a list of URA patterns as a producer/consumer pipeline. \
+	The calling thread (producer) switches the WSS, waits for it to settle and acquires each sweep. \
+	A background thread (consumer) post-processes each sweep and appends it to a SweepStore as it arrives, \
+	so saving sweep N overlaps with switching and settling for sweep N+1, and nothing is held in memory until the end.
+
+	The time spent in every stage of every sweep is recorded in timings.
+	'''
+
+	def __init__(self, switch, acquire, store, settle=3, process=None, queue_size=8):
+		'''
+		switch: function of (URA) that applies the URA to the WSS
+		acquire: function of () that returns one sweep (1D array), eg: Acquisition.read
+		store: SweepStore (open for appending) to stream the sweeps to
+		settle: seconds to wait after switching, or a function of (URA) that waits until the WSS has settled (default: 3)
+		process: function of (sweep) that returns the sweep to save, run in the background (default: save as acquired)
+		queue_size: maximum number of sweeps waiting to be saved before the producer waits (default: 8)
+		'''
+
+		self.switch = switch
+		self.acquire = acquire
+		self.store = store
+		self.settle = settle
+		self.process = process
+
+		self._queue = queue.Queue(maxsize=queue_size)
+		self._error = None
+
+		# seconds spent in each stage, one entry per sweep
+		self.timings = {stage: [] for stage in STAGES}
+		self.wall_time = None
+
+	# function to wait for the WSS to settle
+	def _settle(self, URA):
+		if callable(self.settle):
+			self.settle(URA)
+		else:
+			time.sleep(self.settle)
+
+	# function run by the background thread, saves each sweep as it arrives
+	def _consume(self):
+		while True:
+			item = self._queue.get()
+			if item is None:
+				break
+
+			sweep, metadata = item
+			try:
+				start_time = time.perf_counter()
+				if self.process is not None:
+					sweep = self.process(sweep)
+				self.timings['process'].append(time.perf_counter() - start_time)
+
+				start_time = time.perf_counter()
+				self.store.append(sweep, **metadata)
+				self.timings['save'].append(time.perf_counter() - start_time)
+			except Exception as e:
+				# keep draining the queue so the producer never blocks, the error is raised at the end of the run
+				if self._error is None:
+					self._error = e
+
+	# function to run every URA
+	def run(self, URA_list, metadata=None):
+		'''
+		Switches, settles, acquires and saves a sweep for each URA in URA_list. \
+		Returns the timings (dictionary of stage: list of seconds per sweep).
+
+		URA_list: list of strings of the URA commands to apply
+		metadata: dictionary of extra metadata to save with every sweep
+		'''
+
+		consumer = threading.Thread(target=self._consume, daemon=True)
+		consumer.start()
+
+		run_start = time.perf_counter()
+		try:
+			for URA in URA_list:
+				if self._error is not None:
+					break
+
+				start_time = time.perf_counter()
+				self.switch(URA)
+				self.timings['switch'].append(time.perf_counter() - start_time)
+
+				start_time = time.perf_counter()
+				self._settle(URA)
+				self.timings['settle'].append(time.perf_counter() - start_time)
+
+				start_time = time.perf_counter()
+				# copy, as the acquisition buffer may be reused before the sweep is saved
+				sweep = np.array(self.acquire())
+				self.timings['acquire'].append(time.perf_counter() - start_time)
+
+				self._queue.put((sweep, dict(metadata or {}, URA=URA)))
+		finally:
+			# tell the consumer to stop once everything queued is saved
+			self._queue.put(None)
+			consumer.join()
+			self.wall_time = time.perf_counter() - run_start
+
+		if self._error is not None:
+			raise self._error
+
+		return self.timings
+
+	# function to summarise the timings of the run
+	def report(self):
+		'''
+		Returns a string of the total seconds in each stage, the wall-clock time of the run, \
+		and the time saved by running the background stages alongside the others.
+		'''
+
+		totals = {stage: sum(times) for stage, times in self.timings.items()}
+		serial_time = sum(totals.values())
+
+		lines = [f'{stage}: {total:.3f}s' for stage, total in totals.items()]
+		lines.append(f'wall clock: {self.wall_time:.3f}s (in series: {serial_time:.3f}s, saved: {serial_time - self.wall_time:.3f}s)')
+
+		return '\n'.join(lines)
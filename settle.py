@@ -0,0 +1,221 @@
+import time
+import numpy as np
+
+# SETTLE DETECTION AFTER A WSS SWITCH
+
+# the statistics that can be computed for each block of samples
+# variance: the variance of the block, changes as the filter shape changes
+# power: the mean of the block, the total power through the filter
+STATISTICS = {
+	'variance': np.var,
+	'power': np.mean,
+}
+
+# largest relative change of the power over one sweep period, within the hold time, for a pattern that is not changing
+# measure_tolerance (0.1s blocks, 0.3s hold) of the 200 readings of one URA in Data/channel_sim gives 0.0069,
+# and 0.0095 for Data/channel_sim_54off, from noise and laser drift, while switching one channel changes the power by 3-9%
+TOLERANCE = 0.01
+
+# function to measure the tolerance from readings of a pattern that is not changing
+def measure_tolerance(signals, period_samples, block_samples, hold_blocks=3, quantile=0.99, margin=2.0):
+	'''
+	Returns margin times the quantile (over readings) of the largest relative spread of the power over one sweep period, \
+	across hold_blocks + 1 successive blocks (the statistics compared within the hold time), as in PeriodWindow.
+
+	signals: 2D array of readings of one pattern, one reading per row, each longer than period_samples (eg: load_run('Data/channel_sim', periods=1))
+	period_samples: number of samples in one sweep period
+	block_samples: number of samples in each block
+	hold_blocks: number of blocks in the hold time (default: 3)
+	quantile: quantile of the spreads of the readings (default: 0.99)
+	margin: multiplier of the quantile (default: 2.0)
+	'''
+
+	signals = np.atleast_2d(np.asarray(signals, dtype=float))
+	number_blocks = signals.shape[-1] // block_samples
+	blocks_per_period = period_samples // block_samples
+
+	block_means = signals[:, :number_blocks * block_samples].reshape(len(signals), number_blocks, block_samples).mean(axis=-1)
+	powers = np.lib.stride_tricks.sliding_window_view(block_means, blocks_per_period, axis=-1).mean(axis=-1)
+	held = np.lib.stride_tricks.sliding_window_view(powers, hold_blocks + 1, axis=-1)
+	spreads = (np.abs(held - held.mean(axis=-1, keepdims=True)).max(axis=-1) / np.abs(held.mean(axis=-1))).max(axis=-1)
+
+	return margin * np.quantile(spreads, quantile)
+
+class PeriodWindow:
+	'''
+	A read_block for SettleDetector that reads a short block at a time from a stream (eg: Acquisition.iter_blocks), \
+	reduces each block to its mean (a low rate stream of one sample per block) \
+	and returns the last blocks_per_period of these, one whole sweep period. \
+	A statistic of a whole period does not depend on where in the sweep the stream started, \
+	and is updated every block instead of once per period.
+
+	The first call waits for one period of blocks. A stream that ends is started again (with the window refilled), \
+	and close ends the stream, so the next call starts a new one.
+	'''
+
+	def __init__(self, iter_blocks, blocks_per_period):
+		'''
+		iter_blocks: function of () that returns an iterator of blocks, eg: lambda: daq.iter_blocks(100)
+		blocks_per_period: number of blocks in one sweep period
+		'''
+
+		self.iter_blocks = iter_blocks
+		self.blocks_per_period = blocks_per_period
+
+		self._stream = None
+		# the mean of each recent block (of each channel)
+		self._means = []
+
+	def __call__(self):
+		while True:
+			if self._stream is None:
+				self._stream = self.iter_blocks()
+				self._means = []
+
+			try:
+				block = next(self._stream)
+			except StopIteration:
+				self._stream = None
+				continue
+
+			self._means.append(np.mean(block, axis=-1))
+			if len(self._means) > self.blocks_per_period:
+				self._means.pop(0)
+			if len(self._means) == self.blocks_per_period:
+				return np.array(self._means)
+
+	# function to end the stream (eg: stopping the task, so the next sweep can be read)
+	def close(self):
+		if self._stream is not None:
+			self._stream.close()
+		self._stream = None
+		self._means = []
+
+class SettleDetector:
+	'''
+	Waits for the WSS to settle after a switch (RSW) by watching the signal, instead of sleeping for a fixed time. \
+	Short blocks are read from the DAQ and reduced to one statistic each. \
+	The WSS is settled once every statistic in the last hold_time seconds is within tolerance of their mean. \
+	The window always reaches back at least hold_time, to the newest block older than that, \
+	and holds at least minimum_blocks statistics (or, if a block lasts longer than hold_time, this block and the one before).
+
+	Call the detector (eg: as the settle of a SweepScheduler) to wait. \
+	The time waited for each pattern is kept in settle_times, and the time its stable period started in stable_times. \
+	If read_block has a close method (eg: PeriodWindow), it is called once each wait ends.
+	'''
+
+	def __init__(self, read_block, statistic='variance', tolerance=TOLERANCE, hold_time=0.3, timeout=5.0, minimum_time=0.0, minimum_blocks=3):
+		'''
+		read_block: function of () that returns a short block of samples, eg: a PeriodWindow of daq.iter_blocks
+		statistic: the statistic of each block, 'variance' or 'power', or a function of (block) (default: 'variance')
+		tolerance: largest allowed change of the statistic, relative to its mean over hold_time (default: TOLERANCE)
+		hold_time: seconds the statistic must stay within tolerance (default: 0.3)
+		timeout: seconds after which to stop waiting, even if not settled (default: 5.0)
+		minimum_time: seconds to always wait before checking (default: 0.0)
+		minimum_blocks: least number of statistics compared, when blocks are shorter than hold_time (default: 3)
+		'''
+
+		self.read_block = read_block
+		self.statistic = STATISTICS[statistic] if isinstance(statistic, str) else statistic
+		self.tolerance = tolerance
+		self.hold_time = hold_time
+		self.timeout = timeout
+		self.minimum_time = minimum_time
+		self.minimum_blocks = minimum_blocks
+
+		# the seconds waited for each pattern, when its stable period started (None if timed out), and whether it timed out
+		self.settle_times = []
+		self.stable_times = []
+		self.timed_out = []
+
+	# function to check if the recent statistics are all within tolerance
+	def _is_stable(self, values):
+		values = np.asarray(values)
+		reference = np.abs(values.mean())
+		spread = np.abs(values - values.mean()).max()
+
+		# a signal that is off (reference of 0) is only stable if it does not change at all
+		return spread <= self.tolerance * reference
+
+	# function to wait until settled
+	def wait(self, URA=None):
+		'''
+		Reads blocks until the statistic has been stable for hold_time seconds, or timeout seconds have passed. \
+		Returns the seconds waited.
+
+		URA: the URA that was applied, only used in the printed log
+		'''
+
+		start_time = time.perf_counter()
+		if self.minimum_time > 0:
+			time.sleep(self.minimum_time)
+
+		# (time, statistic) of each block
+		times = []
+		values = []
+		stable_time = None
+		try:
+			while True:
+				block = self.read_block()
+				now = time.perf_counter() - start_time
+				times.append(now)
+				values.append(self.statistic(block))
+
+				# drop the blocks before the newest one that is at least hold_time old, which is the left edge of the window
+				while len(times) > 1 and now - times[1] >= self.hold_time:
+					times.pop(0)
+					values.pop(0)
+
+				# blocks longer than hold_time are compared with the one before, shorter ones need minimum_blocks in the window
+				window_full = len(times) > 1 and now - times[0] >= self.hold_time
+				minimum_blocks = 2 if len(times) == 2 else self.minimum_blocks
+
+				if window_full and len(values) >= minimum_blocks and self._is_stable(values):
+					stable_time = times[0]
+					break
+
+				if now >= self.timeout:
+					break
+		finally:
+			if hasattr(self.read_block, 'close'):
+				self.read_block.close()
+
+		settle_time = time.perf_counter() - start_time
+		self.settle_times.append(settle_time)
+		self.stable_times.append(stable_time)
+		self.timed_out.append(stable_time is None)
+
+		status = 'TIMED OUT' if stable_time is None else f'settled (stable from {stable_time:.3f}s)'
+		print(f'WSS {status} after {settle_time:.3f}s' + (f' ({URA[:40]}...)' if URA else ''))
+
+		return settle_time
+
+	def __call__(self, URA=None):
+		return self.wait(URA)
+
+# OPERATION
+if __name__ == '__main__':
+	# check on simulated blocks: a signal that keeps drifting must time out, whatever the block length
+	for block_time in (0.02, 0.2):
+		start_time = time.perf_counter()
+
+		def read_drifting():
+			time.sleep(block_time)
+			return np.full(10, 1.0 + (time.perf_counter() - start_time))
+
+		detector = SettleDetector(read_drifting, statistic='power', hold_time=0.1, timeout=1.0)
+		detector.wait()
+		print(f'Drifting, {block_time}s blocks: timed out = {detector.timed_out[-1]}')
+		assert detector.timed_out[-1]
+
+	# a constant signal settles once hold_time is covered
+	detector = SettleDetector(lambda: (time.sleep(0.02), np.ones(10))[1], statistic='power', hold_time=0.1, timeout=1.0)
+	detector.wait()
+	print(f'Constant, 0.02s blocks: timed out = {detector.timed_out[-1]}')
+	assert not detector.timed_out[-1]
+
+	# the tolerance of runs of one pattern, see TOLERANCE
+	from loader import load_run
+	for run_dir in ('Data/channel_sim', 'Data/channel_sim_54off'):
+		_, signals = load_run(run_dir, periods=1)
+		print(f'Tolerance of {run_dir}: {measure_tolerance(signals, period_samples=1000, block_samples=100):.4f}')
@@ -0,0 +1,261 @@
+import os
+import sys
+import glob
+import json
+import numpy as np
+
+# BINARY STORE FOR A RUN OF SWEEPS
+
+# a run is stored as a directory containing:
+#   header.json  - the acquisition settings, sample rate and number of samples per sweep (written once)
+#   sweeps.f32   - one 2D float32 array, one sweep per row, grown in chunks of chunk_size rows
+#   sweeps.jsonl - one line of metadata per sweep (eg: the URA command used), appended as each sweep is written
+# the time axis is never stored, it is rebuilt from the sample rate and the number of samples
+HEADER_NAME = 'header.json'
+DATA_NAME = 'sweeps.f32'
+METADATA_NAME = 'sweeps.jsonl'
+
+DTYPE = np.float32
+
+class SweepStore:
+	'''
+	A run-level container of sweeps, stored as one chunked 2D float32 array with per-sweep metadata. \
+	Sweeps can be appended while the run is in progress, and are read back through a memory map.
+
+	Use SweepStore.create to start a new run, and SweepStore.open to read (or continue) an existing one.
+	'''
+
+	def __init__(self, path, header, mode='r'):
+		'''
+		Should not be called directly, use SweepStore.create or SweepStore.open.
+
+		path: string of the directory of the store
+		header: dictionary of the header of the store
+		mode: 'r' for read only, 'a' to allow appending
+		'''
+
+		self.path = path
+		self.header = header
+		self.mode = mode
+
+		self.sample_rate = header['sample_rate']
+		self.number_samples = header['number_samples']
+		self.chunk_size = header['chunk_size']
+		self.settings = header.get('settings', {})
+
+		# per sweep metadata, the number of lines is the number of complete sweeps
+		self.metadata = []
+		metadata_path = os.path.join(path, METADATA_NAME)
+		if os.path.exists(metadata_path):
+			with open(metadata_path, 'r') as file:
+				self.metadata = [json.loads(line) for line in file if line.strip()]
+
+		self._memmap = None
+		self._data_file = None
+		self._metadata_file = None
+		if mode == 'a':
+			self._data_file = open(os.path.join(path, DATA_NAME), 'r+b')
+			self._metadata_file = open(metadata_path, 'a')
+
+	# function to start a new store
+	@classmethod
+	def create(cls, path, sample_rate, number_samples, settings=None, chunk_size=64):
+		'''
+		Creates a new, empty store at path and returns it open for appending.
+
+		path: string of the directory to create (must not already exist)
+		sample_rate: sample rate in Hz of each sweep
+		number_samples: number of samples in each sweep
+		settings: dictionary of the acquisition settings of the run (eg: device, acquire_time)
+		chunk_size: number of sweeps to grow the data file by at a time (default: 64)
+		'''
+
+		os.makedirs(path)
+
+		header = {
+			'sample_rate': float(sample_rate),
+			'number_samples': int(number_samples),
+			'chunk_size': int(chunk_size),
+			'dtype': np.dtype(DTYPE).str,
+			'settings': settings or {},
+		}
+		with open(os.path.join(path, HEADER_NAME), 'w') as file:
+			json.dump(header, file, indent=1)
+
+		# create the empty data and metadata files
+		open(os.path.join(path, DATA_NAME), 'wb').close()
+		open(os.path.join(path, METADATA_NAME), 'w').close()
+
+		return cls(path, header, mode='a')
+
+	# function to open an existing store
+	@classmethod
+	def open(cls, path, mode='r'):
+		'''
+		Opens an existing store at path.
+
+		path: string of the directory of the store
+		mode: 'r' for read only (default), 'a' to continue appending to the run
+		'''
+
+		with open(os.path.join(path, HEADER_NAME), 'r') as file:
+			header = json.load(file)
+
+		return cls(path, header, mode=mode)
+
+	def __len__(self):
+		return len(self.metadata)
+
+	def __getitem__(self, index):
+		return self.data[index]
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	# the times at which each sample was acquired, rebuilt from the sample rate
+	@property
+	def times(self):
+		return np.arange(self.number_samples) / self.sample_rate
+
+	# memory mapped, read only view of every complete sweep
+	@property
+	def data(self):
+		count = len(self)
+		if count == 0:
+			return np.empty((0, self.number_samples), dtype=DTYPE)
+
+		# only remap when the number of sweeps has changed
+		if self._memmap is None or self._memmap.shape[0] != count:
+			self._memmap = np.memmap(
+				os.path.join(self.path, DATA_NAME),
+				dtype=DTYPE,
+				mode='r',
+				shape=(count, self.number_samples),
+			)
+
+		return self._memmap
+
+	# function to add sweeps to the end of the run
+	def append(self, sweeps, **metadata):
+		'''
+		Appends one sweep (1D array) or a block of sweeps (2D array, one per row) to the store. \
+		Any keyword arguments are saved as the metadata of each sweep (eg: URA=URA). \
+		The data is written before the metadata, so a sweep only counts once both are on disk.
+
+		sweeps: 1D or 2D array of sweeps with number_samples points each
+		'''
+
+		if self.mode != 'a':
+			raise IOError(f'{self.path} is open read only.')
+
+		sweeps = np.atleast_2d(np.asarray(sweeps, dtype=DTYPE))
+		if sweeps.shape[-1] != self.number_samples:
+			raise ValueError(f'Expected sweeps of {self.number_samples} samples, got {sweeps.shape[-1]}.')
+
+		count = len(self)
+		row_bytes = self.number_samples * np.dtype(DTYPE).itemsize
+
+		# grow the data file by whole chunks when it is full
+		needed = count + len(sweeps)
+		capacity = os.fstat(self._data_file.fileno()).st_size // row_bytes
+		if needed > capacity:
+			chunks = -(-needed // self.chunk_size)
+			self._data_file.truncate(chunks * self.chunk_size * row_bytes)
+
+		self._data_file.seek(count * row_bytes)
+		self._data_file.write(np.ascontiguousarray(sweeps).tobytes())
+		self._data_file.flush()
+
+		for _ in range(len(sweeps)):
+			self._metadata_file.write(json.dumps(metadata) + '\n')
+			self.metadata.append(metadata)
+		self._metadata_file.flush()
+
+	# function to close any open files
+	def close(self):
+		'''
+		Closes the files of the store. The data already appended stays readable.
+		'''
+
+		self._memmap = None
+		if self._data_file is not None:
+			self._data_file.close()
+			self._data_file = None
+		if self._metadata_file is not None:
+			self._metadata_file.close()
+			self._metadata_file = None
+		self.mode = 'r'
+
+# function to read only the header of a reading_NNN.txt file, without reading the data
+def read_text_header(filename):
+	'''
+	Returns the header lines ('#' lines, without the '#') of a text reading file joined by '\\n'.
+
+	filename: string of the path to the file
+	'''
+
+	header_lines = []
+	with open(filename, 'r') as file:
+		for line in file:
+			if not line.startswith('#'):
+				break
+			header_lines.append(line[1:].strip())
+
+	return '\n'.join(header_lines)
+
+# function to read a reading_NNN.txt file written by np.savetxt in wss_automation.py
+def read_text_reading(filename):
+	'''
+	Reads a text reading file (header of '#' lines, then time,voltage columns). \
+	Returns (header, times, signal) where header is the header lines joined by '\\n'.
+
+	filename: string of the path to the file
+	'''
+
+	times, signal = np.loadtxt(filename, delimiter=',', comments='#', unpack=True)
+
+	return read_text_header(filename), times, signal
+
+# function to convert an existing directory of text readings into a store
+def import_text_run(run_dir, path=None, settings=None, chunk_size=64):
+	'''
+	Converts a directory of reading_NNN.txt files (as written by wss_automation.py) into a SweepStore. \
+	The header of each file is kept as the URA metadata of that sweep, and the sample rate is taken from the time column. \
+	Returns the new store (open for appending).
+
+	run_dir: string of the directory of text readings (eg: 'Data/channel_sim')
+	path: string of the directory of the new store (default: run_dir with '.sweeps' added)
+	settings: dictionary of the acquisition settings of the run
+	chunk_size: number of sweeps to grow the data file by at a time (default: 64)
+	'''
+
+	run_dir = os.path.normpath(run_dir)
+	if path is None:
+		path = f'{run_dir}.sweeps'
+
+	filenames = sorted(glob.glob(os.path.join(run_dir, 'reading_*.txt')))
+	if len(filenames) == 0:
+		raise FileNotFoundError(f'No reading_*.txt files in {run_dir}.')
+
+	store = None
+	for filename in filenames:
+		header, times, signal = read_text_reading(filename)
+
+		# create the store from the first file
+		if store is None:
+			sample_rate = np.round(1 / (times[1] - times[0]), 6)
+			store = SweepStore.create(path, sample_rate, len(signal), settings=settings, chunk_size=chunk_size)
+
+		store.append(signal, URA=header, source=os.path.basename(filename))
+
+	return store
+
+# OPERATION
+if __name__ == '__main__':
+	# convert each run directory given, eg: python sweep_store.py Data/channel_sim Data/every_k
+	for run_dir in sys.argv[1:]:
+		with import_text_run(run_dir) as store:
+			print(f'{run_dir} -> {store.path} ({len(store)} sweeps of {store.number_samples} samples)')
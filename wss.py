@@ -0,0 +1,217 @@
+import time
+from pyvisa import constants
+
+from instruments import get_resource_manager, get_address
+from create_URA import parse_URA, URA_from_table
+
+# CLIENT FOR THE WSS SERIAL PROTOCOL
+
+# the WSS echoes every command, then replies with any output, then 'OK'
+# if a command fails, an error code is sent instead of the output (or the 'OK')
+ERROR_REPLIES = {
+	'CER': 'command error',
+	'AER': 'argument error',
+	'RER': 'range error',
+	'VER': 'verify error',
+	'FER': 'failure',
+}
+
+class WSSError(Exception):
+	'''
+	Raised when the WSS replies with an error, or the applied channels do not match the requested ones.
+	'''
+
+class WSS:
+	'''
+	Owns the serial session with the WSS and handles the echo/OK framing of every command. \
+	Raises WSSError on error replies, and returns parsed channel tables from RRA?.
+
+	Keeps a model of the channel table held by the WSS (channels), seeded from RRA?. \
+	set_URA then only sends the channels that change, and skips the URA/RSW entirely if nothing changes.
+	'''
+
+	def __init__(self, resource, verbose=False):
+		'''
+		Should usually be created with WSS.open.
+
+		resource: an open pyvisa resource of the WSS, with the serial settings applied
+		verbose: boolean of whether to print every line sent and received (default: False)
+		'''
+
+		self.resource = resource
+		self.verbose = verbose
+
+		# seconds taken by the last set_URA
+		self.last_latency = None
+
+		# the channel table held by the WSS, None until read with RRA?
+		self.channels = None
+		# number of set_URA calls that did not need to send anything
+		self.skipped = 0
+
+	# function to open and configure the serial session
+	@classmethod
+	def open(cls, name=None, resource_manager=None, verbose=False):
+		'''
+		Opens the WSS on the serial port name and applies the serial settings.
+
+		name: string of the resource name of the WSS (default: the address of 'wss' in instruments.py)
+		resource_manager: pyvisa ResourceManager to use (default: the configured one from instruments.py)
+		verbose: boolean of whether to print every line sent and received (default: False)
+		'''
+
+		if name is None:
+			name = get_address('wss')
+		if resource_manager is None:
+			resource_manager = get_resource_manager()
+
+		resource = resource_manager.open_resource(name)
+
+		# settings
+		# there is no query_delay, as every reply is read with read() rather than query()
+		resource.query_delay = 0
+		resource.baud_rate = 115200
+		resource.write_termination = '\r\n'
+		resource.read_termination = '\r\n'
+		resource.data_bits = 8
+		resource.stop_bits = constants.VI_ASRL_STOP_ONE
+
+		if verbose:
+			print(f'Trying {name}')
+
+		return cls(resource, verbose=verbose)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args):
+		self.close()
+
+	# function to read one line, raising on an error reply
+	def _read(self):
+		line = self.resource.read()
+		if self.verbose:
+			print(line)
+
+		if line in ERROR_REPLIES:
+			raise WSSError(f'WSS replied {line} ({ERROR_REPLIES[line]}).')
+
+		return line
+
+	# function to send a command and check the echo
+	def _send(self, command):
+		self.resource.write(command)
+
+		echo = self._read()
+		if echo != command:
+			raise WSSError(f'Expected echo of {command[:40]}, got {echo[:40]}.')
+
+	# function to read the final 'OK'
+	def _read_OK(self):
+		reply = self._read()
+		if reply != 'OK':
+			raise WSSError(f'Expected OK, got {reply[:40]}.')
+
+	# function to send a command that has no output
+	def command(self, command):
+		'''
+		Sends command and waits for the echo and 'OK'.
+
+		command: string of the command, eg: 'RSW'
+		'''
+
+		self._send(command)
+		self._read_OK()
+
+	# function to send a command that has one line of output
+	def query(self, command):
+		'''
+		Sends command and returns its output, after checking the echo and 'OK'.
+
+		command: string of the command, eg: 'SNO?'
+		'''
+
+		self._send(command)
+		output = self._read()
+		self._read_OK()
+
+		return output
+
+	# function to get the serial number
+	def serial_number(self):
+		return self.query('SNO?')
+
+	# function to get the manufacturing date
+	def manufacture_date(self):
+		return self.query('MFD?')
+
+	# function to get the channel table
+	def get_channels(self):
+		'''
+		Returns the applied channels as a dictionary of {channel: (port, attenuation)}, from RRA?. \
+		Also updates the model of the channel table.
+		'''
+
+		self.channels = parse_URA(self.query('RRA?'))
+
+		return dict(self.channels)
+
+	# function to get the channels of URA that differ from the model of the channel table
+	def get_changes(self, URA):
+		'''
+		Returns the channels of URA that differ from the channels held by the WSS, as a dictionary of {channel: (port, attenuation)}. \
+		Returns every channel of URA if the channel table is not known.
+
+		URA: string of the URA command
+		'''
+
+		requested = parse_URA(URA)
+		if self.channels is None:
+			return requested
+
+		return {channel: setting for channel, setting in requested.items() if self.channels.get(channel) != setting}
+
+	# function to set and apply a URA
+	def set_URA(self, URA, verify=True, delta=True):
+		'''
+		Sets URA and applies it with RSW. \
+		If delta, only the channels that differ from the channel table are sent, and nothing is sent if none differ. \
+		If verify, reads back the channels with RRA? and raises WSSError if any differ from URA. \
+		Returns the channel table if verify, otherwise None.
+
+		URA: string of the URA command to apply
+		verify: boolean of whether to read back the channels (default: True)
+		delta: boolean of whether to only send the channels that change (default: True)
+		'''
+
+		start_time = time.perf_counter()
+
+		changes = self.get_changes(URA) if delta else parse_URA(URA)
+		if len(changes) == 0:
+			self.skipped += 1
+		else:
+			try:
+				self.command(URA_from_table(changes))
+				self.command('RSW')
+			except Exception:
+				# the state of the WSS is not known after a failed command
+				self.channels = None
+				raise
+
+			if self.channels is not None:
+				self.channels.update(changes)
+
+		table = None
+		if verify:
+			table = self.get_channels()
+			wrong = [channel for channel, setting in parse_URA(URA).items() if table.get(channel) != setting]
+			if len(wrong) > 0:
+				raise WSSError(f'Channels {wrong} were not applied.')
+
+		self.last_latency = time.perf_counter() - start_time
+
+		return table
+
+	# function to close the serial session
+	def close(self):
+		self.resource.close()
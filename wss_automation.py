@@ -1,10 +1,14 @@
-import pyvisa
-from pyvisa import constants
 import time
-import nidaqmx
 import numpy as np
 import matplotlib.pyplot as plt
 from create_URA import *
+from sweep_store import SweepStore
+from acquisition import Acquisition, AcquisitionType
+from instruments import get_resource_manager, get_address, create_daq_task
+from scheduler import SweepScheduler
+from settle import SettleDetector, PeriodWindow
+from wss import WSS
+from conversions import SWEEP_PERIOD
 
 # CONSTANTS
 
@@ -30,13 +34,14 @@ def read(device='Dev1', sample_rate=10, acquire_time=1):
     print(f'Acquiring {number_samples} data points.')
 
     # create task of this name
-    with nidaqmx.Task('read') as task:
+    # real or emulated, see instruments.py
+    with create_daq_task() as task:
         # configure task
         task.ai_channels.add_ai_voltage_chan(f'{device}/ai0')
         task.timing.cfg_samp_clk_timing(
             sample_rate, 
             samps_per_chan=number_samples, 
-            sample_mode=nidaqmx.constants.AcquisitionType(10178)
+            sample_mode=AcquisitionType(10178)
         )
 
         # start task         
@@ -60,19 +65,8 @@ def reset_default():
 	Resets all port 3 channels of the wss to the default (no attenuation, all on)
 	'''
 
-	wss.write(URA_DEFAULT)
-	print(wss.read())
-	print(wss.read())
-
-	# applies these attentuations
-	wss.write('RSW')
-	print(wss.read())
-	print(wss.read())
-
-	# print all channels again
-	print(wss.query('RRA?'))
-	print(wss.read())
-	print(wss.read())
+	# applies these attentuations and reads back all channels
+	wss.set_URA(URA_DEFAULT)
 
 # function so we can set to basic (52 on (start), 80 on (end), 81-87 inclusive on (markers), otherwise odd numbers are off) easily
 def reset_basic():
@@ -80,19 +74,20 @@ def reset_basic():
 	Resets all port 3 channels of the wss to the basic (52 on (start), 80 on (end), 81-87 inclusive on (markers), otherwise odd numbers are off)
 	'''
 
-	wss.write(URA_BASIC)
-	print(wss.read())
-	print(wss.read())
+	# applies these attentuations and reads back all channels
+	wss.set_URA(URA_BASIC)
 
-	# applies these attentuations
-	wss.write('RSW')
-	print(wss.read())
-	print(wss.read())
+# applies a URA to the wss
+def apply_URA(URA, verify=True):
+	'''
+	Sets the URA and applies it with RSW. \
+	If verify, reads back all channels and raises a WSSError if the URA was not applied.
+
+	URA: string of the URA command to apply
+	verify: boolean of whether to read back all channels (default: True)
+	'''
 
-	# print all channels again
-	print(wss.query('RRA?'))
-	print(wss.read())
-	print(wss.read())
+	wss.set_URA(URA, verify=verify)
 
 # takes in a list of the URAs to set
 # waits seconds second after command before reading from the DAC
@@ -102,26 +97,14 @@ def set_URA(URA, seconds=5):
 
 	'''
 
-	# set the new URA
-	wss.write(URA)
-	print(wss.read())
-	print(wss.read())
-
-	# apply these attentuations
-	wss.write('RSW')
-	print(wss.read())
-	print(wss.read())
-
-	# print all channels again
-	print(wss.query('RRA?'))
-	print(wss.read())
-	print(wss.read())
+	apply_URA(URA)
 
 	# allow some time to settle
 	time.sleep(seconds)
 
 	# save data and times
-	reading_arr = read(device='Dev1', sample_rate=1e3, acquire_time=2)
+	# the acquisition buffer is reused, so build a new array from it
+	reading_arr = np.array([daq.times, daq.read()]).T
 
 	return reading_arr
 
@@ -140,62 +123,84 @@ def set_URAs(URA_list, seconds=5):
 
 	# now pass each of these URAs into the wss, leaving some time between
 	for URA in URA_list:
-		# set the new URA
-		wss.write(URA)
-		print(wss.read())
-		print(wss.read())
-
-		# apply these attentuations
-		wss.write('RSW')
-		print(wss.read())
-		print(wss.read())
-
-		# print all channels again
-		print(wss.query('RRA?'))
-		print(wss.read())
-		print(wss.read())
+		apply_URA(URA)
 
 		# allow some time to settle
 		time.sleep(seconds)
 
 		# save data and times
-		reading_arrs.append(read(device='Dev1', sample_rate=1e3, acquire_time=2))
+		# the acquisition buffer is reused, so build a new array from it
+		reading_arrs.append(np.array([daq.times, daq.read()]).T)
 
 	return reading_arrs
 
+# takes in a list of the URAs to set
+# applies each one, waiting seconds second to settle, and streams each reading to a binary store at path
+# saving runs in the background while the wss switches and settles for the next URA
+# returns the scheduler, which has the time spent in each stage
+def run_URAs(URA_list, path, seconds=5, detect_settle=False, verify=False):
+	'''
+	Applies each URA in URA_list and saves a reading of each to a new SweepStore at path, as the readings arrive. \
+	Prints the time spent in each stage of the run.
+
+	URA_list: list of strings of the URA commands to apply
+	path: string of the directory of the new store (eg: 'Data/channel_sim_54off.sweeps')
+	seconds: seconds to wait after each URA before reading, or the most to wait if detect_settle (default: 5)
+	detect_settle: boolean of whether to watch the signal and read as soon as the wss has settled (default: False)
+	verify: boolean of whether to read back all channels after each URA (default: False)
+	'''
+
+	store = SweepStore.create(
+		path,
+		sample_rate=daq.sample_rate,
+		number_samples=daq.number_samples,
+		settings={'device': daq.device, 'acquire_time': daq.acquire_time, 'settle_time': seconds, 'detect_settle': detect_settle},
+	)
+
+	# wait a fixed time, or stream 0.1s blocks until the power over the last sweep period stops changing
+	# the power of a whole period does not depend on where in the sweep the stream starts, and is updated every block,
+	# so an unchanged pattern settles after about 1.3s and a switched one about hold_time after the filter settles
+	settle = seconds
+	if detect_settle:
+		blocks_per_period = 10
+		block_size = int(daq.sample_rate * SWEEP_PERIOD) // blocks_per_period
+		settle = SettleDetector(
+			PeriodWindow(lambda: daq.iter_blocks(block_size), blocks_per_period),
+			statistic='power',
+			hold_time=3 * SWEEP_PERIOD / blocks_per_period,
+			timeout=seconds,
+		)
+
+	scheduler = SweepScheduler(lambda URA: apply_URA(URA, verify=verify), daq.read, store, settle=settle)
+	try:
+		scheduler.run(URA_list)
+	finally:
+		store.close()
+
+	print(scheduler.report())
+
+	return scheduler
+
 # SETTING UP CONNECTIONS
-rm = pyvisa.ResourceManager('@py')
+# real or emulated instruments, see instruments.py
+rm = get_resource_manager()
+
+# one daq task is kept open for the whole run
+daq = Acquisition(device='Dev1', sample_rate=1e3, acquire_time=2)
+daq.open()
 
 # open wss
-wss_name = 'ASRL4::INSTR'  #'ASRL/dev/ttyUSB0::INSTR'
-wss = rm.open_resource(wss_name)
-
-# settings
-wss.query_delay = 0.1
-wss.baud_rate = 115200
-wss.write_termination = '\r\n'
-wss.read_termination = '\r\n'
-wss.data_bits = 8
-wss.stop_bits = constants.VI_ASRL_STOP_ONE
-
-print(f'Trying {wss_name}')
-
-# check serial number
-# query performs write command and read command in one line, so writes then returns the command that was written
-# after every command must have 2 reads (the output of the command, and the confirmation 'OK')
-print(wss.query('SNO?'))
-print(wss.read())
-print(wss.read())
-
-# manufacturing date
-print(wss.query('MFD?'))
-print(wss.read())
-print(wss.read())
+# the port found by discovery.py (python helloworld.py), or set in instruments.json
+wss_name = get_address('wss')
+# verbose prints every command and reply
+wss = WSS.open(wss_name, rm, verbose=True)
+
+# check serial number and manufacturing date
+wss.serial_number()
+wss.manufacture_date()
 
 # print all channels
-print(wss.query('RRA?'))
-print(wss.read())
-print(wss.read())
+wss.get_channels()
 
 # default channels
 reset_default()
@@ -345,20 +350,13 @@ for i in range(0, 200):
 	# add to URA list
 	URA_list.append('URA 52,3,0.0;53,3,99.9;54,3,99.9;55,3,99.9;56,3,0.0;57,3,99.9;58,3,0.0;59,3,99.9;60,3,0.0;61,3,99.9;62,3,0.0;63,3,99.9;64,3,0.0;65,3,99.9;66,3,0.0;67,3,99.9;68,3,0.0;69,3,99.9;70,3,0.0;71,3,99.9;72,3,0.0;73,3,99.9;74,3,0.0;75,3,99.9;76,3,0.0;77,3,99.9;78,3,0.0;79,3,99.9;80,3,0.0;81,3,0.0;82,3,0.0;83,3,0.0;84,3,0.0;85,3,0.0;86,3,0.0;87,3,0.0')
 
-# apply each
-reading_arrs = set_URAs(URA_list, seconds=3)
+# apply each, saving each reading as it arrives
+# detect_settle=True waited 1.3-1.5s instead of 3s on the emulator (none timed out), to be checked on the bench before it is used here
+run_URAs(URA_list, 'Data/channel_sim_54off.sweeps', seconds=3, detect_settle=False)
 
 # default
 reset_default()
 
-# save each to a text file, along with the command used
-file_index = 0
-for i, reading_arr in enumerate(reading_arrs):
-	# save to text file, where column 1 is all the times, and column 2 is all the data points
-	# the header is the URA command used
-	np.savetxt(f'Data/channel_sim_54off/reading_{file_index:03}.txt', reading_arr, delimiter=',', header=URA_list[i])
-
-	# increase file index so we dont override file
-	file_index += 1
-
-# 200 * 3 = 600s
\ No newline at end of file
+# 200 * 3 = 600s
+# close the daq task
+daq.close()